@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# SQLite file holding cached OpenAI story analyses (can be overridden in .env)
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", ".analysis_cache.sqlite3")
+
+# Entries older than this are ignored and removed (seconds, default 30 days)
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Least recently used entries are evicted beyond this many rows
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+
+
+def image_hash(image_path):
+    """SHA-256 of the image bytes, so renamed or re-captured identical files share an entry."""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def combined_hash(content_hashes):
+    """Single key for an ordered set of images analyzed together."""
+    return hashlib.sha256("\n".join(content_hashes).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Persistent cache of analysis results keyed by content hash + prompt version + model.
+
+    Bump the prompt version whenever a prompt or the expected JSON shape
+    changes so stale results are never served.
+    """
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH, ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+                 max_entries=ANALYSIS_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " key TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " value TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(content_hash, prompt_version, model):
+        return f"{content_hash}:{prompt_version}:{model}"
+
+    def get(self, content_hash, prompt_version, model):
+        """Return the cached value, or None if missing or expired."""
+        key = self._key(content_hash, prompt_version, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, value FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[0] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, content_hash, prompt_version, model, value):
+        """Store a JSON-serializable value and evict the oldest entries past the size bound."""
+        key = self._key(content_hash, prompt_version, model)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, created_at, last_used, value) VALUES (?, ?, ?, ?)",
+                (key, now, now, json.dumps(value)),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM analyses WHERE key IN ("
+            " SELECT key FROM analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses")
+            self._conn.commit()
+
+    def print_stats(self):
+        total = self.hits + self.misses
+        if total:
+            print(f"Analysis cache: {self.hits}/{total} hits")
+
+
+_cache = None
+
+
+def get_analysis_cache():
+    """Return the process-wide analysis cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = AnalysisCache()
+    return _cache
@@ -0,0 +1,249 @@
+import os
+import json
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import get_analysis_cache, image_hash
+from image_prep import image_content_part, VISION_DETAIL
+from llm_gateway import get_llm_gateway
+from story_index import get_story_index
+from story_schema import (
+    StoryAnalysisBatch,
+    StoryResult,
+    NewsletterSection,
+    NewsletterPlan,
+    StoryAnalysisReport,
+)
+
+# Engine settings (can be overridden in .env)
+STORY_ANALYSIS_CONCURRENCY = int(os.getenv("STORY_ANALYSIS_CONCURRENCY", "4"))
+STORY_ANALYSIS_GROUP_SIZE = int(os.getenv("STORY_ANALYSIS_GROUP_SIZE", "1"))
+
+# Vision model for the per-story calls, cheaper text model for the aggregation call
+STORY_ANALYSIS_MODEL = "gpt-4o"
+AGGREGATION_MODEL = os.getenv("AGGREGATION_MODEL", "gpt-4o-mini")
+
+# Bump when STORY_SYSTEM_PROMPT or the story schema changes so cached analyses are not reused
+STORY_PROMPT_VERSION = "story-v2"
+
+STORY_SYSTEM_PROMPT = """You are an AI assistant specialized in analyzing Instagram stories for a newsletter.
+For each Instagram story screenshot you are given, return one story entry that:
+1. Uses the image number and file name given with the image as index and filename.
+2. Describes the content, context, themes, and any text visible in the image.
+3. Classifies the account as a personal friend or an influencer/brand based on the content.
+4. Identifies or suggests the account name.
+5. Categorizes the content type (e.g., personal update, promotional, lifestyle, etc.).
+Be detailed but concise."""
+
+AGGREGATION_SYSTEM_PROMPT = """You plan newsletters from analyzed Instagram stories.
+Given the per-story analyses as JSON, pick the overall themes and suggest newsletter
+sections, referencing stories by their index. Separate friend updates from influencer content."""
+
+
+def guess_username(image_path):
+    """Account name from a capture filename (format: username_story_X.png), or None."""
+    filename = os.path.basename(image_path)
+    if "_story_" in filename:
+        return filename.split("_story_")[0]
+    return None
+
+
+def merge_stories_locally(stories):
+    """Build the full analysis report from per-story results without calling the model."""
+    theme_counts = Counter(theme for story in stories for theme in story.themes)
+    friends = [story.index for story in stories if story.account_type.lower() in ("friend", "personal")]
+    others = [story.index for story in stories if story.index not in friends]
+
+    sections = []
+    if friends:
+        sections.append(NewsletterSection(
+            title="Friends Updates",
+            description="What your friends have been sharing.",
+            related_stories=friends,
+        ))
+    if others:
+        sections.append(NewsletterSection(
+            title="Influencer Highlights",
+            description="Highlights from creators and brands you follow.",
+            related_stories=others,
+        ))
+
+    return StoryAnalysisReport(
+        stories=stories,
+        overall_themes=[theme for theme, _ in theme_counts.most_common(5)],
+        newsletter_sections=sections,
+    )
+
+
+def _failed_story(index, image_path, error):
+    """Placeholder for a story whose analysis failed, so the rest of the batch still goes through."""
+    return StoryResult(
+        index=index,
+        filename=os.path.basename(image_path),
+        account_name=guess_username(image_path) or "Unknown",
+        account_type="unknown",
+        content_type="unknown",
+        description="",
+        visible_text="",
+        themes=[],
+        relevance="low",
+        error=error,
+    )
+
+
+async def _analyze_group(gateway, semaphore, group, detail):
+    """Analyze a small group of (index, path) stories in one vision call."""
+    async with semaphore:
+        # Encode inside the semaphore so only in-flight images are held in memory
+        content = []
+        for index, image_path in group:
+            username = guess_username(image_path)
+            content.append({
+                "type": "text",
+                "text": f"Image {index}, file: {os.path.basename(image_path)}"
+                        + (f", possible username: {username}" if username else ""),
+            })
+            image_part = image_content_part(image_path, detail=detail)
+            if image_part:
+                content.append(image_part)
+
+        try:
+            batch = await gateway.aparse(
+                StoryAnalysisBatch,
+                model=STORY_ANALYSIS_MODEL,
+                messages=[
+                    {"role": "system", "content": STORY_SYSTEM_PROMPT},
+                    {"role": "user", "content": content},
+                ],
+                max_tokens=400 * len(group),
+            )
+        except Exception as e:
+            names = ", ".join(os.path.basename(p) for _, p in group)
+            print(f"Error analyzing {names}: {e}")
+            return [_failed_story(index, path, str(e)) for index, path in group]
+
+    # Trust our own index/filename over the model's echo of them
+    by_index = {story.index: story for story in batch.stories}
+    results = []
+    for position, (index, image_path) in enumerate(group):
+        story = by_index.get(index) or (batch.stories[position] if position < len(batch.stories) else None)
+        if story is None:
+            results.append(_failed_story(index, image_path, "missing from model response"))
+            continue
+        results.append(StoryResult(**dict(story.model_dump(), index=index, filename=os.path.basename(image_path))))
+    return results
+
+
+async def aggregate_stories(gateway, stories):
+    """One text-only call that turns per-story results into themes and newsletter sections."""
+    summaries = [
+        story.model_dump(include={"index", "account_name", "account_type", "content_type",
+                                  "description", "themes", "relevance"})
+        for story in stories if not story.error
+    ]
+    try:
+        plan = await gateway.aparse(
+            NewsletterPlan,
+            model=AGGREGATION_MODEL,
+            messages=[
+                {"role": "system", "content": AGGREGATION_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(summaries)},
+            ],
+            max_tokens=600,
+        )
+        return StoryAnalysisReport(
+            stories=stories,
+            overall_themes=plan.overall_themes,
+            newsletter_sections=plan.newsletter_sections,
+        )
+    except Exception as e:
+        print(f"Aggregation call failed, grouping stories locally: {e}")
+        return merge_stories_locally(stories)
+
+
+async def analyze_story(gateway, semaphore, index, image_path, detail=None):
+    """Analyze one story as it arrives (cache first), for pipelines that stream stories in.
+
+    Returns a StoryResult, with ``error`` set if the analysis failed.
+    """
+    detail = detail or VISION_DETAIL
+    cache = get_analysis_cache()
+    cache_model = f"{STORY_ANALYSIS_MODEL}:{detail}"
+    content_hash = image_hash(image_path)
+    cached = cache.get(content_hash, STORY_PROMPT_VERSION, cache_model)
+    if cached:
+        get_story_index().record_analysis(image_path, STORY_PROMPT_VERSION, cache_model, cached)
+        cached.update({"index": index, "filename": os.path.basename(image_path)})
+        return StoryResult.model_validate(cached)
+
+    story = (await _analyze_group(gateway, semaphore, [(index, image_path)], detail))[0]
+    if not story.error:
+        result = story.model_dump(exclude={"error"})
+        cache.put(content_hash, STORY_PROMPT_VERSION, cache_model, result)
+        get_story_index().record_analysis(image_path, STORY_PROMPT_VERSION, cache_model, result)
+    return story
+
+
+async def analyze_stories_async(image_paths, detail=None, max_concurrency=None, group_size=None):
+    """Analyze stories concurrently and merge them into a StoryAnalysisReport.
+
+    Each story (or group of ``group_size`` stories) is its own vision call, at
+    most ``max_concurrency`` in flight. Cached stories are not sent again, and
+    a failed story only marks that story as failed.
+    """
+    detail = detail or VISION_DETAIL
+    max_concurrency = max_concurrency or STORY_ANALYSIS_CONCURRENCY
+    group_size = group_size or STORY_ANALYSIS_GROUP_SIZE
+    cache = get_analysis_cache()
+    cache_model = f"{STORY_ANALYSIS_MODEL}:{detail}"
+    story_index = get_story_index()
+
+    stories = {}
+    content_hashes = {}
+    pending = []
+    for index, image_path in enumerate(image_paths):
+        if not os.path.exists(image_path):
+            print(f"Warning: Image file does not exist: {image_path}")
+            continue
+        content_hashes[index] = image_hash(image_path)
+        cached = cache.get(content_hashes[index], STORY_PROMPT_VERSION, cache_model)
+        if cached:
+            story_index.record_analysis(image_path, STORY_PROMPT_VERSION, cache_model, cached)
+            cached.update({"index": index, "filename": os.path.basename(image_path)})
+            stories[index] = StoryResult.model_validate(cached)
+        else:
+            pending.append((index, image_path))
+
+    if not content_hashes:
+        return merge_stories_locally([])
+    if not pending:
+        print(f"All {len(stories)} stories served from analysis cache, no images sent")
+        return merge_stories_locally([stories[i] for i in sorted(stories)])
+
+    print(f"Analyzing {len(pending)} stories ({len(stories)} cached) "
+          f"with up to {max_concurrency} concurrent requests...")
+    gateway = get_llm_gateway()
+    try:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+        tasks = [_analyze_group(gateway, semaphore, group, detail) for group in groups]
+        for group_results in await asyncio.gather(*tasks):
+            for story in group_results:
+                stories[story.index] = story
+                if not story.error:
+                    result = story.model_dump(exclude={"error"})
+                    cache.put(content_hashes[story.index], STORY_PROMPT_VERSION, cache_model, result)
+                    story_index.record_analysis(image_paths[story.index], STORY_PROMPT_VERSION, cache_model, result)
+
+        return await aggregate_stories(gateway, [stories[i] for i in sorted(stories)])
+    finally:
+        await gateway.aclose()
+
+
+def analyze_stories_concurrently(image_paths, detail=None, max_concurrency=None, group_size=None):
+    """Blocking wrapper around analyze_stories_async, safe to call from sync code."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(
+            asyncio.run, analyze_stories_async(image_paths, detail, max_concurrency, group_size)
+        ).result()
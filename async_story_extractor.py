@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from browser_pool import BROWSER_HEADLESS, shutdown_browser_pool
+from instrumentation import span
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    VIEW_STORY_SELECTORS,
+    async_expect_story_media_response,
+    async_wait_for_any_selector,
+    async_wait_for_story_media,
+)
+from session_store import INSTAGRAM_BASE_URL
+from story_capture import StoryMediaCollector, async_capture_story_media
+from story_index import get_story_index, story_key, capture_base
+
+# Engine settings (can be overridden in .env)
+STORY_MAX_CONCURRENCY = int(os.getenv("STORY_MAX_CONCURRENCY", "5"))
+STORY_ACCOUNT_TIMEOUT = float(os.getenv("STORY_ACCOUNT_TIMEOUT", "45"))
+
+
+async def _first_truthy(*coroutines):
+    """Run the coroutines concurrently; return the first truthy result (or None) and cancel the rest."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result:
+                return result
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _open_story_viewer(page, username):
+    """Navigate to a user's stories and get past the "View story" prompt."""
+    await page.goto(f"{INSTAGRAM_BASE_URL}/stories/{username}/", wait_until="domcontentloaded")
+    found = await async_wait_for_any_selector(page, VIEW_STORY_SELECTORS + STORY_VIEW_INDICATORS, "story_entry")
+
+    if found in STORY_VIEW_INDICATORS:
+        return True
+    if found:
+        open_viewer = lambda: page.click(found)
+    else:
+        # Fall back to clicking where the "View story" button usually sits
+        viewport = page.viewport_size or {"width": 1280, "height": 720}
+        open_viewer = lambda: page.mouse.click(viewport["width"] / 2, viewport["height"] / 2 + 60)
+
+    # The story's media response is usually the first sign the viewer opened;
+    # viewer controls cover stories whose media doesn't come from the CDN
+    return bool(await _first_truthy(
+        async_expect_story_media_response(page, open_viewer, "story_view"),
+        async_wait_for_any_selector(page, STORY_VIEW_INDICATORS, "story_view"),
+    ))
+
+
+async def _capture_account(context, username, num_stories):
+    """Capture ``num_stories`` stories for one account in its own page, skipping ones already analyzed."""
+    index = get_story_index()
+    seen = await asyncio.to_thread(index.seen_keys, username)
+    page = await context.new_page()
+    collector = StoryMediaCollector(page)
+    screenshots = []
+    try:
+        with span("navigate", username=username) as record:
+            record["story_view"] = await _open_story_viewer(page, username)
+        if not record["story_view"]:
+            print(f"[{username}] Could not confirm story view, capturing anyway")
+
+        previous_src = None
+        for i in range(num_stories):
+            with span("story_capture", username=username, story=i + 1) as record:
+                step = "story_media" if i == 0 else "story_advance"
+                src = await async_wait_for_story_media(page, previous_src, step)
+                previous_src = src or previous_src
+                key = story_key(page.url, src)
+                record["skipped"] = key in seen
+                if not record["skipped"]:
+                    screenshot_path = await async_capture_story_media(page, collector, src,
+                                                                      capture_base(username, key))
+                    record["bytes"] = os.path.getsize(screenshot_path)
+                    await asyncio.to_thread(index.record_story, username, key, src, screenshot_path)
+            if record["skipped"]:
+                index.mark_skipped()
+                print(f"[{username}] Story {i+1} already analyzed in an earlier run, skipping")
+            else:
+                screenshots.append(screenshot_path)
+                print(f"[{username}] Story saved as {screenshot_path}")
+            if i < num_stories - 1:
+                await page.keyboard.press("ArrowRight")
+    finally:
+        collector.detach()
+        await page.close()
+    return screenshots
+
+
+async def stream_story_extractions(cookies, usernames, num_stories=1,
+                                   max_concurrency=STORY_MAX_CONCURRENCY,
+                                   account_timeout=STORY_ACCOUNT_TIMEOUT,
+                                   headless=BROWSER_HEADLESS, storage_state=None):
+    """Capture stories for many accounts at once, yielding each account's result as it finishes.
+
+    All accounts share one browser and one logged-in context, each in its own
+    page. The context starts from ``storage_state`` (the login session's
+    cookies and local storage) when given, plus ``cookies``. At most
+    ``max_concurrency`` pages run at a time and each account gets
+    ``account_timeout`` seconds. Each yielded result is a dict with
+    ``username``, ``screenshots``, ``error`` and ``elapsed``.
+    """
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        if storage_state:
+            context = await browser.new_context(storage_state=storage_state)
+        else:
+            context = await browser.new_context()
+        if cookies:
+            await context.add_cookies(cookies)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(username):
+            async with semaphore:
+                started = time.perf_counter()
+                result = {"username": username, "screenshots": [], "error": None}
+                try:
+                    result["screenshots"] = await asyncio.wait_for(
+                        _capture_account(context, username, num_stories), timeout=account_timeout
+                    )
+                except asyncio.TimeoutError:
+                    result["error"] = f"timed out after {account_timeout:.0f}s"
+                except Exception as e:
+                    result["error"] = str(e)
+                result["elapsed"] = time.perf_counter() - started
+                return result
+
+        tasks = [asyncio.create_task(run(username)) for username in usernames]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await browser.close()
+
+
+def extract_stories_concurrently(cookies, usernames, num_stories=1, max_concurrency=None,
+                                 account_timeout=None, on_result=None, storage_state=None):
+    """Blocking wrapper around stream_story_extractions; returns results in completion order.
+
+    ``on_result`` is called with each result as soon as its account finishes.
+    The sync browser pool used for login is shut down first so only one
+    Chromium runs; the event loop runs in a worker thread so this is safe to
+    call from the pool's thread.
+    """
+    if not cookies and not storage_state:
+        print("Error: No cookies provided. Please login first.")
+        return []
+    shutdown_browser_pool()
+
+    max_concurrency = max_concurrency or STORY_MAX_CONCURRENCY
+    account_timeout = account_timeout or STORY_ACCOUNT_TIMEOUT
+    print(f"\n--- Extracting stories for {len(usernames)} accounts "
+          f"(concurrency={max_concurrency}, timeout={account_timeout:.0f}s) ---")
+
+    async def collect():
+        results = []
+        async for result in stream_story_extractions(cookies, usernames, num_stories, max_concurrency,
+                                                     account_timeout, storage_state=storage_state):
+            if result["error"]:
+                print(f"[{result['username']}] Failed after {result['elapsed']:.1f}s: {result['error']}")
+            else:
+                print(f"[{result['username']}] Captured {len(result['screenshots'])} "
+                      f"stories in {result['elapsed']:.1f}s")
+            if on_result:
+                on_result(result)
+            results.append(result)
+        return results
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, collect()).result()
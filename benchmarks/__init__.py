@@ -0,0 +1 @@
+"""Offline benchmarks: the real pipeline against local Instagram, OpenAI and SMTP stand-ins."""
@@ -0,0 +1,196 @@
+"""Static stand-in for Instagram's story viewer, for offline benchmarks.
+
+Serves just enough for the real capture code: ``/stories/<username>/`` shows
+the "View story" interstitial and then a viewer that advances on ArrowRight,
+the home page has a story tray, and ``/accounts/login/`` accepts any login.
+Story images are distinct generated JPEGs served from a path containing
+``cdninstagram.com`` so StoryMediaCollector treats them as CDN media. Point
+the pipeline at it with ``INSTAGRAM_BASE_URL=http://127.0.0.1:<port>``.
+
+    python -m benchmarks.fake_instagram --port 8300 --stories 3
+"""
+import io
+import json
+import re
+import time
+import random
+import argparse
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MEDIA_PATH_RE = re.compile(r"^/cdninstagram\.com/v/t51\.2885-15/(?P<username>[\w.]+)_(?P<index>\d+)\.jpg$")
+STORIES_PATH_RE = re.compile(r"^/stories/(?P<username>[\w.]+)/?$")
+
+VIEWER_PAGE = """<!DOCTYPE html>
+<html><head><title>Stories</title>
+<style>
+body {{ margin: 0; font-family: sans-serif; background: #111; color: #fff; }}
+#media {{ width: 360px; height: 640px; object-fit: cover; display: block; margin: 20px auto; }}
+</style></head>
+<body>
+{entry}
+<template id="viewer"><section role="dialog">
+  <button aria-label="Pause">Pause</button>
+  <button aria-label="Previous">Previous</button>
+  <button aria-label="Next" onclick="advance()">Next</button>
+  <img id="media" alt="Story">
+</section></template>
+<script>
+const stories = {stories};
+let current = 0;
+function show() {{ document.getElementById('media').src = stories[current]; }}
+function openViewer() {{
+  const entry = document.getElementById('entry');
+  if (entry) entry.remove();
+  // Viewer controls only exist once it is open, like on Instagram
+  document.body.appendChild(document.getElementById('viewer').content.cloneNode(true));
+  show();
+}}
+function advance() {{ if (current < stories.length - 1) {{ current++; show(); }} }}
+document.addEventListener('keydown', e => {{ if (e.key === 'ArrowRight') advance(); }});
+</script>
+</body></html>"""
+
+STORY_ENTRY = """<div id="entry"><p>{username}</p><button onclick="openViewer()">View story</button></div>"""
+TRAY_ENTRY = """<div id="entry"><div role="button" tabindex="0" aria-label="Story by {username}"
+onclick="openViewer()">{username}</div></div>"""
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Login</title></head><body>
+<form method="post" action="/accounts/login/">
+  <input name="username" aria-label="Phone number, username, or email" type="text">
+  <input name="password" type="password">
+  <button type="submit">Log in</button>
+</form></body></html>"""
+
+HOME_PAGE_USERNAME = "home_feed"
+
+
+class FakeInstagramSettings:
+    """Stories per account and response delays for the fake site."""
+
+    def __init__(self, stories_per_account=3, page_latency_ms=50, media_latency_ms=30,
+                 image_size=(720, 1280), jpeg_quality=85):
+        self.stories_per_account = stories_per_account
+        self.page_latency_ms = page_latency_ms
+        self.media_latency_ms = media_latency_ms
+        self.image_size = image_size
+        self.jpeg_quality = jpeg_quality
+        self.requests = 0
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def story_image(self, username, index):
+        """A JPEG unique to (username, index), so deduplication keeps every story."""
+        key = (username, index)
+        with self._lock:
+            if key in self._images:
+                return self._images[key]
+        from PIL import Image, ImageDraw
+
+        rng = random.Random(f"{username}:{index}")
+        width, height = self.image_size
+        image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(24):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.rectangle((x, y, x + rng.randrange(60, 320), y + rng.randrange(60, 420)),
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        draw.text((40, 40), f"{username} story {index}", fill=(255, 255, 255))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.jpeg_quality)
+        with self._lock:
+            self._images[key] = buffer.getvalue()
+        return self._images[key]
+
+
+def media_urls(username, count):
+    return [f"/cdninstagram.com/v/t51.2885-15/{username}_{i + 1}.jpg" for i in range(count)]
+
+
+class FakeInstagramHandler(BaseHTTPRequestHandler):
+    settings = FakeInstagramSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _viewer(self, username, entry_template):
+        stories = media_urls(username, self.settings.stories_per_account)
+        entry = entry_template.format(username=escape(username))
+        return VIEWER_PAGE.format(entry=entry, stories=json.dumps(stories))
+
+    def do_GET(self):
+        settings = self.settings
+        settings.requests += 1
+        path = self.path.split("?", 1)[0]
+
+        media = MEDIA_PATH_RE.match(path)
+        if media:
+            time.sleep(settings.media_latency_ms / 1000)
+            self._send(200, settings.story_image(media["username"], int(media["index"])), "image/jpeg",
+                       {"Cache-Control": "no-store"})
+            return
+
+        time.sleep(settings.page_latency_ms / 1000)
+        stories = STORIES_PATH_RE.match(path)
+        if stories:
+            self._send(200, self._viewer(stories["username"], STORY_ENTRY))
+        elif path in ("", "/"):
+            self._send(200, self._viewer(HOME_PAGE_USERNAME, TRAY_ENTRY))
+        elif path.rstrip("/") == "/accounts/login":
+            self._send(200, LOGIN_PAGE)
+        elif path.rstrip("/") == "/accounts/edit":
+            if "sessionid=" in self.headers.get("Cookie", ""):
+                self._send(200, "<html><body>Edit profile</body></html>")
+            else:
+                self._send(302, "", headers={"Location": "/accounts/login/"})
+        else:
+            self._send(404, "Not found", "text/plain")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.split("?", 1)[0].rstrip("/") == "/accounts/login":
+            self._send(302, "", headers={"Location": "/", "Set-Cookie": "sessionid=benchmark; Path=/"})
+        else:
+            self._send(404, "Not found", "text/plain")
+
+
+def start_fake_instagram(port=0, settings=None):
+    """Serve the fake site from a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (FakeInstagramHandler,), {"settings": settings or FakeInstagramSettings()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def session_cookies(base_url):
+    """Cookies for a logged-in session on the fake site, in Playwright's add_cookies format."""
+    return [{"name": "sessionid", "value": "benchmark", "url": base_url}]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Instagram story viewer")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--stories", type=int, default=3, help="stories per account")
+    parser.add_argument("--page-latency-ms", type=float, default=50)
+    parser.add_argument("--media-latency-ms", type=float, default=30)
+    args = parser.parse_args()
+    settings = FakeInstagramSettings(args.stories, args.page_latency_ms, args.media_latency_ms)
+    server, url = start_fake_instagram(args.port, settings)
+    print(f"Fake Instagram on {url} (set INSTAGRAM_BASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,228 @@
+"""OpenAI-compatible chat completions endpoint for offline benchmarks.
+
+Answers ``POST /v1/chat/completions`` after a configurable delay, with token
+counts taken from the settings rather than a tokenizer. Structured-output
+requests get a JSON document generated from the request's schema, streamed
+requests get server-sent events. Point the SDK at it with
+``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+    python -m benchmarks.fake_openai --port 8400 --latency-ms 800
+"""
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_CHUNK_CHARS = 24
+
+# Reply for streamed newsletter copy (see newsletter_stream.STREAM_SYSTEM_PROMPT)
+MARKED_COPY = """@@SUBJECT
+Your benchmark digest
+@@TAGLINE
+Stories from the fake feed
+@@INTRO
+Here is what everyone shared today.
+@@SIGNOFF
+See you tomorrow!
+@@END
+"""
+
+
+class FakeOpenAISettings:
+    """Latency and usage reported by the fake endpoint; shared by all request threads."""
+
+    def __init__(self, latency_ms=500, jitter_ms=100, prompt_tokens=None, completion_tokens=150,
+                 tokens_per_image=765, error_rate=0.0, stream_chunk_ms=20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # None estimates prompt tokens from the request (text length / 4 plus tokens_per_image per image)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.tokens_per_image = tokens_per_image
+        self.error_rate = error_rate
+        self.stream_chunk_ms = stream_chunk_ms
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._choices = itertools.count()
+
+    def next_choice(self):
+        return next(self._choices)
+
+    def count(self, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+
+
+def _resolve(schema, root):
+    while "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        schema = root.get("$defs", root.get("definitions", {}))[name]
+    return schema
+
+
+def sample_from_schema(schema, root, settings, items=1, name=""):
+    """A small valid instance of a JSON schema (objects, arrays, enums, refs and scalars)."""
+    schema = _resolve(schema, root)
+    if "enum" in schema:
+        return schema["enum"][settings.next_choice() % len(schema["enum"])]
+    if "const" in schema:
+        return schema["const"]
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if _resolve(s, root).get("type") != "null"] or schema[key]
+            return sample_from_schema(options[0], root, settings, items, name)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {key: sample_from_schema(value, root, settings, items, key)
+                for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), root, settings, 1, name) for _ in range(items)]
+    if kind == "integer":
+        return settings.next_choice() % max(items, 1)
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return f"Benchmark {name.replace('_', ' ') or 'text'}"
+
+
+def _count_images(messages):
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            images += sum(1 for part in content if part.get("type") == "image_url")
+    return images
+
+
+def _prompt_tokens(messages, settings):
+    if settings.prompt_tokens is not None:
+        return settings.prompt_tokens
+    text = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            text += len(content)
+        else:
+            text += sum(len(part.get("text", "")) for part in content or [] if part.get("type") == "text")
+    return text // 4 + _count_images(messages) * settings.tokens_per_image
+
+
+def _reply_content(request, settings):
+    messages = request.get("messages", [])
+    response_format = request.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        # One array entry per image, so multi-story vision calls get one story each
+        return json.dumps(sample_from_schema(schema, schema, settings, max(_count_images(messages), 1)))
+    system = next((m.get("content") for m in messages if m.get("role") == "system"), "") or ""
+    if isinstance(system, str) and "@@SUBJECT" in system:
+        return MARKED_COPY
+    return "Subject: Your benchmark digest\n\n<html><body><p>Benchmark newsletter.</p></body></html>"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    settings = FakeOpenAISettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+
+        delay = max(0, settings.latency_ms + random.uniform(-settings.jitter_ms, settings.jitter_ms))
+        time.sleep(delay / 1000)
+        if settings.error_rate and random.random() < settings.error_rate:
+            settings.count(error=True)
+            self._send_json(503, {"error": {"message": "Simulated overload", "type": "server_error"}})
+            return
+        settings.count()
+
+        content = _reply_content(request, settings)
+        usage = {
+            "prompt_tokens": _prompt_tokens(request.get("messages", []), settings),
+            "completion_tokens": settings.completion_tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"chatcmpl-bench{settings.requests}", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o")}
+
+        if request.get("stream"):
+            self._stream(base, content, usage, (request.get("stream_options") or {}).get("include_usage"))
+            return
+        self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }]))
+
+    def _stream(self, base, content, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(body):
+            self.wfile.write(f"data: {json.dumps(dict(base, object='chat.completion.chunk', **body))}\n\n".encode())
+            self.wfile.flush()
+
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            event({"choices": [{"index": 0, "delta": {"content": content[start:start + STREAM_CHUNK_CHARS]},
+                                "finish_reason": None}]})
+            time.sleep(self.settings.stream_chunk_ms / 1000)
+        event({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            event({"choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_fake_openai(port=0, settings=None):
+    """Serve the fake endpoint from a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (FakeOpenAIHandler,), {"settings": settings or FakeOpenAISettings()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--prompt-tokens", type=int, default=None)
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    settings = FakeOpenAISettings(args.latency_ms, args.jitter_ms, args.prompt_tokens,
+                                  args.completion_tokens, error_rate=args.error_rate)
+    server, url = start_fake_openai(args.port, settings)
+    print(f"Fake OpenAI endpoint on {url} (set OPENAI_BASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,62 @@
+"""Local SMTP sink for offline benchmarks, built on aiosmtpd.
+
+Accepts every message without authentication or TLS and only counts them.
+Send to it with ``SMTP_SERVER=127.0.0.1 SMTP_PORT=<port> SMTP_USE_SSL=false``.
+
+    python -m benchmarks.fake_smtp --port 8025
+"""
+import time
+import socket
+import asyncio
+import argparse
+import threading
+
+
+class CountingHandler:
+    """aiosmtpd handler that records message count, size and an optional per-message delay."""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.messages += 1
+            self.bytes += len(envelope.content or b"")
+        return "250 Message accepted for delivery"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_smtp(port=0, latency_ms=0):
+    """Start an aiosmtpd server in its own thread; returns (controller, handler, port)."""
+    from aiosmtpd.controller import Controller
+
+    handler = CountingHandler(latency_ms)
+    port = port or _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller, handler, port
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    controller, handler, port = start_fake_smtp(args.port, args.latency_ms)
+    print(f"SMTP sink on 127.0.0.1:{port} (set SMTP_SERVER=127.0.0.1 SMTP_PORT={port} SMTP_USE_SSL=false)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{handler.messages} messages, {handler.bytes / 1024:.0f} KB received")
+    except KeyboardInterrupt:
+        controller.stop()
@@ -0,0 +1,230 @@
+"""Run the real pipeline offline against local fakes and report per-stage performance.
+
+Starts the fake Instagram site, the fake OpenAI endpoint and an aiosmtpd sink,
+then captures, analyzes, renders, builds the PDF and emails the newsletter for
+N accounts x M stories in a scratch directory. Reports throughput, per-span
+p50/p95 latency (from instrumentation) and memory per phase, and compares them
+with the stored baseline for the same scenario.
+
+    python -m benchmarks.run_benchmark --accounts 10 --stories 3
+    python -m benchmarks.run_benchmark --accounts 10 --stories 3 --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+
+from benchmarks.fake_instagram import FakeInstagramSettings, start_fake_instagram, session_cookies
+from benchmarks.fake_openai import FakeOpenAISettings, start_fake_openai
+from benchmarks.fake_smtp import start_fake_smtp
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_ROOT, "benchmarks", "baselines")
+
+# A phase or span is reported as a regression when it is this many times slower than
+# its baseline, and by at least BENCHMARK_MIN_REGRESSION_SECONDS (can be overridden in .env)
+BENCHMARK_REGRESSION_THRESHOLD = float(os.getenv("BENCHMARK_REGRESSION_THRESHOLD", "1.25"))
+BENCHMARK_MIN_REGRESSION_SECONDS = float(os.getenv("BENCHMARK_MIN_REGRESSION_SECONDS", "0.05"))
+
+MB = 1024 * 1024
+
+
+def _rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / MB if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return None
+
+
+@contextmanager
+def phase(results, name):
+    """Time a benchmark phase and record its Python heap peak (tracemalloc) and process peak RSS."""
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        results[name] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "peak_python_mb": round(tracemalloc.get_traced_memory()[1] / MB, 1),
+            "peak_rss_mb": _rss_mb(),
+        }
+
+
+def configure_environment(workdir, instagram_url, openai_url, smtp_port):
+    """Point the pipeline at the fakes. Must run before any pipeline module is imported."""
+    os.environ.update({
+        "INSTAGRAM_BASE_URL": instagram_url,
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_KEY": "benchmark",
+        "AGENTOPS_API_KEY": "",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_USE_SSL": "false",
+        "SMTP_STARTTLS": "false",
+        "EMAIL_DELIVERY_MODE": "direct",
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.sqlite3"),
+        "CHECKPOINT_DIR": os.path.join(workdir, "checkpoints"),
+        "STORY_INDEX_PATH": os.path.join(workdir, "story_index.sqlite3"),
+        "RUN_LOG_PATH": os.path.join(workdir, "run_log.jsonl"),
+    })
+    # Client-side rate limits would otherwise dominate the numbers; set them in the
+    # environment to benchmark with the production limits
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+
+
+def run_pipeline(args, instagram_url, smtp_port):
+    """The measured part: every stage of the story newsletter pipeline, each as one phase."""
+    from instrumentation import start_run, end_run
+    from story_pipeline import capture_and_analyze
+    from async_story_extractor import extract_stories_concurrently
+    from async_analysis import analyze_stories_concurrently
+    from instagram_story_newsletter import generate_enhanced_newsletter, save_newsletter_to_file, extract_subject_line
+    from ig_agents import create_pdf
+    from mime_assembly import NewsletterMessage, resolve_inline_images
+    from smtp_pool import SMTPPool
+
+    cookies = session_cookies(instagram_url)
+    usernames = [f"bench_user_{i + 1}" for i in range(args.accounts)]
+    recipients = [f"reader{i + 1}@example.com" for i in range(args.recipients)]
+    phases = {}
+
+    start_run("benchmark", accounts=args.accounts, stories=args.stories)
+    if args.overlap:
+        with phase(phases, "capture_analyze"):
+            screenshots, report = capture_and_analyze(cookies, usernames, args.stories,
+                                                      max_concurrency=args.concurrency)
+    else:
+        with phase(phases, "capture"):
+            results = extract_stories_concurrently(cookies, usernames, args.stories,
+                                                   max_concurrency=args.concurrency)
+            screenshots = [path for result in results for path in result["screenshots"]]
+        with phase(phases, "analyze"):
+            report = analyze_stories_concurrently(screenshots)
+
+    with phase(phases, "newsletter"):
+        newsletter = generate_enhanced_newsletter(report, "Benchmark Reader")
+        newsletter_file = save_newsletter_to_file(newsletter, "benchmark_newsletter.html", screenshots, True, report)
+
+    with phase(phases, "pdf"):
+        pdf_file = create_pdf(screenshots)
+
+    with phase(phases, "email"):
+        with open(newsletter_file, encoding="utf-8") as f:
+            html, inline_images = resolve_inline_images(f.read(), [os.getcwd()])
+        message = NewsletterMessage(inline_images, [pdf_file] if pdf_file else [], verbose=False)
+        subject = extract_subject_line(newsletter)
+        pool = SMTPPool("127.0.0.1", smtp_port, use_ssl=False, starttls=False)
+        failures = [item for item, error in pool.send_bulk(
+            recipients, "benchmark@example.com",
+            build=lambda recipient: message.build("benchmark@example.com", recipient, subject, html),
+        ) if error]
+        pool.close()
+
+    summary = end_run(ok=not failures)
+    return {"phases": phases, "stories": len(screenshots or []), "emails_failed": len(failures),
+            "stages": summary["stages"], "counters": summary["counters"]}
+
+
+def print_report(result):
+    total = sum(p["seconds"] for p in result["phases"].values())
+    print(f"\n=== Benchmark {result['scenario']}: {result['stories']} stories in {total:.1f}s "
+          f"({result['stories'] / total if total else 0:.2f} stories/s) ===")
+    print(f"{'phase':<16} {'seconds':>8} {'stories/s':>10} {'py peak MB':>11} {'RSS MB':>8}")
+    for name, p in result["phases"].items():
+        rate = result["stories"] / p["seconds"] if p["seconds"] else 0
+        rss = f"{p['peak_rss_mb']:.0f}" if p["peak_rss_mb"] else "-"
+        print(f"{name:<16} {p['seconds']:>8.2f} {rate:>10.2f} {p['peak_python_mb']:>11.1f} {rss:>8}")
+    print(f"\n{'span':<16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name, stage in sorted(result["stages"].items()):
+        print(f"{name:<16} {stage['count']:>6} {stage['p50_seconds'] * 1000:>8.0f} "
+              f"{stage['p95_seconds'] * 1000:>8.0f} {stage['errors']:>7}")
+
+
+def compare_with_baseline(result, baseline):
+    """List (metric, baseline, current) for phases and span p95s that regressed past the threshold."""
+    pairs = [(f"phase {name}", baseline["phases"].get(name, {}).get("seconds"), p["seconds"])
+             for name, p in result["phases"].items()]
+    pairs += [(f"span {name} p95", baseline["stages"].get(name, {}).get("p95_seconds"), stage["p95_seconds"])
+              for name, stage in result["stages"].items()]
+    return [(metric, before, now) for metric, before, now in pairs
+            if before and now > before * BENCHMARK_REGRESSION_THRESHOLD
+            and now - before >= BENCHMARK_MIN_REGRESSION_SECONDS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against local fakes")
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--stories", type=int, default=3, help="stories per account")
+    parser.add_argument("--recipients", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=None, help="accounts captured at once")
+    parser.add_argument("--no-overlap", dest="overlap", action="store_false",
+                        help="capture all stories before analyzing instead of the dataflow")
+    parser.add_argument("--openai-latency-ms", type=float, default=800)
+    parser.add_argument("--openai-completion-tokens", type=int, default=150)
+    parser.add_argument("--page-latency-ms", type=float, default=50)
+    parser.add_argument("--smtp-latency-ms", type=float, default=0)
+    parser.add_argument("--baseline", default=None, help="baseline name (default: derived from the scenario)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args()
+
+    scenario = args.baseline or f"{args.accounts}x{args.stories}{'' if args.overlap else '-sequential'}"
+    instagram, instagram_url = start_fake_instagram(settings=FakeInstagramSettings(
+        args.stories, page_latency_ms=args.page_latency_ms))
+    openai_server, openai_url = start_fake_openai(settings=FakeOpenAISettings(
+        args.openai_latency_ms, completion_tokens=args.openai_completion_tokens))
+    smtp, smtp_handler, smtp_port = start_fake_smtp(latency_ms=args.smtp_latency_ms)
+
+    # The pipeline runs in a scratch directory, so make its modules importable from anywhere
+    original_dir = os.getcwd()
+    sys.path.insert(0, REPO_ROOT)
+    with tempfile.TemporaryDirectory(prefix="ig-benchmark-") as workdir:
+        configure_environment(workdir, instagram_url, openai_url, smtp_port)
+        os.chdir(workdir)
+        tracemalloc.start()
+        try:
+            result = run_pipeline(args, instagram_url, smtp_port)
+        finally:
+            tracemalloc.stop()
+            os.chdir(original_dir)
+            instagram.shutdown()
+            openai_server.shutdown()
+            smtp.stop()
+
+    result.update(scenario=scenario, recorded_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+                  settings={k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")},
+                  smtp_messages=smtp_handler.messages)
+    print_report(result)
+
+    baseline_path = os.path.join(BASELINE_DIR, f"{scenario}.json")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline for {scenario}; run with --save-baseline to record one")
+        return 0
+
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(result, baseline)
+    if not regressions:
+        print(f"\nNo regressions against baseline {scenario} ({baseline.get('recorded_at')})")
+        return 0
+    print(f"\nRegressions against baseline {scenario} ({baseline.get('recorded_at')}):")
+    for metric, before, now in regressions:
+        print(f"  {metric}: {before:.3f}s -> {now:.3f}s ({now / before:.2f}x)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
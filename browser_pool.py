@@ -0,0 +1,127 @@
+import os
+import atexit
+from contextlib import contextmanager
+
+# Pool settings (can be overridden in .env)
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() not in ("false", "0", "no")
+BROWSER_CONTEXT_MAX_USES = int(os.getenv("BROWSER_CONTEXT_MAX_USES", "20"))
+
+
+class BrowserPool:
+    """Keeps one Chromium instance alive per process and hands out an isolated
+    BrowserContext per account/target key.
+
+    Contexts are reused across calls with the same key and recycled once they
+    have served ``max_context_uses`` checkouts. Uses the Playwright sync API,
+    so a pool must only be used from the thread that created it.
+    """
+
+    def __init__(self, headless=BROWSER_HEADLESS, max_context_uses=BROWSER_CONTEXT_MAX_USES):
+        self.headless = headless
+        self.max_context_uses = max_context_uses
+        self._playwright = None
+        self._browser = None
+        self._contexts = {}
+
+    def _ensure_browser(self):
+        """Start Playwright and Chromium on first use, or again if the browser died."""
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+
+        from playwright.sync_api import sync_playwright
+
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        print(f"Launching shared Chromium browser (headless={self.headless})...")
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self._contexts.clear()
+        return self._browser
+
+    def _get_entry(self, key, storage_state=None):
+        entry = self._contexts.get(key)
+        if entry is None:
+            browser = self._ensure_browser()
+            if storage_state:
+                context = browser.new_context(storage_state=storage_state)
+            else:
+                context = browser.new_context()
+            entry = {"context": context, "uses": 0}
+            self._contexts[key] = entry
+        return entry
+
+    @contextmanager
+    def context(self, key, cookies=None, storage_state=None):
+        """Check out the BrowserContext for ``key``, creating it if needed."""
+        entry = self._get_entry(key, storage_state)
+        context = entry["context"]
+        if cookies:
+            context.add_cookies(cookies)
+        try:
+            yield context
+        finally:
+            entry["uses"] += 1
+            if entry["uses"] >= self.max_context_uses:
+                print(f"Recycling browser context '{key}' after {entry['uses']} uses")
+                self.close_context(key)
+
+    @contextmanager
+    def page(self, key, cookies=None, storage_state=None):
+        """Open a fresh page in the context for ``key`` and close it afterwards."""
+        with self.context(key, cookies=cookies, storage_state=storage_state) as context:
+            page = context.new_page()
+            try:
+                yield page
+            finally:
+                try:
+                    if not page.is_closed():
+                        page.close()
+                except Exception:
+                    pass
+
+    def close_context(self, key):
+        """Close and forget the context for ``key``."""
+        entry = self._contexts.pop(key, None)
+        if entry:
+            try:
+                entry["context"].close()
+            except Exception as e:
+                print(f"Warning: Error closing browser context '{key}': {e}")
+
+    def shutdown(self):
+        """Close every context, the browser and Playwright."""
+        for key in list(self._contexts):
+            self.close_context(key)
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                print(f"Warning: Error closing browser: {e}")
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                print(f"Warning: Error stopping Playwright: {e}")
+            self._playwright = None
+
+
+_pool = None
+
+
+def get_browser_pool():
+    """Return the process-wide browser pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+
+def shutdown_browser_pool():
+    """Shut down the process-wide browser pool if it was started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+atexit.register(shutdown_browser_pool)
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from datetime import datetime
+
+# Directory holding one JSON checkpoint file per pipeline run (can be overridden in .env)
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", ".checkpoints")
+
+# Unfinished runs older than this are not resumed; stories expire after 24 hours anyway (seconds)
+CHECKPOINT_MAX_AGE_SECONDS = int(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", str(12 * 3600)))
+
+
+def fingerprint(inputs):
+    """Stable hash of a run's inputs; runs resume only when their inputs match."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def files_exist(value):
+    """Checkpoint check for stages whose output is a file path, a list of paths, or a dict of them."""
+    if isinstance(value, str):
+        return os.path.exists(value)
+    if isinstance(value, dict):
+        return all(files_exist(v) for v in value.values() if isinstance(v, (str, list)))
+    if isinstance(value, list):
+        return bool(value) and all(files_exist(v) for v in value)
+    return True
+
+
+class PipelineRun:
+    """Stage checkpoints for one pipeline run, saved as JSON after every stage.
+
+    A new run picks up the latest unfinished run of the same pipeline with the
+    same input fingerprint, so a failure late in the pipeline doesn't repeat
+    the capture and analysis stages. Stage values must be JSON-serializable;
+    store file paths rather than file contents.
+    """
+
+    def __init__(self, pipeline, inputs, resume=True, directory=CHECKPOINT_DIR):
+        self.pipeline = pipeline
+        self.fingerprint = fingerprint(inputs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.state = self._find_resumable() if resume else None
+        if self.state:
+            done = ", ".join(self.state["stages"]) or "none"
+            print(f"Resuming run {self.state['run_id']} (completed stages: {done})")
+        else:
+            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            self.state = {"run_id": run_id, "pipeline": pipeline, "fingerprint": self.fingerprint,
+                          "created_at": time.time(), "completed": False, "inputs": inputs, "stages": {}}
+            self._write()
+
+    @property
+    def run_id(self):
+        return self.state["run_id"]
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.run_id}.json")
+
+    def _find_resumable(self):
+        latest = None
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if (state.get("pipeline") == self.pipeline and state.get("fingerprint") == self.fingerprint
+                    and not state.get("completed")
+                    and time.time() - state.get("created_at", 0) < CHECKPOINT_MAX_AGE_SECONDS
+                    and (latest is None or state["created_at"] > latest["created_at"])):
+                latest = state
+        return latest
+
+    def _write(self):
+        # Write to a temporary file first so a crash never leaves a half-written checkpoint
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+    def get(self, stage, check=None):
+        """Return the saved output of ``stage``, or None if it hasn't completed (or fails ``check``)."""
+        entry = self.state["stages"].get(stage)
+        if entry is None:
+            return None
+        if check and not check(entry["value"]):
+            print(f"Checkpoint for stage '{stage}' is no longer valid; running it again")
+            del self.state["stages"][stage]
+            return None
+        print(f"Using checkpoint for stage '{stage}' from run {self.run_id}")
+        return entry["value"]
+
+    def save(self, stage, value):
+        self.state["stages"][stage] = {"value": value, "saved_at": time.time()}
+        self._write()
+        return value
+
+    def complete(self):
+        """Mark the run finished so the next run with the same inputs starts fresh."""
+        self.state["completed"] = True
+        self._write()
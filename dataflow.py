@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+
+# Items allowed to wait between two stages before the upstream stage blocks (can be overridden in .env)
+DATAFLOW_QUEUE_SIZE = int(os.getenv("DATAFLOW_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a dataflow pipeline.
+
+    ``fn`` is an async callable taking one item and returning the item for the
+    next stage, or None to drop it. ``workers`` copies run concurrently, and
+    ``queue_size`` bounds the items waiting in front of this stage.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size or DATAFLOW_QUEUE_SIZE
+        self.metrics = {"items": 0, "dropped": 0, "errors": 0, "busy_seconds": 0.0,
+                        "first_done": None, "last_done": None, "max_queue": 0}
+
+
+async def run_dataflow(source, stages):
+    """Push every item from the async iterable ``source`` through ``stages``.
+
+    Stages run concurrently, each item moving on as soon as its stage is done
+    with it, so end-to-end time approaches the slowest stage rather than the
+    sum of all of them. Full queues make upstream stages wait (backpressure).
+    Returns the outputs of the last stage in completion order; an item whose
+    stage raises is reported and dropped.
+    """
+    started = time.perf_counter()
+    queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in stages]
+    outputs = []
+
+    async def feed():
+        try:
+            async for item in source:
+                await queues[0].put(item)
+                stages[0].metrics["max_queue"] = max(stages[0].metrics["max_queue"], queues[0].qsize())
+        except Exception as e:
+            print(f"Dataflow source failed: {e}")
+        finally:
+            for _ in range(stages[0].workers):
+                await queues[0].put(_DONE)
+
+    async def worker(i, stage):
+        metrics = stage.metrics
+        while True:
+            item = await queues[i].get()
+            if item is _DONE:
+                return
+            busy_from = time.perf_counter()
+            try:
+                result = await stage.fn(item)
+            except Exception as e:
+                print(f"Stage {stage.name} failed: {e}")
+                metrics["errors"] += 1
+                metrics["busy_seconds"] += time.perf_counter() - busy_from
+                continue
+            now = time.perf_counter()
+            metrics["busy_seconds"] += now - busy_from
+            metrics["first_done"] = metrics["first_done"] or now - started
+            metrics["last_done"] = now - started
+            if result is None:
+                metrics["dropped"] += 1
+                continue
+            metrics["items"] += 1
+            if i + 1 < len(stages):
+                await queues[i + 1].put(result)
+                stages[i + 1].metrics["max_queue"] = max(stages[i + 1].metrics["max_queue"], queues[i + 1].qsize())
+            else:
+                outputs.append(result)
+
+    async def run_stage(i, stage):
+        await asyncio.gather(*(worker(i, stage) for _ in range(stage.workers)))
+        if i + 1 < len(stages):
+            for _ in range(stages[i + 1].workers):
+                await queues[i + 1].put(_DONE)
+
+    await asyncio.gather(feed(), *(run_stage(i, stage) for i, stage in enumerate(stages)))
+    print_dataflow_metrics(stages, time.perf_counter() - started)
+    return outputs
+
+
+def print_dataflow_metrics(stages, elapsed):
+    """Per-stage item counts and busy time, against the run's wall-clock time."""
+    print(f"\n--- Dataflow: {elapsed:.1f}s wall clock, "
+          f"{sum(stage.metrics['busy_seconds'] for stage in stages):.1f}s of stage work ---")
+    for stage in stages:
+        m = stage.metrics
+        window = f"{m['first_done']:.1f}s-{m['last_done']:.1f}s" if m["first_done"] is not None else "idle"
+        print(f"{stage.name:<12} {m['items']:>4} out, {m['dropped']} dropped, {m['errors']} errors, "
+              f"busy {m['busy_seconds']:.1f}s, active {window}, max queue {m['max_queue']}")
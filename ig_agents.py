@@ -1,31 +1,36 @@
 import os
 import time
-import smtplib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
-from fpdf import FPDF
-from email.message import EmailMessage
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from playwright.sync_api import sync_playwright
-from agents import Agent, Runner, tool
-import agentops
-
-# Load environment variables
+
+# Load environment variables before the project modules read their settings
 load_dotenv()
 
-# Initialize AgentOps if key is available
-agentops_key = os.getenv("AGENTOPS_API_KEY")
-if agentops_key:
-    agentops.init(agentops_key)
-else:
-    print("AgentOps API key not found, skipping trace export")
+from browser_pool import get_browser_pool
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    wait_for_any_selector,
+    wait_for_page_ready,
+    wait_for_story_media,
+)
+import session_store
+from smtp_pool import get_smtp_pool, parse_recipients
+from mime_assembly import (
+    NewsletterMessage,
+    print_assembly_stats,
+    print_attachment_savings,
+    resolve_inline_images,
+)
+from outbox import EMAIL_DELIVERY_MODE, queue_newsletter
+from checkpoint_store import PipelineRun, files_exist
+from pdf_digest import build_pdf_digest
+from tracing import init_agentops
+from instrumentation import span, instrumented_run
+
 
-# Ensure the folder for screenshots exists
+# Folder for screenshots (created on first capture)
 IMAGE_FOLDER = "instagram_stories"
-if not os.path.exists(IMAGE_FOLDER):
-    os.makedirs(IMAGE_FOLDER)
 
 #############################
 # INSTAGRAM SCRAPING SECTION
@@ -37,26 +42,26 @@ def login_instagram():
     
     instagram_user = os.getenv('INSTAGRAM_USER')
     instagram_pass = os.getenv('INSTAGRAM_PASS')
+    if instagram_user:
+        cookies = session_store.get_valid_cookies(instagram_user)
+        if cookies:
+            print(f"Reusing saved Instagram session for {instagram_user}")
+            return cookies
     if not instagram_user or not instagram_pass:
         print("Error: Instagram credentials not found in .env file")
         return None
     
     print(f"Logging in as {instagram_user}...")
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto("https://instagram.com/accounts/login")
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)
+        with get_browser_pool().page(f"login:{instagram_user}") as page:
+            page.goto(f"{session_store.INSTAGRAM_BASE_URL}/accounts/login/")
+            wait_for_page_ready(page)
+            wait_for_any_selector(page, ['input[name="username"]'], step="login_form")
             page.fill('input[name="username"]', instagram_user)
-            page.wait_for_timeout(1000)
             page.fill('input[name="password"]', instagram_pass)
-            page.wait_for_timeout(1000)
             page.click("button[type='submit']")
             
             print("Waiting for login to complete...")
-            page.wait_for_timeout(5000)
             selectors = [
                 "xpath=//div[contains(text(),'Home')]",
                 "[aria-label='Home']",
@@ -64,26 +69,21 @@ def login_instagram():
                 "[role='main']",
             ]
             success = False
-            for selector in selectors:
-                try:
-                    if page.wait_for_selector(selector, timeout=5000):
-                        print(f"Login confirmed with selector: {selector}")
-                        success = True
-                        break
-                except Exception:
-                    continue
+            selector = wait_for_any_selector(page, selectors, step="login_complete")
+            if selector:
+                print(f"Login confirmed with selector: {selector}")
+                success = True
             if not success:
-                if "instagram.com" in page.url and "accounts/login" not in page.url:
+                if page.url.startswith(session_store.INSTAGRAM_BASE_URL) and "accounts/login" not in page.url:
                     print(f"Login appears successful based on URL: {page.url}")
                     success = True
             if success:
                 print("Login successful!")
                 cookies = page.context.cookies()
-                browser.close()
+                session_store.save_session(instagram_user, page.context.storage_state())
                 return cookies
             else:
                 print("Could not confirm successful login.")
-                browser.close()
                 return None
     except Exception as e:
         print(f"Error setting up browser: {e}")
@@ -98,14 +98,11 @@ def screenshot_stories(cookies, num_stories=5):
         return screenshots
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            context.add_cookies(cookies)
-            page = context.new_page()
-            page.goto("https://instagram.com")
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)
+        os.makedirs(IMAGE_FOLDER, exist_ok=True)
+        with get_browser_pool().page("stories:feed", cookies=cookies) as page:
+            with span("navigate", page="feed"):
+                page.goto(session_store.INSTAGRAM_BASE_URL)
+                wait_for_page_ready(page)
             page.screenshot(path=os.path.join(IMAGE_FOLDER, "instagram_home.png"))
             
             print("Looking for Instagram stories...")
@@ -116,33 +113,30 @@ def screenshot_stories(cookies, num_stories=5):
                 "xpath=//section//div/div/div/div[1]/div/div/div/div/div/div/div[1]"
             ]
             success = False
-            for selector in story_selectors:
+            selector = wait_for_any_selector(page, story_selectors, step="story_tray")
+            if selector:
                 try:
-                    if page.wait_for_selector(selector, timeout=5000):
-                        print(f"Story found with selector: {selector}")
-                        page.click(selector)
-                        page.wait_for_timeout(2000)
-                        success = True
-                        break
+                    print(f"Story found with selector: {selector}")
+                    page.click(selector)
+                    wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
+                    success = True
                 except Exception as e:
                     print(f"Selector {selector} failed: {e}")
-                    continue
             if not success:
                 print("Could not find any stories using available selectors")
-                browser.close()
                 return screenshots
             
             print("Capturing screenshots of stories...")
+            previous_src = None
             for i in range(num_stories):
-                page.wait_for_timeout(2000)
-                screenshot_path = os.path.join(IMAGE_FOLDER, f"story_{i+1}.png")
-                page.screenshot(path=screenshot_path)
+                with span("story_capture", story=i + 1):
+                    previous_src = wait_for_story_media(page, previous_src) or previous_src
+                    screenshot_path = os.path.join(IMAGE_FOLDER, f"story_{i+1}.png")
+                    page.screenshot(path=screenshot_path)
                 screenshots.append(screenshot_path)
                 print(f"Screenshot saved as {screenshot_path}")
                 page.keyboard.press('ArrowRight')
-                page.wait_for_timeout(1000)
             
-            browser.close()
             print(f"Captured {len(screenshots)} screenshots")
     except Exception as e:
         print(f"Error capturing stories: {e}")
@@ -156,23 +150,7 @@ def create_pdf(screenshots):
         print("Error: No screenshots provided. Cannot create PDF.")
         return None
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 24)
-        pdf.cell(0, 20, "Instagram Stories Digest", 0, 1, "C")
-        pdf.set_font("Arial", "I", 12)
-        pdf.cell(0, 10, f"Generated on {datetime.now().strftime('%Y-%m-%d')}", 0, 1, "C")
-        pdf.cell(0, 10, f"Contains {len(screenshots)} stories", 0, 1, "C")
-        for image in screenshots:
-            pdf.add_page()
-            try:
-                pdf.image(image, x=10, y=10, w=190)
-                print(f"Added {image} to PDF")
-            except Exception as e:
-                print(f"Error adding {image} to PDF: {e}")
-                continue
-        pdf_filename = "instagram_digest.pdf"
-        pdf.output(pdf_filename)
+        pdf_filename = build_pdf_digest(screenshots, "instagram_digest.pdf")
         print(f"PDF digest created: {pdf_filename}")
         return pdf_filename
     except Exception as e:
@@ -183,14 +161,20 @@ def create_pdf(screenshots):
 # NEWSLETTER GENERATION SECTION
 #############################
 
-# Define a newsletter agent for AI content analysis and newsletter creation
-newsletter_agent = Agent(
-    name="InstagramDigestAgent",
-    instructions="""You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
+NEWSLETTER_AGENT_INSTRUCTIONS = """You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
 Your task is to analyze Instagram story screenshots (represented by their filenames), identify key themes and topics,
 and generate an HTML-formatted newsletter email with a catchy subject line, personalized greeting, content summary,
 and friendly sign-off."""
-)
+
+_newsletter_agent = None
+
+def get_newsletter_agent():
+    """The newsletter agent for AI content analysis and newsletter creation, created on first use."""
+    global _newsletter_agent
+    if _newsletter_agent is None:
+        from agents import Agent
+        _newsletter_agent = Agent(name="InstagramDigestAgent", instructions=NEWSLETTER_AGENT_INSTRUCTIONS)
+    return _newsletter_agent
 
 MOCK_ANALYSIS = """
 Based on the screenshots captured, the stories show a mix of personal updates, product highlights, and interactive content.
@@ -226,7 +210,8 @@ Include potential topics, text elements, and engagement cues."""
         return MOCK_ANALYSIS
     
     try:
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         return result.final_output
     except Exception as e:
         print(f"Error during AI analysis: {e}")
@@ -246,7 +231,8 @@ a summary of the highlights, and a friendly sign-off."""
         return MOCK_NEWSLETTER
     
     try:
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         return result.final_output
     except Exception as e:
         print(f"Error during newsletter generation: {e}")
@@ -263,70 +249,47 @@ def send_newsletter_email(pdf_filename, newsletter_content):
     # Load email credentials from environment variables
     sender_email = os.getenv("EMAIL_USER")
     sender_password = os.getenv("EMAIL_PASS")
-    recipient_email = os.getenv("RECEIVER_EMAIL")
-    if not sender_email or not sender_password or not recipient_email:
+    # RECEIVER_EMAIL may hold several comma-separated addresses
+    recipients = parse_recipients(os.getenv("RECEIVER_EMAIL"))
+    if not sender_email or not sender_password or not recipients:
         print("Error: Email credentials missing in .env file")
         return False
 
-    # Create the root message as 'related' to include inline images
-    msg = MIMEMultipart("related")
     # Try to extract subject line from newsletter_content; else use default subject
     subject_line = "Your Instagram Digest for " + datetime.now().strftime("%Y-%m-%d")
     for line in newsletter_content.splitlines():
         if line.startswith("Subject:"):
             subject_line = line.replace("Subject:", "").strip()
             break
-    msg["Subject"] = subject_line
-    msg["From"] = sender_email
-    msg["To"] = recipient_email
-
-    # Create an 'alternative' part for plain text and HTML versions
-    alternative = MIMEMultipart("alternative")
-    msg.attach(alternative)
-    plain_text = "This email contains HTML content with inline images. Please view it in an HTML-capable email client."
-    alternative.attach(MIMEText(plain_text, "plain"))
-
-    # Attach the HTML content
-    if "<html>" in newsletter_content:
-        alternative.attach(MIMEText(newsletter_content, "html"))
-    else:
-        alternative.attach(MIMEText(newsletter_content, "plain"))
-    
-    # Attach inline images from the IMAGE_FOLDER
-    for filename in os.listdir(IMAGE_FOLDER):
-        if filename.lower().endswith(".png"):
-            filepath = os.path.join(IMAGE_FOLDER, filename)
-            try:
-                with open(filepath, "rb") as img_file:
-                    img_data = img_file.read()
-                img = MIMEImage(img_data)
-                img.add_header("Content-ID", f"<{filename}>")
-                img.add_header("Content-Disposition", "inline", filename=filename)
-                msg.attach(img)
-                print(f"Attached inline image: {filename}")
-            except Exception as e:
-                print(f"Error attaching {filename}: {e}")
-    
-    # Attach the PDF digest
-    if pdf_filename and os.path.exists(pdf_filename):
-        try:
-            with open(pdf_filename, "rb") as f:
-                pdf_data = f.read()
-            part = EmailMessage()
-            part.add_attachment(pdf_data, maintype="application", subtype="pdf", filename=pdf_filename)
-            msg.attach(part)
-            print(f"Attached PDF digest: {pdf_filename}")
-        except Exception as e:
-            print(f"Error attaching PDF: {e}")
-    
-    # Send the email via SMTP_SSL
+
+    # Attach only the images the HTML shows (local paths become cid: references);
+    # they and the PDF digest are encoded once for all recipients
+    newsletter_content, inline_images = resolve_inline_images(newsletter_content, [IMAGE_FOLDER])
+    folder_images = [os.path.join(IMAGE_FOLDER, filename) for filename in os.listdir(IMAGE_FOLDER)
+                     if filename.lower().endswith(".png")] if os.path.isdir(IMAGE_FOLDER) else []
+    print_attachment_savings(inline_images, folder_images)
+    attachments = [pdf_filename] if pdf_filename and os.path.exists(pdf_filename) else []
+
+    # Hand the message to the background outbox so the pipeline doesn't wait on SMTP
+    if EMAIL_DELIVERY_MODE == "outbox":
+        queue_newsletter(sender_email, recipients, subject_line, newsletter_content, inline_images, attachments)
+        return True
+
+    # Send one copy per recipient over the pooled SMTP connections
+    message = NewsletterMessage(inline_images, attachments)
     try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", "465"))
-        print(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
+        pool = get_smtp_pool(sender_email, sender_password)
+        print(f"Sending to {len(recipients)} recipient(s) via {pool.host}:{pool.port}")
+        results = pool.send_bulk(
+            recipients, sender_email,
+            build=lambda recipient: message.build(sender_email, recipient, subject_line, newsletter_content),
+        )
+        pool.print_stats()
+        print_assembly_stats()
+        failed = [recipient for recipient, error in results if error]
+        if failed:
+            print(f"Email failed for: {', '.join(failed)}")
+            return False
         print("Email sent successfully!")
         return True
     except Exception as e:
@@ -334,15 +297,15 @@ def send_newsletter_email(pdf_filename, newsletter_content):
         return False
 
 #############################
-# AGENT-TOOL WRAPPERS
+# PIPELINE STAGES
 #############################
 
-@tool
-def scrape_instagram_and_create_pdf(num_stories: int = 5) -> dict:
-    """Agent tool to login to Instagram, scrape stories, and create a PDF digest.
-       Returns a dictionary with 'screenshots' and 'pdf_filename'."""
-    print("=== Starting scraping and PDF creation ===")
-    cookies = login_instagram()
+def capture_screenshots(num_stories=5):
+    """Login to Instagram and scrape stories; falls back to mock screenshot names."""
+    print("=== Starting scraping ===")
+    with span("login") as record:
+        cookies = login_instagram()
+        record["logged_in"] = bool(cookies)
     if not cookies:
         print("Falling back to mock cookies.")
         cookies = [{'name': 'mock', 'value': 'mock'}]
@@ -350,57 +313,143 @@ def scrape_instagram_and_create_pdf(num_stories: int = 5) -> dict:
     if not screenshots:
         print("No screenshots captured, falling back to mock screenshots.")
         screenshots = [os.path.join(IMAGE_FOLDER, f"mock_story_{i+1}.png") for i in range(num_stories)]
+    return screenshots
+
+def scrape_and_create_pdf(num_stories=5):
+    """Login to Instagram, scrape stories, and create a PDF digest.
+       Returns a dictionary with 'screenshots' and 'pdf_filename'."""
+    screenshots = capture_screenshots(num_stories)
     pdf_filename = create_pdf(screenshots)
     return {"screenshots": screenshots, "pdf_filename": pdf_filename}
 
-@tool
-def generate_instagram_newsletter(screenshots: list, recipient_name: str = "Subscriber") -> str:
-    """Agent tool to analyze screenshots and generate an HTML newsletter."""
+def create_newsletter(screenshots, recipient_name="Subscriber"):
+    """Analyze screenshots and generate the HTML newsletter."""
     analysis = analyze_screenshot_content(screenshots)
-    newsletter = generate_newsletter(analysis, recipient_name)
-    return newsletter
+    return generate_newsletter(analysis, recipient_name)
 
-@tool
-def send_newsletter(pdf_filename: str, newsletter_content: str) -> bool:
-    """Agent tool to send the newsletter email with the PDF digest and inline images."""
-    return send_newsletter_email(pdf_filename, newsletter_content)
+def save_newsletter(newsletter_content, filename=None):
+    """Write the newsletter to a file so later stages can pass it around by name."""
+    filename = filename or f"newsletter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(newsletter_content)
+    return filename
+
+#############################
+# AGENT-TOOL WRAPPERS
+#############################
+
+def scrape_instagram_and_create_pdf(num_stories: int = 5) -> dict:
+    """Agent tool to login to Instagram, scrape stories, and create a PDF digest.
+       Returns a dictionary with 'screenshots' and 'pdf_filename'."""
+    return scrape_and_create_pdf(num_stories)
+
+def generate_instagram_newsletter(screenshots: list, recipient_name: str = "Subscriber") -> str:
+    """Agent tool to analyze screenshots and generate an HTML newsletter.
+       Returns the name of the file the newsletter was saved to."""
+    return save_newsletter(create_newsletter(screenshots, recipient_name))
+
+def send_newsletter(pdf_filename: str, newsletter_filename: str) -> bool:
+    """Agent tool to send the newsletter saved in newsletter_filename with the PDF digest and inline images."""
+    with open(newsletter_filename, encoding="utf-8") as f:
+        return send_newsletter_email(pdf_filename, f.read())
+
+_agent_tools = None
+
+def get_agent_tools():
+    """The functions above wrapped as Agents SDK tools, keyed by name; the SDK is only imported here."""
+    global _agent_tools
+    if _agent_tools is None:
+        from agents import function_tool
+        _agent_tools = {fn.__name__: function_tool(fn) for fn in
+                        (scrape_instagram_and_create_pdf, generate_instagram_newsletter, send_newsletter)}
+    return _agent_tools
 
 #############################
 # ORCHESTRATION PIPELINE
 #############################
 
-def orchestrate_pipeline(num_stories: int = 5, recipient_name: str = "Subscriber"):
-    print("\n====== Instagram Newsletter Pipeline ======\n")
-    start_time = time.time()
-    
+# "direct" runs the fixed stages in code; "agent" lets an LLM agent drive each stage's tool
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "direct")
+
+def run_pipeline_direct(num_stories=5, recipient_name="Subscriber", resume=True):
+    """Run the stages in order, handing artifacts straight to the next stage (no LLM routing).
+
+    Stage outputs are checkpointed, so a run that failed at sending resumes
+    without scraping or generating again.
+    """
+    run = PipelineRun("ig_agents", {"num_stories": num_stories, "recipient_name": recipient_name}, resume=resume)
+
+    screenshots = run.get("screenshots", check=files_exist)
+    if screenshots is None:
+        screenshots = run.save("screenshots", capture_screenshots(num_stories))
+
+    # The PDF only needs the screenshots, so build it while the newsletter is generated
+    pdf_filename = run.get("pdf", check=files_exist)
+    newsletter_filename = run.get("newsletter", check=files_exist)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pdf_future = executor.submit(create_pdf, screenshots) if pdf_filename is None else None
+        if newsletter_filename is None:
+            newsletter_content = create_newsletter(screenshots, recipient_name) or MOCK_NEWSLETTER
+            newsletter_filename = run.save("newsletter", save_newsletter(newsletter_content))
+        print("Newsletter generation completed.")
+        if pdf_future:
+            pdf_filename = run.save("pdf", pdf_future.result())
+    print(f"PDF digest created: {pdf_filename}")
+
+    with open(newsletter_filename, encoding="utf-8") as f:
+        email_status = send_newsletter_email(pdf_filename, f.read())
+    if email_status:
+        run.complete()
+    return email_status
+
+def run_pipeline_agents(num_stories=5, recipient_name="Subscriber"):
+    """Run each stage through an LLM agent that calls the stage's tool, for interactive use."""
+    from agents import Agent, Runner
+    tools = get_agent_tools()
     # Step 1: Scrape Instagram and create PDF digest
     scraper_agent = Agent(
         name="InstagramScraper",
-        instructions="Execute the scrape_instagram_and_create_pdf tool to capture stories and create a PDF digest."
+        instructions="Execute the scrape_instagram_and_create_pdf tool to capture stories and create a PDF digest.",
+        tools=[tools["scrape_instagram_and_create_pdf"]],
     )
     scrape_result = Runner.run_sync(scraper_agent, f"Run with num_stories={num_stories}")
     result_data = scrape_result.final_output if isinstance(scrape_result.final_output, dict) else {}
     screenshots = result_data.get("screenshots", [])
     pdf_filename = result_data.get("pdf_filename", None)
     print(f"Scraping and PDF creation completed. PDF: {pdf_filename}")
-    
-    # Step 2: Generate newsletter content
+
+    # Step 2: Generate newsletter content; the agent returns the file it was saved to
     newsletter_gen_agent = Agent(
         name="NewsletterGenerator",
-        instructions="Use the provided screenshots to analyze and generate an HTML newsletter."
+        instructions="Use the generate_instagram_newsletter tool on the provided screenshots and reply with only the returned filename.",
+        tools=[tools["generate_instagram_newsletter"]],
     )
     newsletter_result = Runner.run_sync(newsletter_gen_agent, f"Run with screenshots: {screenshots} and recipient: {recipient_name}")
-    newsletter_content = newsletter_result.final_output if newsletter_result.final_output else MOCK_NEWSLETTER
+    newsletter_filename = (newsletter_result.final_output or "").strip()
+    if not os.path.exists(newsletter_filename):
+        newsletter_filename = save_newsletter(MOCK_NEWSLETTER)
     print("Newsletter generation completed.")
-    
-    # Step 3: Send the newsletter email
+
+    # Step 3: Send the newsletter email, passing the newsletter by filename rather than pasting the HTML
     email_agent = Agent(
         name="EmailSender",
-        instructions="Send the newsletter email using the provided PDF and HTML content."
+        instructions="Send the newsletter email with the send_newsletter tool using the provided PDF and newsletter file.",
+        tools=[tools["send_newsletter"]],
     )
-    email_result = Runner.run_sync(email_agent, f"Run with pdf_filename: {pdf_filename} and newsletter_content: {newsletter_content}")
-    email_status = email_result.final_output if email_result.final_output is not None else False
-    
+    email_result = Runner.run_sync(email_agent, f"Run with pdf_filename: {pdf_filename} and newsletter_filename: {newsletter_filename}")
+    return email_result.final_output if email_result.final_output is not None else False
+
+@instrumented_run("ig_agents")
+def orchestrate_pipeline(num_stories: int = 5, recipient_name: str = "Subscriber", mode: str = PIPELINE_MODE):
+    print(f"\n====== Instagram Newsletter Pipeline ({mode}) ======\n")
+    init_agentops()
+    start_time = time.time()
+
+    if mode == "agent":
+        email_status = run_pipeline_agents(num_stories, recipient_name)
+    else:
+        email_status = run_pipeline_direct(num_stories, recipient_name)
+
     end_time = time.time()
     duration = end_time - start_time
     print(f"\n====== Pipeline Completed in {duration:.2f} seconds ======")
@@ -412,6 +461,9 @@ def orchestrate_pipeline(num_stories: int = 5, recipient_name: str = "Subscriber
 
 if __name__ == "__main__":
     # You can adjust parameters or load them from command line arguments as needed
+    # (pass --agent to let LLM agents drive the stages instead of the direct runner)
+    import sys
     num_stories = 5
     recipient = os.getenv("RECEIVER_EMAIL", "Subscriber")
-    orchestrate_pipeline(num_stories=num_stories, recipient_name=recipient)
+    mode = "agent" if "--agent" in sys.argv else PIPELINE_MODE
+    orchestrate_pipeline(num_stories=num_stories, recipient_name=recipient, mode=mode)
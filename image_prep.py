@@ -0,0 +1,100 @@
+import io
+import os
+import base64
+
+from instrumentation import span
+from story_capture import image_mime_type
+
+# Preprocessing applied to images before they are sent to the vision model
+# (can be overridden in .env)
+VISION_MAX_DIMENSION = int(os.getenv("VISION_MAX_DIMENSION", "1024"))
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "jpeg").lower()
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "80"))
+VISION_CROP_STORY = os.getenv("VISION_CROP_STORY", "false").lower() in ("true", "1", "yes")
+
+# "low" sends a single 512px tile (fixed token cost), "high" tiles the image, "auto" lets the API decide
+VISION_DETAIL = os.getenv("VISION_DETAIL", "auto").lower()
+
+# Instagram stories are 9:16; wider full-page screenshots are cropped to a centred 9:16 strip
+STORY_ASPECT_RATIO = 9 / 16
+
+_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+_prep_stats = {"images": 0, "original_bytes": 0, "prepared_bytes": 0}
+
+
+def _crop_to_story(image):
+    width, height = image.size
+    target_width = int(height * STORY_ASPECT_RATIO)
+    if target_width >= width:
+        return image
+    left = (width - target_width) // 2
+    return image.crop((left, 0, left + target_width, height))
+
+
+def prepare_image(image_path, max_dimension=None, image_format=None, quality=None, crop_story=None):
+    """Downscale and re-encode an image for upload; return (mime_type, bytes).
+
+    Falls back to the original file if Pillow cannot process it.
+    """
+    max_dimension = max_dimension or VISION_MAX_DIMENSION
+    image_format = (image_format or VISION_IMAGE_FORMAT).lower()
+    quality = quality or VISION_IMAGE_QUALITY
+    crop_story = VISION_CROP_STORY if crop_story is None else crop_story
+
+    with open(image_path, "rb") as f:
+        original = f.read()
+
+    try:
+        from PIL import Image
+
+        pil_format, mime_type = _FORMATS.get(image_format, _FORMATS["jpeg"])
+        with Image.open(io.BytesIO(original)) as image:
+            image = image.convert("RGB")
+            if crop_story:
+                image = _crop_to_story(image)
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format=pil_format, quality=quality)
+        prepared = buffer.getvalue()
+        if len(prepared) >= len(original) and not crop_story:
+            # Already small (e.g. a CDN JPEG); re-encoding would only lose quality
+            mime_type, prepared = image_mime_type(image_path), original
+    except Exception as e:
+        print(f"Warning: Could not preprocess {image_path}, sending original: {e}")
+        mime_type, prepared = image_mime_type(image_path), original
+
+    _prep_stats["images"] += 1
+    _prep_stats["original_bytes"] += len(original)
+    _prep_stats["prepared_bytes"] += len(prepared)
+    return mime_type, prepared
+
+
+def image_content_part(image_path, detail=None, **prep_options):
+    """Build the chat ``image_url`` content part for an image, or None if it is missing."""
+    if not os.path.exists(image_path):
+        print(f"Warning: Image file does not exist: {image_path}")
+        return None
+    with span("image_encode", image=os.path.basename(image_path)) as record:
+        mime_type, data = prepare_image(image_path, **prep_options)
+        encoded = base64.b64encode(data).decode("utf-8")
+        record.update(original_bytes=os.path.getsize(image_path), encoded_bytes=len(encoded))
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:{mime_type};base64,{encoded}", "detail": detail or VISION_DETAIL},
+    }
+
+
+def print_prep_summary():
+    """Print how many upload bytes preprocessing saved."""
+    if not _prep_stats["images"]:
+        return
+    original = _prep_stats["original_bytes"]
+    prepared = _prep_stats["prepared_bytes"]
+    saved = 100 * (1 - prepared / original) if original else 0
+    print(f"Image preprocessing: {_prep_stats['images']} images, "
+          f"{original / 1024:.0f} KB -> {prepared / 1024:.0f} KB ({saved:.0f}% smaller)")
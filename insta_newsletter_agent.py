@@ -1,32 +1,16 @@
 import os
 from dotenv import load_dotenv
-from agents import Agent, Runner  # OpenAI Agent libraries
-import agentops
+
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
 from datetime import datetime
+from tracing import init_agentops
 import sys
 
-# Load environment variables
-load_dotenv()
 
-# Check for OpenAI API key
-if not os.getenv("OPENAI_API_KEY"):
-    print("Error: OPENAI_API_KEY is not set in your .env file")
-    print("Please add your OpenAI API key to your .env file:")
-    print("OPENAI_API_KEY=your_openai_api_key")
-    # For testing, we'll continue with mock responses
-    print("\nContinuing with mock AI responses for demonstration purposes...\n")
-
-# Initialize AgentOps for tracking (only if key exists)
-agentops_key = os.getenv("AGENTOPS_API_KEY")
-if agentops_key:
-    agentops.init(agentops_key)
-else:
-    print("AgentOps API key not found, skipping trace export")
-
-# Create our newsletter agent with specific instructions
-newsletter_agent = Agent(
-    name="InstagramDigestAgent",
-    instructions="""You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
+# Instructions for our newsletter agent
+NEWSLETTER_AGENT_INSTRUCTIONS = """You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
     Your task is to analyze Instagram story screenshots, understand the content, extract key information,
     and create a well-formatted, engaging newsletter. Focus on:
     1. Identifying main themes and topics from the stories
@@ -36,7 +20,16 @@ newsletter_agent = Agent(
     5. Adding helpful commentary and context to the content
     6. Organizing content in a logical and appealing structure
     """
-)
+
+_newsletter_agent = None
+
+def get_newsletter_agent():
+    """The newsletter agent, created on first use so importing this module doesn't load the Agents SDK."""
+    global _newsletter_agent
+    if _newsletter_agent is None:
+        from agents import Agent
+        _newsletter_agent = Agent(name="InstagramDigestAgent", instructions=NEWSLETTER_AGENT_INSTRUCTIONS)
+    return _newsletter_agent
 
 # Mock responses for testing without API key
 MOCK_ANALYSIS = """
@@ -120,7 +113,8 @@ def analyze_screenshot_content(screenshot_paths):
     
     try:
         print("Asking AI agent to analyze the stories...")
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         print("\nAI Analysis Complete!")
         return result.final_output
     except Exception as e:
@@ -148,7 +142,8 @@ def generate_newsletter(analysis, recipient_name="Subscriber"):
     
     try:
         print("Asking AI agent to create the newsletter...")
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         print("\nNewsletter Generation Complete!")
         return result.final_output
     except Exception as e:
@@ -171,6 +166,15 @@ def extract_subject_line(newsletter_content):
 def process_stories_with_ai(screenshot_paths, recipient_email):
     """Process Instagram stories with AI to create and send a newsletter."""
     print("\n=== Processing Instagram Stories with AI ===\n")
+
+    # Check for OpenAI API key
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Error: OPENAI_API_KEY is not set in your .env file")
+        print("Please add your OpenAI API key to your .env file:")
+        print("OPENAI_API_KEY=your_openai_api_key")
+        # For testing, we'll continue with mock responses
+        print("\nContinuing with mock AI responses for demonstration purposes...\n")
+    init_agentops()
     
     # Step 1: Analyze the content of the screenshots
     analysis = analyze_screenshot_content(screenshot_paths)
@@ -1,27 +1,26 @@
 import os
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-from fpdf import FPDF
-import smtplib
-from email.message import EmailMessage
-from datetime import datetime
-from agents import Agent, Runner
-import agentops
-import time
 
-# Load environment variables
+# Load environment variables before the project modules read their settings
 load_dotenv()
 
-# Initialize AgentOps if key is available
-agentops_key = os.getenv("AGENTOPS_API_KEY")
-if agentops_key:
-    agentops.init(agentops_key)
-else:
-    print("AgentOps API key not found, skipping trace export")
+from browser_pool import get_browser_pool
+from session_store import INSTAGRAM_BASE_URL
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    wait_for_any_selector,
+    wait_for_page_ready,
+    wait_for_story_media,
+)
+from email.message import EmailMessage
+from smtp_pool import get_smtp_pool, parse_recipients
+from outbox import EMAIL_DELIVERY_MODE, queue_newsletter
+from pdf_digest import build_pdf_digest
+from datetime import datetime
+from tracing import init_agentops
+from instrumentation import span, instrumented_run
+import time
 
-# Print startup message
-print("*** Instagram Newsletter Automation ***")
-print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 #################################
 # Instagram Login Function
@@ -42,24 +41,20 @@ def login_instagram():
     print(f"Logging in as {instagram_user}...")
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)  # Set to True for production
-            page = browser.new_page()
+        with get_browser_pool().page(f"login:{instagram_user}") as page:
             print("Opening Instagram login page...")
-            page.goto("https://instagram.com/accounts/login")
+            page.goto(f"{INSTAGRAM_BASE_URL}/accounts/login/")
             
-            # Wait for page to fully load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Extra wait to ensure login form is ready
+            # Wait for the login form to be ready
+            wait_for_page_ready(page)
+            wait_for_any_selector(page, ['input[name="username"]'], step="login_form")
             
-            # Fill in the login form with explicit waits
+            # Fill in the login form
             print("Filling username field...")
             page.fill('input[name="username"]', instagram_user)
-            page.wait_for_timeout(1000)  # Wait 1 second
             
             print("Filling password field...")
             page.fill('input[name="password"]', instagram_pass)
-            page.wait_for_timeout(1000)  # Wait 1 second
             
             print("Submitting login form...")
             page.click("button[type='submit']")
@@ -68,9 +63,6 @@ def login_instagram():
             try:
                 print("Waiting for login to complete...")
                 
-                # Wait for any security checkpoint to appear
-                page.wait_for_timeout(5000)  # 5 seconds to load any security page
-                
                 # Wait for any of these selectors that might indicate a successful login
                 selectors = [
                     "xpath=//div[contains(text(),'Home')]",  # Text-based Home button
@@ -81,35 +73,28 @@ def login_instagram():
                 
                 print("Checking for successful login...")
                 success = False
-                for selector in selectors:
-                    try:
-                        if page.wait_for_selector(selector, timeout=5000):
-                            print(f"Login confirmed with selector: {selector}")
-                            success = True
-                            break
-                    except Exception:
-                        continue
+                selector = wait_for_any_selector(page, selectors, step="login_complete")
+                if selector:
+                    print(f"Login confirmed with selector: {selector}")
+                    success = True
                 
                 if not success:
                     # Check based on URL
                     current_url = page.url
-                    if "instagram.com" in current_url and "accounts/login" not in current_url:
+                    if current_url.startswith(INSTAGRAM_BASE_URL) and "accounts/login" not in current_url:
                         print(f"Login appears successful based on URL: {current_url}")
                         success = True
                 
                 if success:
                     print("Login successful!")
                     cookies = page.context.cookies()
-                    browser.close()
                     return cookies
                 else:
                     print("Could not confirm successful login.")
-                    browser.close()
                     return None
             except Exception as e:
                 print(f"Error during login: {e}")
                 print("Login failed. Check credentials or try again.")
-                browser.close()
                 return None
     except Exception as e:
         print(f"Error setting up browser: {e}")
@@ -128,18 +113,14 @@ def screenshot_stories(cookies, num_stories=5):
         return screenshots
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)  # Set to True for production
-            context = browser.new_context()
-            context.add_cookies(cookies)
-            page = context.new_page()
+        with get_browser_pool().page("stories:feed", cookies=cookies) as page:
             
             print("Navigating to Instagram homepage...")
-            page.goto("https://instagram.com")
-            
-            # Give page time to load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional time to ensure full load
+            with span("navigate", page="feed"):
+                page.goto(INSTAGRAM_BASE_URL)
+                
+                # Wait for the feed to render
+                wait_for_page_ready(page)
             
             # Save a screenshot for debugging
             page.screenshot(path="instagram_home.png")
@@ -154,39 +135,36 @@ def screenshot_stories(cookies, num_stories=5):
             ]
             
             success = False
-            for selector in story_selectors:
+            selector = wait_for_any_selector(page, story_selectors, step="story_tray")
+            if selector:
                 try:
-                    if page.wait_for_selector(selector, timeout=5000):
-                        print(f"Story found with selector: {selector}")
-                        page.click(selector)
-                        page.wait_for_timeout(2000)  # Wait for story to open
-                        success = True
-                        break
+                    print(f"Story found with selector: {selector}")
+                    page.click(selector)
+                    wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")  # Wait for story to open
+                    success = True
                 except Exception as e:
                     print(f"Selector {selector} failed: {e}")
-                    continue
             
             if not success:
                 print("Could not find or click any stories using available selectors")
-                browser.close()
                 return screenshots
             
             print("Capturing screenshots of stories...")
+            previous_src = None
             for i in range(num_stories):
                 print(f"Capturing story {i+1}/{num_stories}...")
-                # Wait for story to load
-                page.wait_for_timeout(2000)  # wait 2 seconds for the story to load
-                screenshot_path = f"story_{i+1}.png"
-                page.screenshot(path=screenshot_path)
+                with span("story_capture", story=i + 1):
+                    # Wait for the story's media to load
+                    previous_src = wait_for_story_media(page, previous_src) or previous_src
+                    screenshot_path = f"story_{i+1}.png"
+                    page.screenshot(path=screenshot_path)
                 screenshots.append(screenshot_path)
                 print(f"Screenshot saved as {screenshot_path}")
                 
                 # Move to next story
                 print("Moving to next story...")
                 page.keyboard.press('ArrowRight')
-                page.wait_for_timeout(1000)  # wait 1 second between stories
             
-            browser.close()
             print(f"Successfully captured {len(screenshots)} screenshots")
     except Exception as e:
         print(f"Error capturing stories: {e}")
@@ -205,30 +183,7 @@ def create_pdf(screenshots):
         return None
     
     try:
-        pdf = FPDF()
-        
-        # Add a cover page
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 24)
-        pdf.cell(0, 20, "Instagram Stories Digest", 0, 1, "C")
-        pdf.set_font("Arial", "I", 12)
-        pdf.cell(0, 10, f"Generated on {datetime.now().strftime('%Y-%m-%d')}", 0, 1, "C")
-        pdf.cell(0, 10, f"Contains {len(screenshots)} stories", 0, 1, "C")
-        
-        # Add each screenshot to a new page
-        for i, image in enumerate(screenshots):
-            print(f"Adding {image} to PDF...")
-            pdf.add_page()
-            try:
-                pdf.image(image, x=10, y=10, w=190)  # adjust size as necessary
-                print(f"Added {image} to PDF")
-            except Exception as e:
-                print(f"Error adding {image} to PDF: {e}")
-                continue
-        
-        # Save the PDF
-        pdf_filename = "instagram_digest.pdf"
-        pdf.output(pdf_filename)
+        pdf_filename = build_pdf_digest(screenshots, "instagram_digest.pdf")
         print(f"PDF digest created successfully: {pdf_filename}")
         return pdf_filename
     except Exception as e:
@@ -240,9 +195,7 @@ def create_pdf(screenshots):
 #################################
 
 # Newsletter generation agent
-newsletter_agent = Agent(
-    name="InstagramDigestAgent",
-    instructions="""You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
+NEWSLETTER_AGENT_INSTRUCTIONS = """You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
     Your task is to analyze Instagram story screenshots, understand the content, extract key information,
     and create a well-formatted, engaging newsletter. Focus on:
     1. Identifying main themes and topics from the stories
@@ -252,7 +205,16 @@ newsletter_agent = Agent(
     5. Adding helpful commentary and context to the content
     6. Organizing content in a logical and appealing structure
     """
-)
+
+_newsletter_agent = None
+
+def get_newsletter_agent():
+    """The newsletter agent, created on first use so importing this module doesn't load the Agents SDK."""
+    global _newsletter_agent
+    if _newsletter_agent is None:
+        from agents import Agent
+        _newsletter_agent = Agent(name="InstagramDigestAgent", instructions=NEWSLETTER_AGENT_INSTRUCTIONS)
+    return _newsletter_agent
 
 # Mock responses for testing without API key
 MOCK_ANALYSIS = """
@@ -332,7 +294,8 @@ def analyze_screenshot_content(screenshot_paths):
     
     try:
         print("Asking AI agent to analyze the stories...")
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         print("\nAI Analysis Complete!")
         return result.final_output
     except Exception as e:
@@ -360,7 +323,8 @@ def generate_newsletter(analysis, recipient_name="Subscriber"):
     
     try:
         print("Asking AI agent to create the newsletter...")
-        result = Runner.run_sync(newsletter_agent, prompt)
+        from agents import Runner
+        result = Runner.run_sync(get_newsletter_agent(), prompt)
         print("\nNewsletter Generation Complete!")
         return result.final_output
     except Exception as e:
@@ -393,9 +357,9 @@ def send_email(pdf_filename, newsletter_content, receiver_email=None):
     # Check for email credentials
     email_user = os.getenv('EMAIL_USER')
     email_pass = os.getenv('EMAIL_PASS')
-    receiver_email = receiver_email or os.getenv('RECEIVER_EMAIL')
+    recipients = parse_recipients(receiver_email or os.getenv('RECEIVER_EMAIL'))
     
-    if not email_user or not email_pass or not receiver_email:
+    if not email_user or not email_pass or not recipients:
         print("Error: Email credentials not found in .env file")
         print("Please add EMAIL_USER, EMAIL_PASS, and RECEIVER_EMAIL to your .env file")
         return False
@@ -403,11 +367,19 @@ def send_email(pdf_filename, newsletter_content, receiver_email=None):
     # Extract subject line from newsletter content
     subject_line = extract_subject_line(newsletter_content)
     
+    # Hand the message to the background outbox so the pipeline doesn't wait on SMTP
+    if EMAIL_DELIVERY_MODE == "outbox":
+        html_start = newsletter_content.find("<html")
+        html_end = newsletter_content.find("</html>", html_start) + 7
+        html_content = newsletter_content[html_start:html_end] if html_start >= 0 else newsletter_content
+        queue_newsletter(email_user, recipients, subject_line, html_content, attachments=[pdf_filename])
+        return True
+    
     try:
-        print(f"Preparing email to {receiver_email}...")
+        print(f"Preparing email to {', '.join(recipients)}...")
         msg = EmailMessage()
         msg["From"] = email_user
-        msg["To"] = receiver_email
+        msg["To"] = ", ".join(recipients)
         msg["Subject"] = subject_line
         
         # Add the newsletter content as HTML
@@ -433,10 +405,10 @@ def send_email(pdf_filename, newsletter_content, receiver_email=None):
             )
         
         # Send the email
-        print("Connecting to email server...")
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(email_user, email_pass)
-            server.send_message(msg)
+        pool = get_smtp_pool(email_user, email_pass)
+        print(f"Sending via {pool.host}:{pool.port}...")
+        pool.send(msg)
+        pool.print_stats()
         
         print("Email sent successfully!")
         return True
@@ -481,9 +453,11 @@ def mock_send_email(pdf_filename=None, newsletter_content=None, receiver_email=N
 #################################
 # Main Pipeline Function
 #################################
+@instrumented_run("instagram_newsletter_pipeline")
 def run_instagram_newsletter_pipeline(use_mocks=False, num_stories=5, receiver_email=None):
     """Run the complete Instagram newsletter pipeline from login to email sending."""
     print("\n====== Instagram Newsletter Pipeline ======\n")
+    init_agentops()
     start_time = time.time()
     
     # Step 1: Login (or use mock)
@@ -499,7 +473,9 @@ def run_instagram_newsletter_pipeline(use_mocks=False, num_stories=5, receiver_e
             screenshots = mock_screenshot_stories(None, num_stories)
         else:
             # Real Instagram login and screenshots
-            cookies = login_instagram()
+            with span("login") as record:
+                cookies = login_instagram()
+                record["logged_in"] = bool(cookies)
             if not cookies:
                 print("Login failed. Falling back to mock functions.")
                 cookies = mock_login()
@@ -547,6 +523,10 @@ def run_instagram_newsletter_pipeline(use_mocks=False, num_stories=5, receiver_e
 # Main Execution
 #################################
 if __name__ == "__main__":
+    # Print startup message
+    print("*** Instagram Newsletter Automation ***")
+    print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
     # By default, we'll use mocks unless command line arguments are provided
     use_mocks = True
     num_stories = 5
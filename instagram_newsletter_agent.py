@@ -4,30 +4,23 @@ import asyncio
 import os
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from pydantic import BaseModel
 from dotenv import load_dotenv
 
-# Import the Agents SDK using the correct structure
-from agents import (
-    Agent,
-    ItemHelpers,
-    MessageOutputItem,
-    RunContextWrapper,
-    Runner,
-    ToolCallItem,
-    ToolCallOutputItem,
-    TResponseInputItem,
-    function_tool,
-    handoff,
-    trace,
-)
-# If this import is not available, we can modify the implementation as needed
-from agents.extensions.handoff_prompt import RECOMMENDED_PROMPT_PREFIX
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
+from pydantic import BaseModel
+
+from tracing import init_agentops
+
+# The Agents SDK is imported when the agent is built (get_instagram_newsletter_agent),
+# so importing this module doesn't load it
+if TYPE_CHECKING:
+    from agents import RunContextWrapper
 
 # Import our existing Instagram newsletter code
-import agentops
 from instagram_story_newsletter import (
     extract_instagram_story, 
     process_instagram_stories,
@@ -37,13 +30,6 @@ from instagram_story_newsletter import (
     get_sample_images
 )
 
-# Load environment variables
-load_dotenv()
-
-# Initialize AgentOps
-agentops.init(
-    api_key=os.getenv("AGENTOPS_API_KEY"),
-)
 
 ### CONTEXT
 
@@ -62,7 +48,6 @@ class InstagramNewsletterContext(BaseModel):
 
 ### TOOLS
 
-@function_tool
 async def get_instagram_stories(context: RunContextWrapper[InstagramNewsletterContext]) -> str:
     """Extract Instagram stories from the user's account or use sample images"""
     if context.context.use_sample_images:
@@ -79,7 +64,6 @@ async def get_instagram_stories(context: RunContextWrapper[InstagramNewsletterCo
         context.context.stories = stories
         return f"Extracted {len(stories)} Instagram stories"
 
-@function_tool
 async def analyze_stories_content(context: RunContextWrapper[InstagramNewsletterContext]) -> str:
     """Analyze Instagram stories content using OpenAI for enhanced details"""
     if not context.context.stories or len(context.context.stories) == 0:
@@ -91,7 +75,6 @@ async def analyze_stories_content(context: RunContextWrapper[InstagramNewsletter
     
     return "Stories analyzed successfully. Found classifications for account types and content."
 
-@function_tool
 async def generate_newsletter(context: RunContextWrapper[InstagramNewsletterContext]) -> str:
     """Generate the Instagram newsletter based on the analyzed stories"""
     if not context.context.story_analyses:
@@ -112,7 +95,6 @@ async def generate_newsletter(context: RunContextWrapper[InstagramNewsletterCont
     
     return "Newsletter generated successfully."
 
-@function_tool
 async def save_newsletter(context: RunContextWrapper[InstagramNewsletterContext]) -> str:
     """Save the generated newsletter to an HTML file"""
     if not context.context.newsletter_content:
@@ -133,7 +115,6 @@ async def save_newsletter(context: RunContextWrapper[InstagramNewsletterContext]
     context.context.newsletter_file = saved_file
     return f"Newsletter saved to {saved_file}"
 
-@function_tool
 async def set_newsletter_preferences(
     context: RunContextWrapper[InstagramNewsletterContext], 
     highlight_top_stories: bool = True,
@@ -153,42 +134,66 @@ async def set_newsletter_preferences(
 
 ### AGENTS
 
-instagram_newsletter_agent = Agent[InstagramNewsletterContext](
-    name="Instagram Newsletter Agent",
-    instructions=f"""{RECOMMENDED_PROMPT_PREFIX}
-    You are an Instagram Newsletter Generator Agent that helps users create beautiful,
-    organized newsletters from their Instagram stories.
-    
-    Follow this process to generate newsletters:
-    1. First determine if the user wants to use sample images or extract stories from their Instagram account.
-    2. If using real Instagram, ask for credentials if not already provided.
-    3. Extract Instagram stories using the appropriate tool.
-    4. Analyze the stories content with OpenAI to get enhanced details.
-    5. Generate the newsletter based on the analysis.
-    6. Save the newsletter to an HTML file.
-    7. Provide the user with a summary of what was created.
-    
-    Newsletter features:
-    - You can highlight the top 3 most relevant stories in the main newsletter.
-    - You organize stories in the gallery section by account type (friends first, then influencers).
-    - You provide a full gallery of all stories at the bottom.
-    
-    You can also adjust newsletter preferences using the set_newsletter_preferences tool.
-    Always be helpful and guide the user through the process.
-    """,
-    tools=[
-        get_instagram_stories,
-        analyze_stories_content,
-        generate_newsletter,
-        save_newsletter,
-        set_newsletter_preferences
-    ],
-)
+_agent = None
+
+def get_instagram_newsletter_agent():
+    """The Instagram newsletter agent, built (and the Agents SDK loaded) on first use."""
+    # RunContextWrapper is bound at module level because function_tool resolves the tools' annotations there
+    global _agent, RunContextWrapper
+    if _agent is None:
+        from agents import Agent, RunContextWrapper, function_tool
+        from agents.extensions.handoff_prompt import RECOMMENDED_PROMPT_PREFIX
+
+        _agent = Agent[InstagramNewsletterContext](
+            name="Instagram Newsletter Agent",
+            instructions=f"""{RECOMMENDED_PROMPT_PREFIX}
+            You are an Instagram Newsletter Generator Agent that helps users create beautiful,
+            organized newsletters from their Instagram stories.
+
+            Follow this process to generate newsletters:
+            1. First determine if the user wants to use sample images or extract stories from their Instagram account.
+            2. If using real Instagram, ask for credentials if not already provided.
+            3. Extract Instagram stories using the appropriate tool.
+            4. Analyze the stories content with OpenAI to get enhanced details.
+            5. Generate the newsletter based on the analysis.
+            6. Save the newsletter to an HTML file.
+            7. Provide the user with a summary of what was created.
+
+            Newsletter features:
+            - You can highlight the top 3 most relevant stories in the main newsletter.
+            - You organize stories in the gallery section by account type (friends first, then influencers).
+            - You provide a full gallery of all stories at the bottom.
+
+            You can also adjust newsletter preferences using the set_newsletter_preferences tool.
+            Always be helpful and guide the user through the process.
+            """,
+            tools=[
+                function_tool(tool) for tool in (
+                    get_instagram_stories,
+                    analyze_stories_content,
+                    generate_newsletter,
+                    save_newsletter,
+                    set_newsletter_preferences,
+                )
+            ],
+        )
+    return _agent
 
 ### RUN
 
 async def main():
+    from agents import (
+        ItemHelpers,
+        MessageOutputItem,
+        Runner,
+        ToolCallItem,
+        ToolCallOutputItem,
+        TResponseInputItem,
+        trace,
+    )
+
     print("=== Instagram Newsletter Agent ===\n")
+    init_agentops()
     
     # Set default context
     context = InstagramNewsletterContext(
@@ -205,7 +210,7 @@ async def main():
         print("Sample images detected - running in sample mode")
         context.use_sample_images = True
     
-    current_agent = instagram_newsletter_agent
+    current_agent = get_instagram_newsletter_agent()
     input_items: list[TResponseInputItem] = []
     
     # Generate a conversation ID for tracing
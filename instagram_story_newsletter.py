@@ -1,37 +1,48 @@
 import os
-import base64
-import time
-from playwright.sync_api import sync_playwright
 from dotenv import load_dotenv
-from openai import OpenAI
-# Temporarily disable agentops
-import agentops
+
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
+from browser_pool import get_browser_pool
+from async_story_extractor import extract_stories_concurrently
+from story_capture import StoryMediaCollector, capture_story_media
+from image_prep import print_prep_summary
+from story_dedup import dedupe_images
+from story_index import get_story_index, story_key, capture_base
+from analysis_cache import get_analysis_cache
+from async_analysis import analyze_stories_concurrently
+from story_pipeline import capture_and_analyze
+from llm_gateway import get_llm_gateway
+from story_schema import coerce_report, analysis_to_text, NewsletterCopy, StoryAnalysisReport
+from newsletter_renderer import render_newsletter, render_gallery, default_copy
+from newsletter_stream import write_newsletter_streaming
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    VIEW_STORY_SELECTORS,
+    wait_for_any_selector,
+    wait_for_dom_settled,
+    wait_for_page_ready,
+    wait_for_story_media,
+    wait_for_story_open,
+    print_wait_summary,
+)
 from datetime import datetime
 import glob
+import session_store
+from checkpoint_store import PipelineRun, files_exist
+from tracing import init_agentops
+from instrumentation import span, instrumented_run
 
 
-agentops.init(os.getenv("AGENTOPS_API_KEY"))
-# Load environment variables
-load_dotenv()
-
-# Check for OpenAI API key
-if not os.getenv("OPENAI_API_KEY"):
+def check_openai_key():
+    """Print setup instructions and return False if OPENAI_API_KEY is missing."""
+    if os.getenv("OPENAI_API_KEY"):
+        return True
     print("Error: OPENAI_API_KEY is not set in your .env file")
     print("Please add your OpenAI API key to your .env file:")
     print("OPENAI_API_KEY=your_openai_api_key")
-    exit(1)
-
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Temporarily disable AgentOps
-# Initialize AgentOps for tracking (only if key exists)
-# agentops_key = os.getenv("AGENTOPS_API_KEY")
-# if agentops_key:
-#     agentops.init(agentops_key)
-#     print("AgentOps initialized for tracing")
-# else:
-#     print("AgentOps API key not found, skipping trace export")
+    return False
 
 # Story extraction functions
 def login_instagram():
@@ -46,6 +57,13 @@ def login_instagram():
     print(f"INSTAGRAM_USER set: {'Yes' if username else 'No'}")
     print(f"INSTAGRAM_PASS set: {'Yes' if password else 'No'}")
     
+    # Reuse the saved session if it is still logged in
+    if username:
+        cookies = session_store.get_valid_cookies(username)
+        if cookies:
+            print(f"Reusing saved Instagram session for {username}")
+            return cookies
+    
     if not username or not password:
         print("Error: Instagram credentials not found in environment variables.")
         print("Please ensure INSTAGRAM_USER and INSTAGRAM_PASS are set.")
@@ -54,24 +72,21 @@ def login_instagram():
     print(f"Instagram username: {username}")
     
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=False)  # Set to False for debugging
-            context = browser.new_context()
-            page = context.new_page()
+        with get_browser_pool().page(f"login:{username}") as page:
+            context = page.context
             
             print("Opening Instagram login page...")
-            page.goto("https://www.instagram.com/accounts/login/")
+            page.goto(f"{session_store.INSTAGRAM_BASE_URL}/accounts/login/")
             
             # Wait for the page to fully load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional wait to ensure all elements are loaded
+            wait_for_page_ready(page)
             
             # Check if we need to handle cookies consent dialog
             try:
                 if page.query_selector("text=Accept All"):
                     print("Handling cookies consent dialog...")
                     page.click("text=Accept All")
-                    page.wait_for_timeout(1000)
+                    wait_for_dom_settled(page)
             except Exception as e:
                 print(f"Note: No cookies dialog or error handling it: {e}")
             
@@ -88,6 +103,9 @@ def login_instagram():
                 "._ab32"  # Another potential class
             ]
             
+            # Wait for the login form to render
+            wait_for_any_selector(page, username_selectors, step="login_form")
+            
             # Try each selector until one works
             username_field_found = False
             for selector in username_selectors:
@@ -107,9 +125,9 @@ def login_instagram():
                 
                 # Try direct navigation to the feed as a logged-out user
                 print("Trying direct navigation to Instagram feed...")
-                page.goto("https://www.instagram.com/")
-                page.wait_for_load_state("networkidle")
-                page.wait_for_timeout(3000)
+                page.goto(f"{session_store.INSTAGRAM_BASE_URL}/")
+                wait_for_page_ready(page)
+                wait_for_any_selector(page, username_selectors, step="login_form")
                 
                 # Check if there's a login form on this page
                 for selector in username_selectors:
@@ -125,7 +143,6 @@ def login_instagram():
                 if not username_field_found:
                     print("Could not find username field on any page. Browser will stay open for investigation.")
                     print("Close it manually when done.")
-                    browser.close()
                     return None
             
             # Enhanced selectors for password field
@@ -152,7 +169,6 @@ def login_instagram():
             if not password_field_found:
                 print("Password field not found! Taking screenshot for analysis.")
                 page.screenshot(path="password_field_issue.png")
-                browser.close()
                 return None
             
             # Enhanced selectors for login button
@@ -180,7 +196,6 @@ def login_instagram():
             if not login_button_clicked:
                 print("Submit button not found! Taking screenshot for analysis.")
                 page.screenshot(path="submit_button_issue.png")
-                browser.close()
                 return None
             
             # Wait for login to complete and navigate to home feed
@@ -200,19 +215,14 @@ def login_instagram():
             ]
             
             login_success = False
-            for selector in success_selectors:
-                try:
-                    page.wait_for_selector(selector, timeout=10000)
-                    print(f"Login confirmed with selector: {selector}")
-                    login_success = True
-                    break
-                except Exception:
-                    pass
+            selector = wait_for_any_selector(page, success_selectors, step="login_complete")
+            if selector:
+                print(f"Login confirmed with selector: {selector}")
+                login_success = True
             
             if not login_success:
                 print("Could not verify successful login! Taking screenshot for analysis.")
                 page.screenshot(path="login_verification_issue.png")
-                browser.close()
                 return None
             
             print("Login successful!")
@@ -220,15 +230,20 @@ def login_instagram():
             page.screenshot(path="login_success.png")
             print("Screenshot of logged-in state saved to login_success.png")
             
-            # Get cookies for later use
+            # Get cookies for later use and persist the session for the next run
             cookies = context.cookies()
-            browser.close()
+            session_store.save_session(username, context.storage_state())
             return cookies
             
     except Exception as e:
         print(f"Error setting up browser: {e}")
         return None
 
+def login_storage_state():
+    """The storage_state saved by login_instagram, so the capture browser starts from the same session."""
+    record = session_store.load_session(os.getenv("INSTAGRAM_USER"))
+    return record.get("storage_state") if record else None
+
 def extract_instagram_story(cookies, story_username, num_stories=1):
     """Function to navigate to a specific user's Instagram stories and capture screenshots."""
     print(f"\n--- Extracting Instagram Stories for {story_username} ---")
@@ -238,148 +253,137 @@ def extract_instagram_story(cookies, story_username, num_stories=1):
         print("Error: No cookies provided. Please login first.")
         return screenshots
     
+    index = get_story_index()
+    seen = index.seen_keys(story_username)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=False)  # Visible browser for debugging
-            context = browser.new_context()
-            context.add_cookies(cookies)
-            page = context.new_page()
-            
-            # Go directly to the specific user's stories
-            print(f"Navigating directly to {story_username}'s stories...")
-            page.goto(f"https://www.instagram.com/stories/{story_username}/")
-            
-            # Give page time to load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional time to ensure full load
-            
-            # Take a screenshot to verify we're on the right page
-            page.screenshot(path="story_confirmation_page.png")
-            print(f"Screenshot of confirmation page saved as story_confirmation_page.png")
+        with get_browser_pool().page("stories:feed", cookies=cookies) as page:
+            # Record story media responses from the start so their bytes can be saved
+            collector = StoryMediaCollector(page)
+            try:
+                # Go directly to the specific user's stories
+                print(f"Navigating directly to {story_username}'s stories...")
+                with span("navigate", username=story_username):
+                    page.goto(f"{session_store.INSTAGRAM_BASE_URL}/stories/{story_username}/")
+                
+                    # Wait until either the "View story" prompt or the story viewer shows up
+                    wait_for_page_ready(page)
+                    wait_for_any_selector(page, VIEW_STORY_SELECTORS + STORY_VIEW_INDICATORS, step="story_entry")
             
-            # Check for and click the "View story" button - using multiple approaches for reliability
-            print("Looking for 'View story' button...")
+                # Take a screenshot to verify we're on the right page
+                page.screenshot(path="story_confirmation_page.png")
+                print(f"Screenshot of confirmation page saved as story_confirmation_page.png")
             
-            # Approach 1: Try text-based selectors
-            view_story_selectors = [
-                "text=View story", 
-                "button:has-text('View story')",
-                ".x1i10hfl:has-text('View story')",
-                "[role='button']:has-text('View story')",
-                "//div[contains(text(), 'View story')]",
-                "//button[contains(text(), 'View story')]"
-            ]
+                # Check for and click the "View story" button - using multiple approaches for reliability
+                print("Looking for 'View story' button...")
             
-            view_button_clicked = False
-            for selector in view_story_selectors:
-                try:
-                    if page.query_selector(selector):
-                        print(f"Found 'View story' button with selector: {selector}")
-                        page.click(selector)
-                        print("Clicked 'View story' button")
-                        # Wait for the story to load after clicking the button
-                        page.wait_for_timeout(3000)
-                        # Take a screenshot to confirm we're in the story view now
-                        page.screenshot(path="after_view_story_click.png")
-                        print("Screenshot after clicking 'View story' saved as after_view_story_click.png")
-                        view_button_clicked = True
-                        break
-                except Exception as e:
-                    print(f"Error with 'View story' button selector {selector}: {e}")
-            
-            # Approach 2: If no success with predefined selectors, try looking for buttons with "view story" text content
-            if not view_button_clicked:
-                print("Could not find 'View story' button with predefined selectors")
-                print("Trying to find buttons with 'View story' text...")
-                
-                # Find all potential buttons
-                buttons = page.query_selector_all("button, [role='button'], a[role='button'], div[role='button'], .x1i10hfl")
-                print(f"Found {len(buttons)} potential clickable elements")
-                
-                # Try to find one with "View story" text
-                for button in buttons:
+                # Approach 1: Try text-based selectors
+                view_button_clicked = False
+                for selector in VIEW_STORY_SELECTORS:
                     try:
-                        button_text = button.inner_text().lower()
-                        if "view" in button_text and "story" in button_text:
-                            print(f"Found button with text: {button_text}")
-                            button.click()
-                            page.wait_for_timeout(3000)
-                            page.screenshot(path="after_text_button_click.png")
-                            print("Clicked button with 'View story' text")
+                        if page.query_selector(selector):
+                            print(f"Found 'View story' button with selector: {selector}")
+                            # Click and wait for the story viewer (its media response) to open
+                            wait_for_story_open(page, lambda: page.click(selector))
+                            print("Clicked 'View story' button")
+                            # Take a screenshot to confirm we're in the story view now
+                            page.screenshot(path="after_view_story_click.png")
+                            print("Screenshot after clicking 'View story' saved as after_view_story_click.png")
                             view_button_clicked = True
                             break
-                    except Exception:
-                        pass
+                    except Exception as e:
+                        print(f"Error with 'View story' button selector {selector}: {e}")
             
-            # Approach 3: Try a coordinate-based click in the middle of the page/story area
-            if not view_button_clicked:
-                print("Trying coordinate-based approach to click 'View story' button...")
+                # Approach 2: If no success with predefined selectors, try looking for buttons with "view story" text content
+                if not view_button_clicked:
+                    print("Could not find 'View story' button with predefined selectors")
+                    print("Trying to find buttons with 'View story' text...")
                 
-                # First try to click center of the page - a common location for the View story button
-                try:
-                    page_width = page.viewport_size['width']
-                    page_height = page.viewport_size['height']
-                    center_x = page_width / 2
-                    center_y = page_height / 2
+                    # Find all potential buttons
+                    buttons = page.query_selector_all("button, [role='button'], a[role='button'], div[role='button'], .x1i10hfl")
+                    print(f"Found {len(buttons)} potential clickable elements")
+                
+                    # Try to find one with "View story" text
+                    for button in buttons:
+                        try:
+                            button_text = button.inner_text().lower()
+                            if "view" in button_text and "story" in button_text:
+                                print(f"Found button with text: {button_text}")
+                                wait_for_story_open(page, button.click)
+                                page.screenshot(path="after_text_button_click.png")
+                                print("Clicked button with 'View story' text")
+                                view_button_clicked = True
+                                break
+                        except Exception:
+                            pass
+            
+                # Approach 3: Try a coordinate-based click in the middle of the page/story area
+                if not view_button_clicked:
+                    print("Trying coordinate-based approach to click 'View story' button...")
+                
+                    # First try to click center of the page - a common location for the View story button
+                    try:
+                        page_width = page.viewport_size['width']
+                        page_height = page.viewport_size['height']
+                        center_x = page_width / 2
+                        center_y = page_height / 2
                     
-                    print(f"Clicking center of page at coordinates ({center_x}, {center_y})")
-                    page.mouse.click(center_x, center_y)
-                    page.wait_for_timeout(3000)
-                    page.screenshot(path="after_center_click.png")
-                    print("Clicked center of page")
+                        print(f"Clicking center of page at coordinates ({center_x}, {center_y})")
+                        wait_for_story_open(page, lambda: page.mouse.click(center_x, center_y))
+                        page.screenshot(path="after_center_click.png")
+                        print("Clicked center of page")
                     
-                    # Also try slightly below center where the View story button often appears
-                    print("Trying position below center")
-                    page.mouse.click(center_x, center_y + 60)
-                    page.wait_for_timeout(3000)
-                    page.screenshot(path="after_below_center_click.png")
-                except Exception as e:
-                    print(f"Error with coordinate-based approach: {e}")
-            
-            # Check if we're in story view after all click attempts
-            print("Checking if we're in story view...")
-            story_indicators = [
-                "[aria-label='Pause']",  # Pause button
-                "button[aria-label='Next']",  # Next button
-                "button[aria-label='Previous']",  # Previous button
-                ".x1i10hfl.xjqpnuy",  # Common class for story UI
-                "._aa8j",  # Another potential story UI class
-                "video"  # Videos are common in stories
-            ]
-            
-            in_story_view = False
-            for indicator in story_indicators:
-                if page.query_selector(indicator):
-                    print(f"Story view confirmed with element: {indicator}")
-                    in_story_view = True
-                    break
-            
-            if not in_story_view:
-                print("Could not confirm we're in story view. Taking screenshot for analysis.")
-                page.screenshot(path="story_view_check.png")
-                print("Screenshot saved as story_view_check.png")
-                print("Attempting to capture screenshots anyway...")
+                        # Also try slightly below center where the View story button often appears
+                        print("Trying position below center")
+                        wait_for_story_open(page, lambda: page.mouse.click(center_x, center_y + 60))
+                        page.screenshot(path="after_below_center_click.png")
+                    except Exception as e:
+                        print(f"Error with coordinate-based approach: {e}")
+            
+                # Check if we're in story view after all click attempts
+                print("Checking if we're in story view...")
+                in_story_view = False
+                for indicator in STORY_VIEW_INDICATORS:
+                    if page.query_selector(indicator):
+                        print(f"Story view confirmed with element: {indicator}")
+                        in_story_view = True
+                        break
             
-            # Capture the requested number of stories
-            print("\nCapturing screenshots of stories...")
-            for i in range(num_stories):
-                print(f"Capturing story {i+1}/{num_stories}...")
-                # Wait for story to load
-                page.wait_for_timeout(2000)  # wait 2 seconds for the story to load
-                screenshot_path = f"{story_username}_story_{i+1}.png"
-                page.screenshot(path=screenshot_path)
-                screenshots.append(screenshot_path)
-                print(f"Screenshot saved as {screenshot_path}")
+                if not in_story_view:
+                    print("Could not confirm we're in story view. Taking screenshot for analysis.")
+                    page.screenshot(path="story_view_check.png")
+                    print("Screenshot saved as story_view_check.png")
+                    print("Attempting to capture screenshots anyway...")
+            
+                # Capture the requested number of stories
+                print("\nCapturing screenshots of stories...")
+                previous_src = None
+                for i in range(num_stories):
+                    print(f"Capturing story {i+1}/{num_stories}...")
+                    with span("story_capture", username=story_username, story=i + 1) as record:
+                        # Wait for this story's image/video to finish loading
+                        step = "story_media" if i == 0 else "story_advance"
+                        src = wait_for_story_media(page, previous_src, step=step)
+                        previous_src = src or previous_src
+                        # Stories an earlier run captured and analyzed are skipped rather than saved again
+                        key = story_key(page.url, src)
+                        record["skipped"] = key in seen
+                        if not record["skipped"]:
+                            screenshot_path = capture_story_media(page, collector, src, capture_base(story_username, key))
+                            record["bytes"] = os.path.getsize(screenshot_path)
+                            index.record_story(story_username, key, src, screenshot_path)
+                    if record["skipped"]:
+                        index.mark_skipped()
+                        print(f"Story {i+1} was already analyzed in an earlier run, skipping")
+                    else:
+                        screenshots.append(screenshot_path)
+                        print(f"Story saved as {screenshot_path}")
                 
-                if i < num_stories - 1:  # Don't try to move past the last story
-                    # Move to next story
-                    print("Moving to next story...")
-                    page.keyboard.press('ArrowRight')
-                    page.wait_for_timeout(1500)  # wait 1.5 seconds between stories
-            
-            # Wait a moment before closing to see the results
-            page.wait_for_timeout(2000)
-            browser.close()
+                    if i < num_stories - 1:  # Don't try to move past the last story
+                        # Move to next story
+                        print("Moving to next story...")
+                        page.keyboard.press('ArrowRight')
+            finally:
+                collector.detach()
             print(f"Successfully captured {len(screenshots)} screenshots")
     except Exception as e:
         print(f"Error capturing stories: {e}")
@@ -387,78 +391,6 @@ def extract_instagram_story(cookies, story_username, num_stories=1):
     return screenshots
 
 # AI Processing Functions
-def encode_image_to_base64(image_path):
-    """Convert an image to base64 for sending to OpenAI API."""
-    if not os.path.exists(image_path):
-        print(f"Warning: Image file does not exist: {image_path}")
-        return None
-        
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-
-def analyze_story_images(image_paths):
-    """Use OpenAI API to analyze the content of Instagram story screenshots."""
-    print("\n--- Analyzing Instagram Stories with OpenAI ---")
-    
-    # If no images were provided, use sample images for testing
-    if not image_paths or len(image_paths) == 0:
-        print("No images provided. Using sample images for testing...")
-        sample_images = [
-            "story_sample_1.png",
-            "story_sample_2.png",
-            "story_sample_3.png"
-        ]
-        
-        # Check if sample images exist
-        existing_samples = [img for img in sample_images if os.path.exists(img)]
-        if existing_samples:
-            image_paths = existing_samples
-            print(f"Using {len(existing_samples)} sample images for analysis")
-        else:
-            print("No sample images found. Please provide image paths.")
-            return "No image content available for analysis."
-    
-    # Create a prompt for OpenAI that includes all the images
-    try:
-        # Prepare messages with images
-        messages = [
-            {"role": "system", "content": "You are an AI assistant specialized in analyzing Instagram stories and creating engaging newsletters. Analyze the provided Instagram story screenshots and describe their content, context, themes, and any text visible in the images. Be detailed but concise."}
-        ]
-        
-        # Add each image to the messages
-        for i, img_path in enumerate(image_paths):
-            base64_image = encode_image_to_base64(img_path)
-            if base64_image:
-                messages.append({
-                    "role": "user", 
-                    "content": [
-                        {"type": "text", "text": f"Analyze this Instagram story (image {i+1} of {len(image_paths)}):"},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                    ]
-                })
-            else:
-                print(f"Skipping image {img_path} due to encoding error")
-        
-        # Ask for a summary of all images
-        messages.append({
-            "role": "user",
-            "content": "Now provide a comprehensive analysis of all the Instagram stories, noting themes, content types, and how they connect. This will be used to generate a newsletter."
-        })
-        
-        print("Sending images to OpenAI for analysis...")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # Updated to use the current vision-capable model
-            messages=messages,
-            max_tokens=1000
-        )
-        
-        analysis = response.choices[0].message.content
-        print("Analysis complete!")
-        return analysis
-    
-    except Exception as e:
-        print(f"Error during OpenAI analysis: {e}")
-        return f"Error analyzing Instagram stories: {str(e)}"
 
 def generate_newsletter(analysis, recipient_name="Subscriber"):
     """Generate a newsletter based on the analyzed Instagram stories."""
@@ -468,11 +400,11 @@ def generate_newsletter(analysis, recipient_name="Subscriber"):
         # Create the prompt for newsletter generation
         messages = [
             {"role": "system", "content": "You are an AI assistant specialized in creating engaging newsletters based on Instagram content. Your task is to create a well-formatted, engaging newsletter based on analyzed Instagram stories. The newsletter should be in HTML format and include a catchy subject line, personalized greeting, well-structured content sections, and a friendly sign-off."}, 
-            {"role": "user", "content": f"Based on the following analysis of Instagram stories:\n\n{analysis}\n\nCreate an engaging, well-formatted newsletter email addressed to {recipient_name}. Include a catchy subject line, personalized greeting, summary of the Instagram highlights, and a friendly sign-off. Format the newsletter in HTML with appropriate styling."}
+            {"role": "user", "content": f"Based on the following analysis of Instagram stories:\n\n{analysis_to_text(analysis)}\n\nCreate an engaging, well-formatted newsletter email addressed to {recipient_name}. Include a catchy subject line, personalized greeting, summary of the Instagram highlights, and a friendly sign-off. Format the newsletter in HTML with appropriate styling."}
         ]
         
         print("Generating newsletter with OpenAI...")
-        response = openai_client.chat.completions.create(
+        response = get_llm_gateway().complete(
             model="gpt-4o",  # Updated to use the current model
             messages=messages,
             max_tokens=1500
@@ -500,12 +432,12 @@ def extract_subject_line(newsletter_content):
 def save_newsletter_to_file(newsletter_content, filename="newsletter.html", screenshots=None, include_images=True, stories_info=None):
     """Save the newsletter content to an HTML file, optionally embedding the screenshots."""
     # Clean up the newsletter content to extract just the HTML part
-    if "<html>" in newsletter_content.lower():
+    if "<html" in newsletter_content.lower():
         # Find the starting <!DOCTYPE html> or <html> tag
         if "<!doctype html>" in newsletter_content.lower():
             start_idx = newsletter_content.lower().find("<!doctype html>")
         else:
-            start_idx = newsletter_content.lower().find("<html>")
+            start_idx = newsletter_content.lower().find("<html")
         
         # Find the ending </html> tag
         end_idx = newsletter_content.lower().find("</html>") + 7
@@ -536,144 +468,14 @@ def save_newsletter_to_file(newsletter_content, filename="newsletter.html", scre
         else:
             insert_idx = len(html_content) - 7  # Just before </html>
         
-        # Parse stories_info to get account classifications if available
-        story_classifications = {}
+        # Use account classifications from the analysis if available
+        report = None
         if stories_info:
             try:
-                # Try to parse the JSON if it's a string
-                if isinstance(stories_info, str):
-                    import json
-                    
-                    # Check if JSON is wrapped in code block markers (```json...```)
-                    if stories_info.strip().startswith("```") and "```" in stories_info[3:]:
-                        # Extract content between the code block markers
-                        start_marker = stories_info.find("```") + 3
-                        if stories_info[start_marker:].startswith("json\n"):
-                            start_marker += 5  # Skip "json\n"
-                        elif stories_info[start_marker:].startswith("\n"):
-                            start_marker += 1  # Skip newline
-                            
-                        end_marker = stories_info[start_marker:].find("```") + start_marker
-                        json_content = stories_info[start_marker:end_marker].strip()
-                        stories_data = json.loads(json_content)
-                    else:
-                        # Try to parse directly
-                        stories_data = json.loads(stories_info)
-                else:
-                    stories_data = stories_info
-                
-                # Check if it has a 'stories' key (expected format)
-                if 'stories' in stories_data:
-                    for story in stories_data['stories']:
-                        # Map the filename to its classification
-                        if 'filename' in story and 'account_type' in story and 'account_name' in story:
-                            story_classifications[story['filename']] = {
-                                'account_type': story['account_type'],
-                                'account_name': story['account_name']
-                            }
+                report = coerce_report(stories_info)
             except Exception as e:
                 print(f"Warning: Could not parse stories information: {e}")
-                print(f"First 100 characters of stories_info: {stories_info[:100]}...")
-        
-        # Create image gallery section
-        image_section = "\n\n<!-- Instagram Story Images -->\n"
-        image_section += "<div style='margin-top: 30px; border-top: 1px solid #ccc; padding-top: 20px;'>\n"
-        image_section += "<h2 style='text-align: center; color: #ff5722;'>Original Instagram Stories</h2>\n"
-        
-        # Group stories by account type
-        personal_stories = []
-        influencer_stories = []
-        unknown_stories = []
-        
-        for i, img_path in enumerate(screenshots):
-            img_filename = os.path.basename(img_path)
-            
-            # Determine account type and name
-            account_type = "unknown"
-            account_name = "Unknown"
-            
-            # Try to get from story classifications first
-            if img_filename in story_classifications:
-                account_type = story_classifications[img_filename]['account_type']
-                account_name = story_classifications[img_filename]['account_name']
-            # Fallback: try to extract from filename
-            elif "_story_" in img_filename:
-                account_name = img_filename.split("_story_")[0]
-            
-            # Categorize the story
-            story_item = {
-                'path': img_path,
-                'filename': img_filename,
-                'account_name': account_name
-            }
-            
-            # For sample images that don't have account types, attempt to infer from the content
-            if account_type.lower() == "unknown" and img_filename.startswith("story_sample_"):
-                if img_filename in ["story_sample_1.png", "story_sample_4.png", "story_sample_5.png", "story_sample_6.png"]:
-                    # Assume these are personal friends based on content
-                    account_type = "friend"
-                    # Set default account names if not already set
-                    if account_name == "Unknown":
-                        if img_filename == "story_sample_1.png":
-                            account_name = "maria.nashef"
-                        elif img_filename in ["story_sample_4.png", "story_sample_5.png", "story_sample_6.png"]:
-                            account_name = "ladypary_"
-                elif img_filename in ["story_sample_2.png"]:
-                    account_type = "influencer"
-                    if account_name == "Unknown":
-                        account_name = "elite.champaign"
-                elif img_filename in ["story_sample_3.png"]:
-                    account_type = "influencer"
-                    if account_name == "Unknown":
-                        account_name = "ksi"
-            
-            if account_type.lower() == "friend" or account_type.lower() == "personal":
-                personal_stories.append(story_item)
-            elif account_type.lower() == "influencer" or account_type.lower() == "brand":
-                influencer_stories.append(story_item)
-            else:
-                unknown_stories.append(story_item)
-        
-        # Create friend stories section if we have any
-        if personal_stories:
-            image_section += "<h3 style='margin-top: 25px; text-align: center; color: #3897f0;'>✨ Friend Stories ✨</h3>\n"
-            image_section += "<div style='display: flex; flex-wrap: wrap; justify-content: center; gap: 20px;'>\n"
-            
-            for story in personal_stories:
-                image_section += f"<div style='max-width: 300px; text-align: center;'>\n"
-                image_section += f"<img src='{story['path']}' style='max-width: 100%; border-radius: 8px; border: 1px solid #ddd;'>\n"
-                image_section += f"<p style='margin-top: 5px; font-weight: bold;'>{story['account_name']}</p>\n"
-                image_section += f"</div>\n"
-            
-            image_section += "</div>\n"
-        
-        # Create influencer stories section if we have any
-        if influencer_stories:
-            image_section += "<h3 style='margin-top: 25px; text-align: center; color: #e1306c;'>🔥 Influencer Content 🔥</h3>\n"
-            image_section += "<div style='display: flex; flex-wrap: wrap; justify-content: center; gap: 20px;'>\n"
-            
-            for story in influencer_stories:
-                image_section += f"<div style='max-width: 300px; text-align: center;'>\n"
-                image_section += f"<img src='{story['path']}' style='max-width: 100%; border-radius: 8px; border: 1px solid #ddd;'>\n"
-                image_section += f"<p style='margin-top: 5px; font-weight: bold;'>{story['account_name']}</p>\n"
-                image_section += f"</div>\n"
-            
-            image_section += "</div>\n"
-        
-        # Create unknown type section if we have any
-        if unknown_stories:
-            image_section += "<h3 style='margin-top: 25px; text-align: center; color: #999;'>Other Stories</h3>\n"
-            image_section += "<div style='display: flex; flex-wrap: wrap; justify-content: center; gap: 20px;'>\n"
-            
-            for story in unknown_stories:
-                image_section += f"<div style='max-width: 300px; text-align: center;'>\n"
-                image_section += f"<img src='{story['path']}' style='max-width: 100%; border-radius: 8px; border: 1px solid #ddd;'>\n"
-                image_section += f"<p style='margin-top: 5px; font-weight: bold;'>{story['account_name']}</p>\n"
-                image_section += f"</div>\n"
-            
-            image_section += "</div>\n"
-        
-        image_section += "</div>\n"
+        image_section = render_gallery(screenshots, report)
         
         # Insert the image section
         html_content = html_content[:insert_idx] + image_section + html_content[insert_idx:]
@@ -685,52 +487,14 @@ def save_newsletter_to_file(newsletter_content, filename="newsletter.html", scre
     print(f"Newsletter saved to {filename}")
     return filename
 
-# Enhanced newsletter generation - focusing on top stories
-def generate_enhanced_newsletter(analysis, recipient_name="Subscriber"):
-    """Generate an enhanced newsletter with friends vs. influencers sections, focusing on top stories."""
-    print("\n--- Generating Enhanced Instagram Newsletter ---")
-    
-    try:
-        # Create the prompt for newsletter generation
-        messages = [
-            {"role": "system", "content": """You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
-            Your task is to create a well-formatted, professional newsletter that separates content from friends versus influencers/brands.
-            The newsletter should be in HTML format with responsive design and include:
-            1. A catchy subject line
-            2. Personalized greeting
-            3. Separate sections for friends' updates and influencer content
-            4. Attribution of content to specific accounts
-            5. Well-structured content sections with engaging descriptions
-            6. A friendly sign-off
-            
-            IMPORTANT: Focus only on the top 3 most engaging or relevant stories across both categories.
-            You decide which stories are most relevant based on their content, themes, and relevance scores.
-            
-            Make the newsletter visually appealing with Instagram-inspired styling."""}
-        ]
-        
-        # Add the user prompt with analysis
-        user_prompt = f"Based on the following JSON analysis of Instagram stories:\n\n{analysis}\n\nCreate an engaging, well-formatted newsletter email addressed to {recipient_name}. Organize the content into 'Friends Updates' and 'Influencer Highlights' sections as appropriate based on the account classifications. Only include the TOP 3 most interesting/relevant stories in the main content. Include account names with each piece of content. Format the newsletter in HTML with responsive, Instagram-inspired styling."
-        messages.append({"role": "user", "content": user_prompt})
-        
-        print("Generating enhanced newsletter with OpenAI...")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # Using the current model
-            messages=messages,
-            max_tokens=2000
-        )
-        
-        newsletter = response.choices[0].message.content
-        print("Enhanced newsletter generation complete!")
-        return newsletter
-        
-    except Exception as e:
-        print(f"Error during enhanced newsletter generation: {e}")
-        return f"Error generating newsletter: {str(e)}"
-
 # Enhanced analysis to include account type classification
-def analyze_stories_with_account_info(image_paths):
-    """Enhanced analysis that also attempts to classify accounts as friends or influencers."""
+def analyze_stories_with_account_info(image_paths, detail=None, max_concurrency=None):
+    """Enhanced analysis that also attempts to classify accounts as friends or influencers.
+    
+    Each story is analyzed in its own concurrent request and the results are merged
+    into a StoryAnalysisReport, or an error string if the analysis could not run.
+    ``detail`` selects the vision detail level ("low", "high" or "auto").
+    """
     print("\n--- Analyzing Instagram Stories with Enhanced Account Info ---")
     
     if not image_paths or len(image_paths) == 0:
@@ -743,132 +507,64 @@ def analyze_stories_with_account_info(image_paths):
             return "No image content available for analysis."
     
     try:
-        # Prepare messages with images
-        messages = [
-            {"role": "system", "content": """You are an AI assistant specialized in analyzing Instagram stories and creating engaging newsletters. 
-            For each Instagram story screenshot:
-            1. Describe the content, context, themes, and any text visible in the images.
-            2. Try to determine the account type (personal friend or influencer/brand) based on the content.
-            3. If possible, identify or suggest the account name.
-            4. Categorize the content type (e.g., personal update, promotional, lifestyle, etc.).
-            Be detailed but concise."""}
-        ]
-        
-        # Add each image to the messages
-        for i, img_path in enumerate(image_paths):
-            # Extract username if possible from filename (format: username_story_X.png)
-            username = "Unknown"
-            img_filename = os.path.basename(img_path)
-            if "_story_" in img_filename:
-                username = img_filename.split("_story_")[0]
-            
-            base64_image = encode_image_to_base64(img_path)
-            if base64_image:
-                messages.append({
-                    "role": "user", 
-                    "content": [
-                        {"type": "text", "text": f"Analyze this Instagram story (image {i+1} of {len(image_paths)}):\n" + 
-                                            f"File: {img_filename}\n" + 
-                                            (f"Possible username: {username}\n" if username != "Unknown" else "")},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                    ]
-                })
-            else:
-                print(f"Skipping image {img_path} due to encoding error")
-        
-        # Ask for a comprehensive analysis with account classification
-        messages.append({
-            "role": "user",
-            "content": """Now provide a comprehensive JSON-formatted analysis of all the Instagram stories, with this structure:
-            {
-                "stories": [
-                    {
-                        "index": 0,  // zero-based index of the image
-                        "filename": "story_sample_1.png",
-                        "account_name": "username or best guess",
-                        "account_type": "friend" or "influencer",  // classify based on content
-                        "content_type": "personal", "promotional", etc.,
-                        "description": "detailed description of the content",
-                        "visible_text": "any text visible in the image",
-                        "themes": ["theme1", "theme2"],
-                        "relevance": "high/medium/low"
-                    },
-                    // Repeat for each image
-                ],
-                "overall_themes": ["theme1", "theme2"],
-                "newsletter_sections": [
-                    {
-                        "title": "Section title",
-                        "description": "Section content suggestion",
-                        "related_stories": [0, 1]  // indices of related stories
-                    }
-                ]
-            }
-            
-            This will be used to generate a newsletter that differentiates between friend updates and influencer content."""
-        })
-        
-        print("Sending images to OpenAI for enhanced analysis...")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # Using the current vision-capable model
-            messages=messages,
-            max_tokens=1500,
-            response_format={"type": "text"}
-        )
-        
-        analysis = response.choices[0].message.content
+        report = analyze_stories_concurrently(image_paths, detail=detail, max_concurrency=max_concurrency)
+        failed = sum(1 for story in report.stories if story.error)
+        if failed:
+            print(f"Warning: {failed} of {len(report.stories)} stories could not be analyzed")
         print("Enhanced analysis complete!")
-        return analysis
+        return report
     
     except Exception as e:
         print(f"Error during enhanced OpenAI analysis: {e}")
         return f"Error analyzing Instagram stories: {str(e)}"
 
-# Enhanced newsletter generation
-def generate_enhanced_newsletter(analysis, recipient_name="Subscriber"):
-    """Generate an enhanced newsletter with friends vs. influencers sections."""
+# Enhanced newsletter generation - the model writes short copy, the HTML comes from templates
+NEWSLETTER_COPY_MODEL = "gpt-4o"
+
+def generate_newsletter_copy(report, stories, recipient_name="Subscriber"):
+    """Ask the model for the newsletter's short copy only (subject, intros, one blurb per story)."""
+    messages = [
+        {"role": "system", "content": """You write copy for an Instagram story newsletter that separates friends from influencers/brands.
+            Write a catchy subject line, a one-line tagline, a short personalized intro, one-sentence intros for the
+            friends and influencer sections, one or two engaging sentences per story (without repeating the account
+            name, which is shown next to it), and a friendly sign-off. Plain text only, no HTML."""},
+        {"role": "user", "content": f"Newsletter for {recipient_name}. Overall themes: {', '.join(report.overall_themes)}.\n\n"
+                                    f"Stories:\n{analysis_to_text(StoryAnalysisReport(stories=stories))}"}
+    ]
+    try:
+        return get_llm_gateway().parse(NewsletterCopy, model=NEWSLETTER_COPY_MODEL, messages=messages, max_tokens=600)
+    except Exception as e:
+        print(f"Error generating newsletter copy, using analysis text instead: {e}")
+        return default_copy(report, stories)
+
+def generate_enhanced_newsletter(analysis, recipient_name="Subscriber", top_stories=3, image_paths=None):
+    """Generate an enhanced newsletter with friends vs. influencers sections, focusing on top stories.
+    
+    Returns "Subject: ...\n\n<html>". Only the top ``top_stories`` stories are featured
+    (all when None); ``image_paths`` maps story indexes to images shown with each story.
+    """
     print("\n--- Generating Enhanced Instagram Newsletter ---")
     
     try:
-        # Create the prompt for newsletter generation
-        messages = [
-            {"role": "system", "content": """You are an AI assistant specialized in creating engaging newsletters based on Instagram content.
-            Your task is to create a well-formatted, professional newsletter that separates content from friends versus influencers/brands.
-            The newsletter should be in HTML format with responsive design and include:
-            1. A catchy subject line
-            2. Personalized greeting
-            3. Separate sections for friends' updates and influencer content
-            4. Attribution of content to specific accounts
-            5. Well-structured content sections with engaging descriptions
-            6. A friendly sign-off
-            
-            Make the newsletter visually appealing with Instagram-inspired styling."""}
-        ]
-        
-        # Add the user prompt with analysis
-        user_prompt = f"Based on the following JSON analysis of Instagram stories:\n\n{analysis}\n\nCreate an engaging, well-formatted newsletter email addressed to {recipient_name}. Organize the content into 'Friends Updates' and 'Influencer Highlights' sections as appropriate based on the account classifications. Include account names with each piece of content. Format the newsletter in HTML with responsive, Instagram-inspired styling."
-        messages.append({"role": "user", "content": user_prompt})
-        
-        print("Generating enhanced newsletter with OpenAI...")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # Using the current model
-            messages=messages,
-            max_tokens=2000
-        )
-        
-        newsletter = response.choices[0].message.content
-        print("Enhanced newsletter generation complete!")
-        return newsletter
-        
+        report = coerce_report(analysis)
     except Exception as e:
         print(f"Error during enhanced newsletter generation: {e}")
         return f"Error generating newsletter: {str(e)}"
+    
+    stories = report.top_stories(top_stories)
+    print("Generating newsletter copy with OpenAI...")
+    copy = generate_newsletter_copy(report, stories, recipient_name)
+    html_content = render_newsletter(copy, report, recipient_name,
+                                     featured={story.index for story in stories}, image_paths=image_paths)
+    print("Enhanced newsletter generation complete!")
+    return f"Subject: {copy.subject}\n\n{html_content}"
 
 # Main Process Function
-def run_instagram_newsletter(usernames=None, use_samples=False):
-    """Main function to run the Instagram story newsletter process."""
-    print("\n=== Instagram Story Newsletter Generator ===\n")
-    
+def capture_story_screenshots(usernames=None, use_samples=False, max_concurrency=None):
+    """Steps 1-2: log in and capture stories (or use the bundled samples); returns deduplicated image paths.
+
+    Returns [] when every story was already analyzed by an earlier run.
+    """
     if use_samples:
         print("Using sample images instead of extracting from Instagram...")
         sample_images = glob.glob("story_sample_*.png")
@@ -884,10 +580,12 @@ def run_instagram_newsletter(usernames=None, use_samples=False):
     if not use_samples:
         # Step 1: Login to Instagram
         print("\nStep 1: Logging in to Instagram")
-        cookies = login_instagram()
+        with span("login") as record:
+            cookies = login_instagram()
+            record["logged_in"] = bool(cookies)
         if not cookies:
             print("Login failed. Cannot proceed.")
-            return False
+            return None
         
         # Step 2: Extract stories from specified Instagram accounts
         print("\nStep 2: Extracting Instagram stories")
@@ -895,43 +593,143 @@ def run_instagram_newsletter(usernames=None, use_samples=False):
             print("No usernames provided. Using default username.")
             usernames = ["isabelokunpicena_"]  # Default username
         
+        # Capture 1 story per user, all accounts in parallel
         screenshots = []
-        for username in usernames:
-            print(f"\nExtracting story for {username}...")
-            user_screenshots = extract_instagram_story(cookies, username, 1)  # Capture 1 story per user
-            screenshots.extend(user_screenshots)
-        
+        for result in extract_stories_concurrently(cookies, usernames, 1, max_concurrency=max_concurrency,
+                                                   storage_state=login_storage_state()):
+            screenshots.extend(result["screenshots"])
+        
+        # Stories whose content was already analyzed (e.g. reposts) are not new either
+        screenshots = get_story_index().new_content(screenshots)
+        if not screenshots and get_story_index().skipped:
+            print("No new stories since the last run.")
+            return []
         if not screenshots or len(screenshots) == 0:
-            print("Failed to capture any screenshots. Using sample images if available.")
-            sample_images = glob.glob("story_sample_*.png")
-            if sample_images:
-                print(f"Found {len(sample_images)} sample images")
-                screenshots = sample_images
-            else:
-                print("No screenshots or sample images available. Cannot proceed.")
-                return False
+            screenshots = sample_images_fallback()
+            if not screenshots:
+                return None
+    
+    # Drop repeated frames so each unique story is only sent to OpenAI once
+    return dedupe_images(screenshots)
+
+def sample_images_fallback():
+    """The bundled sample stories, used when capture produced nothing; None if there are none."""
+    print("Failed to capture any screenshots. Using sample images if available.")
+    sample_images = glob.glob("story_sample_*.png")
+    if sample_images:
+        print(f"Found {len(sample_images)} sample images")
+        return sample_images
+    print("No screenshots or sample images available. Cannot proceed.")
+    return None
+
+# Overlap capture and analysis: each story is analyzed as soon as it is captured (can be overridden in .env)
+STORY_PIPELINE_OVERLAP = os.getenv("STORY_PIPELINE_OVERLAP", "true").lower() in ("true", "1", "yes")
+
+def capture_and_analyze_stories(usernames=None, max_concurrency=None, vision_detail=None):
+    """Steps 1-3 as one dataflow; returns (screenshots, report).
+
+    If nothing could be captured the sample images are returned with no
+    report, to be analyzed afterwards. Returns ([], None) when every story
+    was already analyzed by an earlier run and (None, None) if login failed
+    or there is nothing to analyze.
+    """
+    print("\nStep 1: Logging in to Instagram")
+    with span("login") as record:
+        cookies = login_instagram()
+        record["logged_in"] = bool(cookies)
+    if not cookies:
+        print("Login failed. Cannot proceed.")
+        return None, None
+    print("\nSteps 2-3: Extracting and analyzing Instagram stories")
+    if not usernames:
+        print("No usernames provided. Using default username.")
+        usernames = ["isabelokunpicena_"]  # Default username
+    screenshots, report = capture_and_analyze(cookies, usernames, 1, max_concurrency=max_concurrency,
+                                              detail=vision_detail, storage_state=login_storage_state())
+    if not screenshots:
+        if get_story_index().skipped:
+            print("No new stories since the last run.")
+            return [], None
+        samples = sample_images_fallback()
+        return (dedupe_images(samples) if samples else None), None
+    return screenshots, report
+
+@instrumented_run("instagram_newsletter")
+def run_instagram_newsletter(usernames=None, use_samples=False, max_concurrency=None, vision_detail=None, stream=False,
+                             resume=True, overlap=None):
+    """Main function to run the Instagram story newsletter process.
+
+    Each stage's output is checkpointed; with ``resume`` an unfinished run with
+    the same inputs continues from its first incomplete stage. With ``overlap``
+    stories are analyzed while other accounts are still being captured.
+    """
+    print("\n=== Instagram Story Newsletter Generator ===\n")
+    if not check_openai_key():
+        return False
+    init_agentops()
+    run = PipelineRun("instagram_newsletter",
+                      {"usernames": sorted(usernames or []), "use_samples": use_samples, "vision_detail": vision_detail},
+                      resume=resume)
+    
+    overlap = STORY_PIPELINE_OVERLAP if overlap is None else overlap
+    screenshots = run.get("screenshots", check=files_exist)
+    if screenshots is None:
+        if overlap and not use_samples:
+            # One login and one capture pass; no sequential re-capture if it comes back empty
+            screenshots, report = capture_and_analyze_stories(usernames, max_concurrency, vision_detail)
+        else:
+            screenshots, report = capture_story_screenshots(usernames, use_samples, max_concurrency), None
+        if not screenshots:
+            get_story_index().print_stats()
+            return False
+        run.save("screenshots", screenshots)
+        if report:
+            run.save("analysis", report.model_dump())
     
     # Step 3: Analyze the stories with OpenAI
     print("\nStep 3: Analyzing Instagram stories with OpenAI")
-    stories_info = analyze_stories_with_account_info(screenshots)
-    print(f"\nContent Analysis Summary:\n{stories_info[:300]}..." + ("" if len(stories_info) <= 300 else "\n[content trimmed]"))
-    
-    # Step 4: Generate a newsletter based on the analysis
-    print("\nStep 4: Generating newsletter based on analysis")
-    newsletter = generate_enhanced_newsletter(stories_info, "Instagram Subscriber") 
-    
-    # Step 5: Save the newsletter to a file
-    print("\nStep 5: Saving newsletter to file")
-    subject_line = extract_subject_line(newsletter)
-    print(f"Newsletter Subject: {subject_line}")
+    stories_info = run.get("analysis")
+    if stories_info is not None:
+        stories_info = coerce_report(stories_info)
+    else:
+        stories_info = analyze_stories_with_account_info(screenshots, detail=vision_detail)
+        if isinstance(stories_info, StoryAnalysisReport):
+            run.save("analysis", stories_info.model_dump())
+    summary = analysis_to_text(stories_info)
+    print(f"\nContent Analysis Summary:\n{summary[:300]}..." + ("" if len(summary) <= 300 else "\n[content trimmed]"))
     
     # Create a unique filename using timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     newsletter_file = f"instagram_newsletter_{timestamp}.html"
     
-    # Pass the stories_info to the save_newsletter function for grouping
-    save_newsletter_to_file(newsletter, newsletter_file, screenshots, True, stories_info)
-    
+    if stream and isinstance(stories_info, StoryAnalysisReport):
+        # Steps 4+5: Stream the newsletter straight into the file section by section
+        print("\nStep 4: Streaming newsletter to file")
+        result = write_newsletter_streaming(stories_info, newsletter_file, "Instagram Subscriber",
+                                            screenshots=screenshots)
+        subject_line = result["subject"]
+        print(f"Newsletter Subject: {subject_line}")
+    else:
+        # Step 4: Generate a newsletter based on the analysis
+        print("\nStep 4: Generating newsletter based on analysis")
+        newsletter = generate_enhanced_newsletter(stories_info, "Instagram Subscriber") 
+        
+        # Step 5: Save the newsletter to a file
+        print("\nStep 5: Saving newsletter to file")
+        subject_line = extract_subject_line(newsletter)
+        print(f"Newsletter Subject: {subject_line}")
+        
+        # Pass the stories_info to the save_newsletter function for grouping
+        save_newsletter_to_file(newsletter, newsletter_file, screenshots, True, stories_info)
+    
+    run.save("newsletter", {"newsletter_file": newsletter_file, "subject": subject_line})
+    run.complete()
+    
+    print_wait_summary()
+    get_story_index().print_stats()
+    get_analysis_cache().print_stats()
+    print_prep_summary()
+    get_llm_gateway().print_metrics()
     print(f"\nInstagram Newsletter process complete!")
     print(f"Newsletter saved to {newsletter_file}")
     
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import uuid
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from tracing import agentops_active
+
+# Every finished span and run summary is appended here as one JSON line; empty disables the log
+# (can be overridden in .env)
+RUN_LOG_PATH = os.getenv("RUN_LOG_PATH", ".run_log.jsonl")
+# Also send spans to AgentOps when init_agentops has started tracing
+INSTRUMENTATION_AGENTOPS = os.getenv("INSTRUMENTATION_AGENTOPS", "true").lower() in ("true", "1", "yes")
+
+# USD per million (prompt, completion) tokens, used for the per-run cost estimate
+MODEL_PRICES_PER_MILLION = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_current_span = ContextVar("current_span", default=None)
+_current_run_active = ContextVar("current_run_active", default=False)
+_run = {"id": None, "pipeline": None, "started": None, "cpu_started": None}
+_durations = {}
+_errors = Counter()
+_counters = Counter()
+
+
+def _write(record):
+    if not RUN_LOG_PATH:
+        return
+    line = json.dumps(record, default=str)
+    with _lock:
+        try:
+            with open(RUN_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Warning: Could not write run log {RUN_LOG_PATH}: {e}")
+
+
+def _export_agentops(name, started, ended, attributes, error):
+    """Replay a finished span into AgentOps' OpenTelemetry tracer."""
+    if not (INSTRUMENTATION_AGENTOPS and agentops_active()):
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.trace import Status, StatusCode
+
+        attributes = {k: v for k, v in attributes.items() if isinstance(v, (str, bool, int, float))}
+        otel_span = trace.get_tracer("instagram_newsletter").start_span(
+            name, start_time=int(started * 1e9), attributes=attributes
+        )
+        if error:
+            otel_span.set_status(Status(StatusCode.ERROR, error))
+        otel_span.end(end_time=int(ended * 1e9))
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as one span of the current run.
+
+    Yields the span's attribute dict, so the block can add what it learns
+    (sizes, tokens, counts). An exception marks the span failed and is re-raised.
+    """
+    record = dict(attrs)
+    span_id = next(_span_ids)
+    token = _current_span.set(span_id)
+    started = time.time()
+    started_perf = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - started_perf
+        _current_span.reset(token)
+        parent = _current_span.get()
+        with _lock:
+            _durations.setdefault(name, []).append(duration)
+            if error:
+                _errors[name] += 1
+        _write({"type": "span", "run_id": _run["id"], "id": span_id, "parent": parent, "name": name,
+                "start": round(started, 3), "duration": round(duration, 4), "ok": error is None,
+                "error": error, **record})
+        _export_agentops(name, started, started + duration, record, error)
+
+
+def count(name, amount=1):
+    """Add ``amount`` to a run counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD for one call, or 0.0 for models without a known price."""
+    for known in sorted(MODEL_PRICES_PER_MILLION, key=len, reverse=True):
+        if model and model.startswith(known):
+            prompt_price, completion_price = MODEL_PRICES_PER_MILLION[known]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return 0.0
+
+
+def record_llm_usage(record, response, model=None):
+    """Copy token usage (and estimated cost) from an OpenAI response or final stream chunk into a span."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cost = estimate_cost(model or getattr(response, "model", None), prompt_tokens, completion_tokens)
+    record.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_usd=round(cost, 6))
+    count("openai.prompt_tokens", prompt_tokens)
+    count("openai.completion_tokens", completion_tokens)
+    count("openai.cost_usd", cost)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return None
+
+
+def start_run(pipeline, **attrs):
+    """Start a new run: later spans and counters belong to it. Returns the run ID."""
+    run_id = f"{pipeline}-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    with _lock:
+        _run.update(id=run_id, pipeline=pipeline, started=time.time(), cpu_started=time.process_time())
+        _durations.clear()
+        _errors.clear()
+        _counters.clear()
+    _write({"type": "run_start", "run_id": run_id, "pipeline": pipeline,
+            "start": round(_run["started"], 3), **attrs})
+    return run_id
+
+
+def end_run(ok=True):
+    """Write the run's totals to the run log and print where its time went.
+
+    Spans finishing after this (e.g. outbox sends) are still logged under the run's ID.
+    """
+    if not _run["id"]:
+        return None
+    with _lock:
+        stages = {name: {"count": len(durations), "total_seconds": round(sum(durations), 3),
+                         "p50_seconds": round(_percentile(durations, 0.5), 4),
+                         "p95_seconds": round(_percentile(durations, 0.95), 4),
+                         "errors": _errors[name]}
+                  for name, durations in _durations.items()}
+        counters = dict(_counters)
+    summary = {
+        "type": "run_end",
+        "run_id": _run["id"],
+        "pipeline": _run["pipeline"],
+        "ok": bool(ok),
+        "wall_seconds": round(time.time() - _run["started"], 3),
+        "cpu_seconds": round(time.process_time() - _run["cpu_started"], 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages,
+        "counters": counters,
+    }
+    _write(summary)
+    print_run_summary(summary)
+    return summary
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def print_run_summary(summary):
+    """Per-span counts and time for a finished run, plus OpenAI tokens and estimated cost."""
+    rss = f", peak RSS {summary['peak_rss_mb']:.0f} MB" if summary["peak_rss_mb"] else ""
+    print(f"\n--- Run {summary['run_id']}: {summary['wall_seconds']:.1f}s wall clock, "
+          f"{summary['cpu_seconds']:.1f}s CPU{rss} ---")
+    for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        errors = f", {stage['errors']} failed" if stage["errors"] else ""
+        print(f"{name:<14} {stage['count']:>4}x  total {stage['total_seconds']:.1f}s, "
+              f"p50 {stage['p50_seconds'] * 1000:.0f} ms / p95 {stage['p95_seconds'] * 1000:.0f} ms{errors}")
+    counters = summary["counters"]
+    if counters.get("openai.prompt_tokens") or counters.get("openai.completion_tokens"):
+        print(f"OpenAI: {counters.get('openai.prompt_tokens', 0)} prompt + "
+              f"{counters.get('openai.completion_tokens', 0)} completion tokens, "
+              f"{counters.get('openai.image_bytes', 0) / 1024:.0f} KB of images, "
+              f"~${counters.get('openai.cost_usd', 0):.4f}")
+    if RUN_LOG_PATH:
+        print(f"Run log: {RUN_LOG_PATH}")
+
+
+def instrumented_run(pipeline):
+    """Decorator making each call of a pipeline entry point one run; nested entry points join the outer run."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_run_active.get():
+                return fn(*args, **kwargs)
+            start_run(pipeline)
+            token = _current_run_active.set(True)
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                _current_run_active.reset(token)
+                end_run(ok=bool(result))
+
+        return wrapper
+
+    return decorator
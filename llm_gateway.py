@@ -0,0 +1,316 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+
+from instrumentation import span, count, record_llm_usage
+
+# Client-side limits shared by every OpenAI call in the process (can be overridden in .env).
+# Set them a little under the account's quota so the API itself rarely answers 429.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# Rough token cost of one image part, used only for rate limiting
+IMAGE_TOKEN_ESTIMATE = {"low": 85, "high": 1105, "auto": 765}
+
+# HTTP statuses worth retrying; everything else (bad request, auth) fails immediately
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate_per_minute``.
+
+    ``reserve`` takes the tokens immediately (the balance may go negative) and
+    returns how long the caller must wait before using them. Because each
+    reservation pushes later callers further back, concurrent callers are
+    spread out instead of all retrying at once, and the same bucket serves
+    threads and asyncio tasks alike.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single request larger than the bucket could never fit; cap it at the capacity
+            self._tokens -= min(amount, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Cheap upper-bound estimate of prompt + completion tokens for a chat request."""
+    tokens = 0
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4 + 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                detail = part.get("image_url", {}).get("detail", "auto")
+                tokens += IMAGE_TOKEN_ESTIMATE.get(detail, IMAGE_TOKEN_ESTIMATE["auto"])
+        tokens += 4
+    return tokens + (max_tokens or 0)
+
+
+def image_bytes(messages):
+    """Decoded size of the base64 data-URL images in a chat request."""
+    total = 0
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            continue
+        for part in content or []:
+            url = part.get("image_url", {}).get("url", "") if part.get("type") == "image_url" else ""
+            if url.startswith("data:"):
+                total += len(url.partition(",")[2]) * 3 // 4
+    return total
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _is_retryable(error):
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    # openai.APIConnectionError and APITimeoutError carry no status code
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After / retry-after-ms headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _parsed(response):
+    message = response.choices[0].message
+    if message.parsed is None:
+        raise ValueError(f"Model returned no structured output: {message.refusal or 'empty response'}")
+    return message.parsed
+
+
+class LLMGateway:
+    """Single entry point for OpenAI chat calls with rate limiting, retries and metrics.
+
+    ``complete`` is for sync code and ``acomplete`` for asyncio code; both share
+    the same request and token buckets, so sync and async pipelines running
+    together stay within one quota.
+    """
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT_SECONDS):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "estimated_tokens": 0,
+        }
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import OpenAI
+            # Retries are handled here, so the SDK's own retry loop is switched off
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=self.timeout)
+        return self._client
+
+    def _get_async_client(self):
+        """One AsyncOpenAI client per event loop, since its connections are bound to the loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=self.timeout)
+            self._async_clients[loop] = client
+        return client
+
+    def _reserve(self, kwargs):
+        """Take a request slot and the estimated tokens; return the delay before sending."""
+        tokens = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        with self._lock:
+            self.metrics["calls"] += 1
+            self.metrics["estimated_tokens"] += tokens
+            self.metrics["total_wait_seconds"] += delay
+            self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], delay)
+            if delay > 0:
+                self.metrics["queue_depth"] += 1
+                self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.metrics["queue_depth"])
+        return delay
+
+    def _dequeue(self):
+        with self._lock:
+            self.metrics["queue_depth"] -= 1
+
+    def _backoff(self, attempt, error):
+        """Delay before retry ``attempt``; honours Retry-After, otherwise full-jitter exponential."""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, LLM_BACKOFF_MAX_SECONDS) + random.uniform(0, 0.25)
+        return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _should_retry(self, attempt, error):
+        with self._lock:
+            if attempt < self.max_retries and _is_retryable(error):
+                self.metrics["retries"] += 1
+                return True
+            self.metrics["failures"] += 1
+        return False
+
+    def _span(self, kwargs, attempt):
+        """Span for one request attempt; image bytes are counted once per attempt sent."""
+        sent_image_bytes = image_bytes(kwargs.get("messages"))
+        count("openai.image_bytes", sent_image_bytes)
+        return span("openai_call", model=kwargs.get("model"), attempt=attempt,
+                    image_bytes=sent_image_bytes, stream=bool(kwargs.get("stream")))
+
+    def _call(self, send, kwargs):
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(kwargs)
+            if delay > 0:
+                # Leave the queue even if the wait is interrupted (e.g. the task is cancelled)
+                try:
+                    time.sleep(delay)
+                finally:
+                    self._dequeue()
+            try:
+                with self._span(kwargs, attempt) as record:
+                    response = send(**kwargs)
+                    record_llm_usage(record, response, kwargs.get("model"))
+                return response
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                wait = self._backoff(attempt, e)
+                print(f"OpenAI call failed ({type(e).__name__}), retrying in {wait:.1f}s...")
+                time.sleep(wait)
+
+    async def _acall(self, send, kwargs):
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(kwargs)
+            if delay > 0:
+                # Leave the queue even if the wait is interrupted (e.g. the task is cancelled)
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._dequeue()
+            try:
+                with self._span(kwargs, attempt) as record:
+                    response = await asyncio.wait_for(send(**kwargs), timeout=self.timeout)
+                    record_llm_usage(record, response, kwargs.get("model"))
+                return response
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                wait = self._backoff(attempt, e)
+                print(f"OpenAI call failed ({type(e).__name__}), retrying in {wait:.1f}s...")
+                await asyncio.sleep(wait)
+
+    def complete(self, **kwargs):
+        """Rate-limited, retried ``chat.completions.create``; raises once retries are exhausted."""
+        return self._call(self._get_client().chat.completions.create, kwargs)
+
+    async def acomplete(self, **kwargs):
+        """Async counterpart of ``complete``."""
+        return await self._acall(self._get_async_client().chat.completions.create, kwargs)
+
+    def parse(self, response_format, **kwargs):
+        """Structured-output call with a strict JSON schema; returns a ``response_format`` instance."""
+        kwargs["response_format"] = response_format
+        return _parsed(self._call(self._get_client().beta.chat.completions.parse, kwargs))
+
+    async def aparse(self, response_format, **kwargs):
+        """Async counterpart of ``parse``."""
+        kwargs["response_format"] = response_format
+        return _parsed(await self._acall(self._get_async_client().beta.chat.completions.parse, kwargs))
+
+    async def astream(self, **kwargs):
+        """Stream a chat completion, yielding text deltas as they arrive.
+
+        Rate limiting and retries cover opening the stream; a failure after the
+        first delta is raised to the caller, which already has partial output.
+        """
+        kwargs["stream"] = True
+        # The final chunk then carries token usage for the run log
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = await self._acall(self._get_async_client().chat.completions.create, kwargs)
+        with span("openai_stream", model=kwargs.get("model")) as record:
+            async for chunk in stream:
+                if chunk.usage:
+                    record_llm_usage(record, chunk, kwargs.get("model"))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        """Close the AsyncOpenAI client for the running event loop, before the loop ends."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics["avg_wait_seconds"] = metrics["total_wait_seconds"] / metrics["calls"] if metrics["calls"] else 0.0
+        return metrics
+
+    def print_metrics(self):
+        metrics = self.get_metrics()
+        if not metrics["calls"]:
+            return
+        print(f"LLM gateway: {metrics['calls']} calls, {metrics['retries']} retries, "
+              f"{metrics['failures']} failures, max queue depth {metrics['max_queue_depth']}, "
+              f"rate-limit wait {metrics['total_wait_seconds']:.1f}s total / "
+              f"{metrics['max_wait_seconds']:.1f}s max")
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """Return the process-wide LLM gateway, creating it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
@@ -1,11 +1,12 @@
-from agents import Agent, Runner
 from dotenv import load_dotenv
-import os
-from insta_digest import InstaDigestAgent
 
-# Load environment variables
+# Load environment variables before the project modules read their settings
 load_dotenv()
 
+from agents import Agent, Runner
+import os
+
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Example 1: Basic Agent Usage
@@ -29,7 +30,8 @@ print("""
 # Uncomment to run the Instagram Digest Pipeline
 # Ensure you have set all required environment variables first
 
-# insta_agent = InstaDigestAgent()
+# from insta_digest import create_digest_agent
+# insta_agent = create_digest_agent()
 # result = insta_agent.run_pipeline(os.getenv("RECEIVER_EMAIL"))
 # print(f"Pipeline Result: {result}")
 """)
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import uuid
+from email import policy
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+PLAIN_TEXT_FALLBACK = "This email contains HTML content with inline images. Please view it in an HTML-capable email client."
+
+# src="..." / src='...' attributes in the newsletter HTML
+SRC_ATTRIBUTE_RE = re.compile(r"""(\bsrc\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+
+# Encoded parts kept in memory, keyed by file path, size and mtime
+MIME_PART_CACHE_MAX_ENTRIES = 64
+
+_part_cache = {}
+_cache_lock = threading.Lock()
+_stats = {"encoded": 0, "reused": 0, "encoded_bytes": 0, "messages": 0, "message_bytes": 0}
+
+
+def _file_key(path, kind):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, kind)
+
+
+def _encode_part(path, kind, cid=None):
+    with open(path, "rb") as f:
+        data = f.read()
+    filename = os.path.basename(path)
+    if kind == "inline":
+        part = MIMEImage(data)
+        part.add_header("Content-ID", f"<{cid or filename}>")
+        part.add_header("Content-Disposition", "inline", filename=filename)
+    else:
+        part = MIMEApplication(data, _subtype="pdf" if filename.lower().endswith(".pdf") else "octet-stream")
+        part.add_header("Content-Disposition", "attachment", filename=filename)
+    return part.as_bytes(policy=policy.SMTP)
+
+
+def encoded_part(path, kind="inline", cid=None):
+    """Serialized base64 MIME part for a file, encoded once and reused until the file changes.
+
+    ``kind`` is "inline" for images referenced as cid:<filename> (or ``cid``)
+    in the HTML, or "attachment" for files such as the PDF digest.
+    """
+    key = _file_key(path, kind) + (cid,)
+    with _cache_lock:
+        part = _part_cache.pop(key, None)
+        if part is not None:
+            _part_cache[key] = part
+            _stats["reused"] += 1
+            return part
+    part = _encode_part(path, kind, cid)
+    with _cache_lock:
+        _part_cache[key] = part
+        _stats["encoded"] += 1
+        _stats["encoded_bytes"] += len(part)
+        while len(_part_cache) > MIME_PART_CACHE_MAX_ENTRIES:
+            _part_cache.pop(next(iter(_part_cache)))
+    return part
+
+
+class NewsletterMessage:
+    """A newsletter email whose images and attachments are encoded once for all recipients.
+
+    The shared parts are serialized up front; ``build`` then only writes the
+    per-recipient headers and HTML around them and returns the message bytes,
+    ready for ``SMTPPool.send(data, from_addr, [recipient])``.
+    """
+
+    def __init__(self, inline_images=(), attachments=(), plain_text=PLAIN_TEXT_FALLBACK, verbose=True):
+        # Only RFC 2046 boundary characters; a Message-ID style value would bring in "@" and the hostname
+        self.boundary = f"=_related_{uuid.uuid4().hex}"
+        self.plain_text = plain_text
+        parts = []
+        for image in inline_images:
+            # Either a path (Content-ID is the filename) or a (path, cid) pair from resolve_inline_images
+            path, cid = image if isinstance(image, tuple) else (image, None)
+            try:
+                parts.append(encoded_part(path, "inline", cid))
+                if verbose:
+                    print(f"Attached inline image: {cid or os.path.basename(path)}")
+            except OSError as e:
+                print(f"Error attaching {path}: {e}")
+        for path in attachments:
+            try:
+                parts.append(encoded_part(path, "attachment"))
+                if verbose:
+                    print(f"Attached file: {path}")
+            except OSError as e:
+                print(f"Error attaching {path}: {e}")
+        delimiter = f"\r\n--{self.boundary}\r\n".encode("ascii")
+        self._shared = b"".join(delimiter + part for part in parts) + f"\r\n--{self.boundary}--\r\n".encode("ascii")
+
+    def _body_part(self, html):
+        alternative = MIMEMultipart("alternative")
+        alternative.attach(MIMEText(self.plain_text, "plain", "utf-8"))
+        alternative.attach(MIMEText(html, "html" if "<html" in html else "plain", "utf-8"))
+        return alternative.as_bytes(policy=policy.SMTP)
+
+    def build(self, sender, recipient, subject, html):
+        """Return the complete message bytes for one recipient."""
+        headers = [
+            ("From", sender),
+            ("To", recipient),
+            ("Subject", subject),
+            ("Date", formatdate(localtime=True)),
+            ("Message-ID", make_msgid()),
+            ("MIME-Version", "1.0"),
+            ("Content-Type", f'multipart/related; boundary="{self.boundary}"'),
+        ]
+        head = "".join(policy.SMTP.header_factory(name, value).fold(policy=policy.SMTP)
+                       for name, value in headers).encode("ascii")
+        data = b"".join([head, f"\r\n--{self.boundary}\r\n".encode("ascii"), self._body_part(html), self._shared])
+        with _cache_lock:
+            _stats["messages"] += 1
+            _stats["message_bytes"] += len(data)
+        return data
+
+
+def _find_image(reference, search_dirs, prefer_dirs=False):
+    candidates = [os.path.join(directory, reference) for directory in search_dirs]
+    candidates.insert(len(candidates) if prefer_dirs else 0, reference)
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def resolve_inline_images(html, search_dirs=()):
+    """Find the images the HTML actually shows and point them at inline parts.
+
+    ``cid:<name>`` references are looked up as files in ``search_dirs``; local
+    file paths (such as the src='{path}' written by save_newsletter_to_file)
+    are rewritten to ``cid:`` references. Remote and data: URLs are left
+    alone. Returns the rewritten HTML and the (path, cid) pairs to attach.
+    """
+    cids = {}
+    used = set()
+
+    def cid_for(path):
+        key = os.path.abspath(path)
+        if key not in cids:
+            cid = os.path.basename(path)
+            n = 1
+            while cid in used:
+                n += 1
+                cid = f"{n}_{os.path.basename(path)}"
+            used.add(cid)
+            cids[key] = (path, cid)
+        return cids[key][1]
+
+    def replace(match):
+        prefix, quote, src = match.groups()
+        reference = src.strip()
+        if reference.lower().startswith("cid:"):
+            path = _find_image(reference[4:], search_dirs, prefer_dirs=True)
+            if path is None:
+                print(f"Warning: no image found for {reference}")
+                return match.group(0)
+            name = reference[4:]
+            if os.path.abspath(path) not in cids and name == os.path.basename(path) and name not in used:
+                # Keep the Content-ID the HTML already uses
+                cids[os.path.abspath(path)] = (path, name)
+                used.add(name)
+            return f"{prefix}{quote}cid:{cid_for(path)}{quote}"
+        if re.match(r"^([a-z][a-z0-9+.-]*:|//)", reference, re.IGNORECASE) and not reference.lower().startswith("file://"):
+            return match.group(0)
+        path = _find_image(reference[7:] if reference.lower().startswith("file://") else reference, search_dirs)
+        if path is None:
+            return match.group(0)
+        return f"{prefix}{quote}cid:{cid_for(path)}{quote}"
+
+    html = SRC_ATTRIBUTE_RE.sub(replace, html)
+    return html, list(cids.values())
+
+
+def print_attachment_savings(attached, candidates):
+    """Report the bytes saved by attaching only the referenced images instead of every candidate file."""
+    attached_paths = {os.path.abspath(path) for path, _ in attached}
+    skipped = [path for path in candidates if os.path.abspath(path) not in attached_paths]
+    saved = sum(os.path.getsize(path) for path in skipped if os.path.isfile(path))
+    print(f"Inline images: {len(attached)} referenced, {len(skipped)} unreferenced skipped "
+          f"({saved / 1024:.0f} KB saved per message)")
+
+
+def print_assembly_stats():
+    """Print how many MIME parts were encoded versus reused from the cache."""
+    with _cache_lock:
+        stats = dict(_stats)
+    if not stats["messages"]:
+        return
+    print(f"MIME assembly: {stats['messages']} messages ({stats['message_bytes'] / 1024:.0f} KB), "
+          f"{stats['encoded']} parts encoded ({stats['encoded_bytes'] / 1024:.0f} KB), {stats['reused']} reused")
@@ -0,0 +1,201 @@
+import os
+from html import escape
+from string import Template
+from datetime import datetime
+
+from instrumentation import span
+from story_schema import NewsletterCopy, StoryBlurb
+
+# Templates are compiled once at import; rendering is plain string substitution.
+# Styles are inline so the HTML survives email clients that strip <style> blocks.
+PAGE_HEAD_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>$subject</title>
+</head>
+<body style="margin: 0; padding: 0; background-color: #fafafa; font-family: Arial, sans-serif; color: #333;">
+<div style="width: 100%; max-width: 600px; margin: auto; background-color: #fff; border-radius: 8px; overflow: hidden; box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);">
+<div style="background-color: #E1306C; padding: 20px; text-align: center; color: #fff;">
+<h1 style="margin: 0;">Instagram Highlights</h1>
+<p style="margin: 8px 0 0;">$tagline</p>
+</div>
+<div style="padding: 20px;">
+<p>Hello $recipient_name,</p>
+<p>$intro</p>
+""")
+
+PAGE_FOOT_TEMPLATE = Template("""<p>$sign_off</p>
+</div>
+<div style="background-color: #F1F1F1; text-align: center; padding: 10px; font-size: 14px;">
+<p>Thanks for catching up with us! More stories next week!</p>
+</div>
+</div>
+""")
+
+PAGE_END = """</body>
+</html>
+"""
+
+SECTION_OPEN_TEMPLATE = Template("""<div style="margin-bottom: 20px;" id="$section_id">
+<h2 style="color: $color; margin-bottom: 10px;">$title</h2>
+<p>$intro</p>
+""")
+
+SECTION_CLOSE = """</div>
+"""
+
+STORY_TEMPLATE = Template("""<div style="margin-bottom: 10px;">
+$image<p style="margin: 8px 0;"><strong>$account_name</strong> $blurb</p>
+</div>
+""")
+
+STORY_IMAGE_TEMPLATE = Template("""<img src="$src" alt="$alt" style="width: 100%; border-radius: 8px;">
+""")
+
+GALLERY_TEMPLATE = Template("""
+<!-- Instagram Story Images -->
+<div style='margin-top: 30px; border-top: 1px solid #ccc; padding-top: 20px;'>
+<h2 style='text-align: center; color: #ff5722;'>Original Instagram Stories</h2>
+$groups</div>
+""")
+
+GALLERY_GROUP_TEMPLATE = Template("""<h3 style='margin-top: 25px; text-align: center; color: $color;'>$title</h3>
+<div style='display: flex; flex-wrap: wrap; justify-content: center; gap: 20px;'>
+$items</div>
+""")
+
+GALLERY_ITEM_TEMPLATE = Template("""<div style='max-width: 300px; text-align: center;'>
+<img src='$src' style='max-width: 100%; border-radius: 8px; border: 1px solid #ddd;'>
+<p style='margin-top: 5px; font-weight: bold;'>$account_name</p>
+</div>
+""")
+
+# (section id, heading, heading colour) per account group
+SECTIONS = {
+    "friends": ("friends-updates", "Friends Updates", "#3897f0"),
+    "influencers": ("influencer-highlights", "Influencer Highlights", "#E1306C"),
+    "other": ("other-stories", "Other Stories", "#999"),
+}
+
+GALLERY_GROUPS = {
+    "friends": ("✨ Friend Stories ✨", "#3897f0"),
+    "influencers": ("🔥 Influencer Content 🔥", "#e1306c"),
+    "other": ("Other Stories", "#999"),
+}
+
+# Known accounts for the bundled story_sample_*.png files, used when no analysis covers them
+SAMPLE_ACCOUNTS = {
+    "story_sample_1.png": ("friend", "maria.nashef"),
+    "story_sample_2.png": ("influencer", "elite.champaign"),
+    "story_sample_3.png": ("influencer", "ksi"),
+    "story_sample_4.png": ("friend", "ladypary_"),
+    "story_sample_5.png": ("friend", "ladypary_"),
+    "story_sample_6.png": ("friend", "ladypary_"),
+}
+
+
+def account_group(account_type):
+    """Map an account_type from the analysis to "friends", "influencers" or "other"."""
+    account_type = (account_type or "").lower()
+    if account_type in ("friend", "personal"):
+        return "friends"
+    if account_type in ("influencer", "brand"):
+        return "influencers"
+    return "other"
+
+
+def default_copy(report, stories):
+    """Plain copy built from the analysis, for when no model-written copy is available."""
+    themes = ", ".join(report.overall_themes[:3])
+    return NewsletterCopy(
+        subject="Your Instagram Digest for " + datetime.now().strftime("%Y-%m-%d"),
+        tagline="Your latest updates from friends and favorite accounts",
+        intro="Here are the highlights from the stories you may have missed" + (f": {themes}." if themes else "."),
+        friends_intro="What your friends have been sharing.",
+        influencers_intro="Highlights from creators and brands you follow.",
+        story_blurbs=[StoryBlurb(index=story.index, blurb=story.description) for story in stories],
+        sign_off="See you next time!",
+    )
+
+
+def render_page_head(subject, tagline, recipient_name, intro):
+    return PAGE_HEAD_TEMPLATE.substitute(
+        subject=escape(subject), tagline=escape(tagline),
+        recipient_name=escape(recipient_name), intro=escape(intro),
+    )
+
+
+def render_page_foot(sign_off):
+    return PAGE_FOOT_TEMPLATE.substitute(sign_off=escape(sign_off))
+
+
+def render_section_open(group, intro=""):
+    section_id, title, color = SECTIONS[group]
+    return SECTION_OPEN_TEMPLATE.substitute(section_id=section_id, title=title, color=color, intro=escape(intro))
+
+
+def render_story(story, blurb, image_path=None):
+    image = ""
+    if image_path:
+        image = STORY_IMAGE_TEMPLATE.substitute(src=escape(image_path), alt=escape(f"{story.account_name}'s story"))
+    return STORY_TEMPLATE.substitute(image=image, account_name=escape(story.account_name), blurb=escape(blurb))
+
+
+def render_newsletter(copy, report, recipient_name="Subscriber", featured=None, image_paths=None):
+    """Render the newsletter HTML from model-written ``copy`` and the analysis ``report``.
+
+    ``featured`` lists the story indexes to include (all stories by default);
+    ``image_paths`` maps story indexes to image files to show next to each story.
+    """
+    with span("render", stories=len(report.stories)) as record:
+        blurbs = {blurb.index: blurb.blurb for blurb in copy.story_blurbs}
+        stories = [s for s in report.stories if featured is None or s.index in featured]
+        section_intros = {"friends": copy.friends_intro, "influencers": copy.influencers_intro, "other": ""}
+
+        parts = [render_page_head(copy.subject, copy.tagline, recipient_name, copy.intro)]
+        for group in SECTIONS:
+            group_stories = [s for s in stories if account_group(s.account_type) == group]
+            if not group_stories:
+                continue
+            parts.append(render_section_open(group, section_intros[group]))
+            parts.extend(
+                render_story(s, blurbs.get(s.index, s.description), (image_paths or {}).get(s.index))
+                for s in group_stories
+            )
+            parts.append(SECTION_CLOSE)
+        parts.append(render_page_foot(copy.sign_off))
+        parts.append(PAGE_END)
+        html = "".join(parts)
+        record["bytes"] = len(html)
+        return html
+
+
+def render_gallery(screenshots, report=None):
+    """Render the "Original Instagram Stories" gallery, grouped by account type."""
+    classified = report.by_filename() if report else {}
+    groups = {group: [] for group in GALLERY_GROUPS}
+
+    for img_path in screenshots:
+        img_filename = os.path.basename(img_path)
+        account_type, account_name = "unknown", "Unknown"
+        if img_filename in classified:
+            account_type = classified[img_filename].account_type
+            account_name = classified[img_filename].account_name
+        elif "_story_" in img_filename:
+            account_name = img_filename.split("_story_")[0]
+        if account_group(account_type) == "other" and img_filename in SAMPLE_ACCOUNTS:
+            account_type, sample_name = SAMPLE_ACCOUNTS[img_filename]
+            if account_name == "Unknown":
+                account_name = sample_name
+        groups[account_group(account_type)].append(
+            GALLERY_ITEM_TEMPLATE.substitute(src=escape(img_path), account_name=escape(account_name))
+        )
+
+    rendered = "".join(
+        GALLERY_GROUP_TEMPLATE.substitute(title=GALLERY_GROUPS[group][0], color=GALLERY_GROUPS[group][1],
+                                          items="".join(items))
+        for group, items in groups.items() if items
+    )
+    return GALLERY_TEMPLATE.substitute(groups=rendered)
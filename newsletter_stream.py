@@ -0,0 +1,223 @@
+import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import span
+from llm_gateway import get_llm_gateway
+from story_schema import coerce_report, analysis_to_text, StoryAnalysisReport
+from newsletter_renderer import (
+    PAGE_END,
+    SECTION_CLOSE,
+    SECTIONS,
+    account_group,
+    default_copy,
+    render_gallery,
+    render_page_foot,
+    render_page_head,
+    render_section_open,
+    render_story,
+)
+
+NEWSLETTER_STREAM_MODEL = "gpt-4o"
+
+# Each part of the streamed copy starts with a marker line such as "@@INTRO" or "@@STORY 3"
+MARKER_RE = re.compile(r"^@@([A-Z]+)(?:\s+(\d+))?\s*$")
+
+GROUP_MARKERS = {"FRIENDS": "friends", "INFLUENCERS": "influencers", "OTHER": "other"}
+
+STREAM_SYSTEM_PROMPT = """You write copy for an Instagram story newsletter that separates friends from influencers/brands.
+Write plain text (no HTML or markdown) in parts. Start each part with a marker line on its own, followed by the part's text:
+@@SUBJECT - a catchy subject line
+@@TAGLINE - a one-line tagline
+@@INTRO - a short personalized intro
+Then, for each section in the order given: @@FRIENDS, @@INFLUENCERS or @@OTHER followed by a one-sentence
+section intro, then @@STORY <index> with one or two engaging sentences for each story listed for that section
+(don't repeat the account name, it is shown next to the text).
+Finish with @@SIGNOFF - a friendly sign-off, and a final @@END line."""
+
+
+class SectionParser:
+    """Splits streamed text into (marker, index, text) parts as soon as each part is complete."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._current = None
+
+    def _complete_line(self, line, parts):
+        match = MARKER_RE.match(line.strip())
+        if match:
+            if self._current:
+                parts.append(self._finish_current())
+            index = int(match.group(2)) if match.group(2) else None
+            self._current = [match.group(1), index, []]
+        elif self._current:
+            self._current[2].append(line)
+
+    def _finish_current(self):
+        name, index, lines = self._current
+        self._current = None
+        return name, index, "\n".join(lines).strip()
+
+    def feed(self, text):
+        """Add streamed text; return the parts completed by it."""
+        parts = []
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._complete_line(line, parts)
+        return parts
+
+    def close(self):
+        """Flush whatever is left at the end of the stream."""
+        parts = []
+        if self._buffer:
+            self._complete_line(self._buffer, parts)
+            self._buffer = ""
+        if self._current:
+            parts.append(self._finish_current())
+        return parts
+
+
+class StreamingNewsletterWriter:
+    """Writes newsletter HTML to a file part by part as the streamed copy arrives."""
+
+    def __init__(self, f, report, stories, recipient_name, image_paths=None):
+        self.f = f
+        self.stories = {story.index: story for story in stories}
+        self.recipient_name = recipient_name
+        self.image_paths = image_paths or {}
+        self.defaults = default_copy(report, stories)
+        self.head = {"SUBJECT": self.defaults.subject, "TAGLINE": self.defaults.tagline, "INTRO": self.defaults.intro}
+        self.head_written = False
+        self.open_group = None
+        self.written = set()
+        self.sign_off = self.defaults.sign_off
+        self.bytes_written = 0
+
+    def _write(self, text):
+        self.f.write(text)
+        self.f.flush()
+        self.bytes_written += len(text.encode("utf-8"))
+
+    def _write_head(self):
+        if not self.head_written:
+            self._write(render_page_head(self.head["SUBJECT"], self.head["TAGLINE"],
+                                         self.recipient_name, self.head["INTRO"]))
+            self.head_written = True
+
+    def _open_section(self, group, intro):
+        self._write_head()
+        if self.open_group:
+            self._write(SECTION_CLOSE)
+        self._write(render_section_open(group, intro))
+        self.open_group = group
+
+    def _write_story(self, story, blurb):
+        group = account_group(story.account_type)
+        if self.open_group != group:
+            self._open_section(group, "")
+        self._write(render_story(story, blurb, self.image_paths.get(story.index)))
+        self.written.add(story.index)
+
+    def handle(self, name, index, text):
+        """Write one completed part; return a progress event, or None if nothing was written."""
+        if name in self.head:
+            self.head[name] = text or self.head[name]
+            if name != "INTRO":
+                return None
+            self._write_head()
+            return {"part": "head", "subject": self.head["SUBJECT"]}
+        if name in GROUP_MARKERS:
+            self._open_section(GROUP_MARKERS[name], text)
+            return {"part": "section", "group": GROUP_MARKERS[name]}
+        if name == "STORY" and index in self.stories and index not in self.written:
+            self._write_story(self.stories[index], text or self.stories[index].description)
+            return {"part": "story", "index": index}
+        if name == "SIGNOFF":
+            self.sign_off = text or self.sign_off
+        return None
+
+    def finish(self, screenshots=None, report=None):
+        """Write any stories the model skipped, the footer and the gallery, and close the page."""
+        self._write_head()
+        for group in SECTIONS:
+            for story in self.stories.values():
+                if story.index not in self.written and account_group(story.account_type) == group:
+                    self._write_story(story, story.description)
+        if self.open_group:
+            self._write(SECTION_CLOSE)
+        self._write(render_page_foot(self.sign_off))
+        if screenshots:
+            self._write(render_gallery(screenshots, report))
+        self._write(PAGE_END)
+
+
+async def stream_newsletter(analysis, filename, recipient_name="Subscriber", top_stories=3,
+                            screenshots=None, image_paths=None):
+    """Generate the newsletter with a streamed completion, writing the HTML file as parts arrive.
+
+    An async iterator of progress events (dicts with ``part``, ``elapsed`` and
+    ``bytes``); the last one has ``part == "done"`` with the subject and filename.
+    If the stream fails part-way, the remaining parts are filled in from the
+    analysis so the file is always a complete page.
+    """
+    report = coerce_report(analysis)
+    stories = report.top_stories(top_stories)
+    groups = {}
+    for story in stories:
+        groups.setdefault(account_group(story.account_type), []).append(story.index)
+    order = "\n".join(f"{marker}: stories {', '.join(str(i) for i in groups[group])}"
+                      for marker, group in GROUP_MARKERS.items() if group in groups)
+    messages = [
+        {"role": "system", "content": STREAM_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Newsletter for {recipient_name}. Overall themes: {', '.join(report.overall_themes)}.\n"
+                                    f"Sections in order:\n{order}\n\n"
+                                    f"Stories:\n{analysis_to_text(StoryAnalysisReport(stories=stories))}"},
+    ]
+
+    started = time.perf_counter()
+    gateway = get_llm_gateway()
+    parser = SectionParser()
+    with open(filename, "w", encoding="utf-8") as f:
+        writer = StreamingNewsletterWriter(f, report, stories, recipient_name, image_paths)
+        try:
+            async for delta in gateway.astream(model=NEWSLETTER_STREAM_MODEL, messages=messages, max_tokens=700):
+                for part in parser.feed(delta):
+                    event = writer.handle(*part)
+                    if event:
+                        event.update(elapsed=time.perf_counter() - started, bytes=writer.bytes_written)
+                        yield event
+            for part in parser.close():
+                writer.handle(*part)
+        except Exception as e:
+            print(f"Newsletter stream failed, completing it from the analysis: {e}")
+        finally:
+            await gateway.aclose()
+
+        writer.finish(screenshots, report)
+
+    yield {"part": "done", "subject": writer.head["SUBJECT"], "filename": filename,
+           "elapsed": time.perf_counter() - started, "bytes": writer.bytes_written}
+
+
+def write_newsletter_streaming(analysis, filename, recipient_name="Subscriber", top_stories=3,
+                               screenshots=None, image_paths=None):
+    """Blocking wrapper around stream_newsletter that prints progress; returns the final event."""
+
+    async def consume():
+        last = None
+        async for event in stream_newsletter(analysis, filename, recipient_name, top_stories,
+                                             screenshots, image_paths):
+            if "index" in event:
+                label = f"story {event['index']}"
+            else:
+                label = event.get("group") or event.get("subject") or ""
+            print(f"[{event['elapsed']:.1f}s] {event['part']} {label} ({event['bytes']} bytes written)")
+            last = event
+        return last
+
+    with span("render", streaming=True) as record, ThreadPoolExecutor(max_workers=1) as executor:
+        last = executor.submit(asyncio.run, consume()).result()
+        record["bytes"] = last["bytes"] if last else 0
+        return last
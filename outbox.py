@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__":
+    # Run as a script: load .env before the settings below and in smtp_pool are read
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from mime_assembly import NewsletterMessage
+from smtp_pool import get_smtp_pool, is_transient_error, smtp_settings
+
+# "outbox" queues finished newsletters for the background sender; "direct" sends before returning
+EMAIL_DELIVERY_MODE = os.getenv("EMAIL_DELIVERY_MODE", "outbox").lower()
+
+# SQLite file holding queued emails (can be overridden in .env)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", ".outbox.sqlite3")
+
+# A message is dead-lettered after this many failed delivery attempts
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+
+# Delay before the first retry, doubled after each failure (seconds, capped at an hour)
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETRY_MAX_SECONDS = 3600
+
+# How often the background sender looks for due messages when idle (seconds)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+
+# A message still marked as being sent after this long was claimed by a process that died, and is
+# sent again; keep it above SMTP_TIMEOUT times the SMTP retries (seconds)
+OUTBOX_CLAIM_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_CLAIM_TIMEOUT_SECONDS", "600"))
+
+# How long the process waits at exit for queued messages to go out (seconds); the rest stay queued
+OUTBOX_EXIT_WAIT_SECONDS = float(os.getenv("OUTBOX_EXIT_WAIT_SECONDS", "30"))
+
+
+class Outbox:
+    """Durable queue of outgoing emails in SQLite.
+
+    Each row is one recipient's message, stored as its parts (headers, HTML
+    and file paths for inline images and attachments) rather than encoded
+    bytes. Rows move from "pending" to "sent", or to "dead" once they fail
+    permanently or run out of attempts.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " sender TEXT NOT NULL,"
+            " recipient TEXT NOT NULL,"
+            " subject TEXT NOT NULL,"
+            " html TEXT NOT NULL,"
+            " inline_images TEXT NOT NULL,"
+            " attachments TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " sent_at REAL,"
+            " last_error TEXT,"
+            " claimed_at REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")]
+        if "claimed_at" not in columns:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.commit()
+        self.wakeup = threading.Event()
+
+    def enqueue(self, sender, recipients, subject, html, inline_images=(), attachments=()):
+        """Queue one message per recipient; returns the new row ids."""
+        now = time.time()
+        # Absolute paths, so `python outbox.py` can deliver from any directory
+        images = json.dumps([[os.path.abspath(image[0]), image[1]] if isinstance(image, tuple)
+                             else [os.path.abspath(image), None] for image in inline_images])
+        attachments = [os.path.abspath(path) for path in attachments]
+        ids = []
+        with self._lock:
+            for recipient in recipients:
+                cursor = self._conn.execute(
+                    "INSERT INTO outbox (created_at, sender, recipient, subject, html, inline_images,"
+                    " attachments, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now, sender, recipient, subject, html, images, json.dumps(attachments), now),
+                )
+                ids.append(cursor.lastrowid)
+            self._conn.commit()
+        self.wakeup.set()
+        print(f"Queued {len(ids)} email(s) in the outbox")
+        return ids
+
+    def claim_due(self, limit):
+        """Mark up to ``limit`` due messages as being sent and return them."""
+        now = time.time()
+        with self._lock:
+            # Write-lock the file first so another process can't claim the same rows in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            # Messages claimed by a sender that never finished (process killed) go back in the queue;
+            # recent claims may belong to another process that is still sending them
+            self._conn.execute(
+                "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+                " AND (claimed_at IS NULL OR claimed_at < ?)", (now - OUTBOX_CLAIM_TIMEOUT_SECONDS,))
+            rows = self._conn.execute(
+                "SELECT id, sender, recipient, subject, html, inline_images, attachments, attempts FROM outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._conn.executemany("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                                   [(now, row[0]) for row in rows])
+            self._conn.commit()
+        return rows
+
+    def mark_sent(self, message_id):
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1,"
+                               " last_error = NULL WHERE id = ?", (time.time(), message_id))
+            self._conn.commit()
+
+    def mark_failed(self, message_id, attempts, error, retryable=True):
+        """Schedule a retry with exponential backoff, or dead-letter the message."""
+        attempts += 1
+        if retryable and attempts < self.max_attempts:
+            delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            status, next_attempt_at = "pending", time.time() + delay
+        else:
+            status, next_attempt_at = "dead", time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, str(error)[:1000], message_id),
+            )
+            self._conn.commit()
+        return status
+
+    def release(self, message_id):
+        """Put a claimed message back in the queue without counting an attempt."""
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = 'pending' WHERE id = ?", (message_id,))
+            self._conn.commit()
+
+    def retry_dead(self):
+        """Put dead-lettered messages back in the queue; returns how many."""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'",
+                (time.time(),),
+            ).rowcount
+            self._conn.commit()
+        self.wakeup.set()
+        return count
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    def has_due(self):
+        """True while messages are being sent or are waiting for their first attempt."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = 'sending'"
+                " OR (status = 'pending' AND next_attempt_at <= ?)", (time.time(),)
+            ).fetchone()
+        return row[0] > 0
+
+    def print_stats(self):
+        counts = self.counts()
+        if counts:
+            print("Outbox: " + ", ".join(f"{counts.get(status, 0)} {status}"
+                                         for status in ("pending", "sending", "sent", "dead")))
+
+
+class OutboxCredentialsError(RuntimeError):
+    """The SMTP login is missing or rejected; retrying or dead-lettering messages won't help."""
+
+
+def _is_credentials_error(error):
+    # 530: authentication required, 534/535: credentials rejected
+    return isinstance(error, smtplib.SMTPAuthenticationError) or (
+        isinstance(error, smtplib.SMTPResponseException) and error.smtp_code in (530, 534, 535))
+
+
+def _deliver(row):
+    """Build and send one queued message; returns None or the error."""
+    message_id, sender, recipient, subject, html, inline_images, attachments, attempts = row
+    try:
+        images = [tuple(image) if image[1] else image[0] for image in json.loads(inline_images)]
+        message = NewsletterMessage(images, json.loads(attachments), verbose=False)
+        get_smtp_pool(sender).send(message.build(sender, recipient, subject, html), sender, [recipient])
+        return None
+    except Exception as e:
+        return e
+
+
+class OutboxSender(threading.Thread):
+    """Background thread that drains the outbox through the SMTP pool."""
+
+    def __init__(self, outbox, batch_size=None):
+        super().__init__(name="outbox-sender", daemon=True)
+        self.outbox = outbox
+        self.batch_size = batch_size or smtp_settings()["size"]
+        self.error = None
+        self._stopping = threading.Event()
+
+    def _fail(self, error):
+        """Stop sending, leaving the queue as it is, because of a configuration problem."""
+        self.error = error
+        self._stopping.set()
+        print(f"Outbox: ERROR: {error}. Queued emails are kept; fix the SMTP login in .env "
+              f"and run `python outbox.py` to send them.")
+
+    def run(self):
+        if not os.getenv("EMAIL_PASS"):
+            self._fail(OutboxCredentialsError("EMAIL_PASS is not set"))
+            return
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            while not self._stopping.is_set():
+                rows = self.outbox.claim_due(self.batch_size)
+                if not rows:
+                    self.outbox.wakeup.wait(OUTBOX_POLL_SECONDS)
+                    self.outbox.wakeup.clear()
+                    continue
+                for row, error in zip(rows, executor.map(_deliver, rows)):
+                    if error is None:
+                        self.outbox.mark_sent(row[0])
+                        print(f"Outbox: sent email to {row[2]}")
+                        continue
+                    if _is_credentials_error(error):
+                        self.outbox.release(row[0])
+                        if not self.error:
+                            self._fail(OutboxCredentialsError(f"SMTP login rejected: {error}"))
+                        continue
+                    status = self.outbox.mark_failed(row[0], row[7], error, is_transient_error(error))
+                    print(f"Outbox: sending to {row[2]} failed ({error}); "
+                          f"{'dead-lettered' if status == 'dead' else 'will retry'}")
+
+    def stop(self):
+        self._stopping.set()
+        self.outbox.wakeup.set()
+
+
+_outbox = None
+_sender = None
+_registered_exit_wait = False
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Return the process-wide outbox, opening it on first use."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+
+def start_outbox_sender():
+    """Start the background sender if it isn't running yet."""
+    global _sender, _registered_exit_wait
+    outbox = get_outbox()
+    with _outbox_lock:
+        # A sender stopped by a configuration error stays stopped rather than failing again
+        if _sender is None or not (_sender.is_alive() or _sender.error):
+            _sender = OutboxSender(outbox)
+            _sender.start()
+            if not _registered_exit_wait:
+                atexit.register(wait_for_outbox, OUTBOX_EXIT_WAIT_SECONDS)
+                _registered_exit_wait = True
+        return _sender
+
+
+def wait_for_outbox(timeout=None):
+    """Wait until no queued message is due (later retries don't count); returns True if drained."""
+    outbox = get_outbox()
+    sender = start_outbox_sender()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while outbox.has_due():
+        if sender.error:
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            print("Outbox: some emails are still queued and will be sent on the next run")
+            return False
+        time.sleep(0.2)
+    return True
+
+
+def queue_newsletter(sender, recipients, subject, html, inline_images=(), attachments=()):
+    """Queue a newsletter for background delivery and make sure the sender is running."""
+    ids = get_outbox().enqueue(sender, recipients, subject, html, inline_images, attachments)
+    start_outbox_sender()
+    return ids
+
+
+if __name__ == "__main__":
+    # python outbox.py [--retry-dead] : deliver whatever is queued, then print the outbox state
+    outbox = get_outbox()
+    if "--retry-dead" in sys.argv:
+        print(f"Requeued {outbox.retry_dead()} dead-lettered email(s)")
+    delivered = wait_for_outbox()
+    outbox.print_stats()
+    sys.exit(0 if delivered else 1)
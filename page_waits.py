@@ -0,0 +1,307 @@
+import time
+
+# Deadlines (milliseconds) for each readiness step. A step that misses its
+# deadline returns a falsy value instead of raising, so callers can fall back.
+STEP_DEADLINES_MS = {
+    "page_ready": 10000,
+    "login_form": 10000,
+    "login_complete": 15000,
+    "story_tray": 8000,
+    "story_entry": 8000,
+    "story_view": 8000,
+    "story_media": 6000,
+    "story_advance": 5000,
+    "dom_settled": 3000,
+}
+
+# How long the DOM must stay free of mutations to count as settled
+DOM_QUIET_MS = 300
+
+# After the story media response misses its deadline, how long to look for viewer controls instead
+STORY_VIEW_FALLBACK_MS = 1000
+
+# Elements that only exist while the story viewer is open
+STORY_VIEW_INDICATORS = [
+    "[aria-label='Pause']",
+    "button[aria-label='Next']",
+    "button[aria-label='Previous']",
+    ".x1i10hfl.xjqpnuy",
+    "._aa8j",
+    "video",
+]
+
+# "View story" interstitial shown when opening /stories/<username>/ directly
+VIEW_STORY_SELECTORS = [
+    "text=View story",
+    "button:has-text('View story')",
+    ".x1i10hfl:has-text('View story')",
+    "[role='button']:has-text('View story')",
+    "//div[contains(text(), 'View story')]",
+    "//button[contains(text(), 'View story')]",
+]
+
+# Resolves once no DOM mutation has happened for quietMs, or false at deadlineMs
+DOM_SETTLED_JS = """
+([quietMs, deadlineMs]) => new Promise(resolve => {
+    let timer;
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs, true);
+    });
+    const deadline = setTimeout(done, deadlineMs, false);
+    function done(settled) {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(deadline);
+        resolve(settled);
+    }
+    observer.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    timer = setTimeout(done, quietMs, true);
+})
+"""
+
+# Returns the src of the largest visible story image/video once it has loaded
+# (and differs from previousSrc when advancing), otherwise false
+STORY_MEDIA_READY_JS = """
+(previousSrc) => {
+    const candidates = [...document.querySelectorAll('video, img')].filter(el => {
+        const r = el.getBoundingClientRect();
+        return r.width >= 200 && r.height >= 300 && r.bottom > 0 && r.top < window.innerHeight;
+    });
+    if (!candidates.length) return false;
+    const area = el => { const r = el.getBoundingClientRect(); return r.width * r.height; };
+    const media = candidates.sort((a, b) => area(b) - area(a))[0];
+    const src = media.currentSrc || media.src;
+    if (!src || (previousSrc && src === previousSrc)) return false;
+    const ready = media.tagName === 'VIDEO'
+        ? media.readyState >= 2
+        : (media.complete && media.naturalWidth > 0);
+    return ready ? src : false;
+}
+"""
+
+_wait_timings = []
+
+
+def _deadline_ms(step, deadline_ms):
+    if deadline_ms is not None:
+        return deadline_ms
+    return STEP_DEADLINES_MS.get(step, 5000)
+
+
+def record_wait(step, started, ok, signal=None):
+    """Record how long a readiness wait took and whether its signal arrived."""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _wait_timings.append({
+        "step": step,
+        "elapsed_ms": round(elapsed_ms, 1),
+        "ok": bool(ok),
+        "signal": signal,
+    })
+    return elapsed_ms
+
+
+def get_wait_timings():
+    """Return the recorded waits for this process."""
+    return list(_wait_timings)
+
+
+def reset_wait_timings():
+    """Forget all recorded waits."""
+    _wait_timings.clear()
+
+
+def print_wait_summary():
+    """Print total and worst wait time per step."""
+    if not _wait_timings:
+        return
+    print("\n--- Page Wait Summary ---")
+    steps = {}
+    for timing in _wait_timings:
+        steps.setdefault(timing["step"], []).append(timing)
+    for step, timings in steps.items():
+        total = sum(t["elapsed_ms"] for t in timings)
+        worst = max(t["elapsed_ms"] for t in timings)
+        missed = sum(1 for t in timings if not t["ok"])
+        print(f"{step}: {len(timings)} waits, {total:.0f} ms total, {worst:.0f} ms worst, {missed} missed deadline")
+
+
+def is_story_media_response(response):
+    """True for CDN responses carrying story images or videos (not profile pictures)."""
+    try:
+        if response.request.resource_type not in ("image", "media"):
+            return False
+    except Exception:
+        return False
+    url = response.url
+    if "cdninstagram.com" not in url and "fbcdn.net" not in url:
+        return False
+    # t51.2885-19 is the profile picture path
+    return "t51.2885-19" not in url and response.status in (200, 206)
+
+
+def any_selector_locator(page, selectors):
+    """A locator for the first element matching any of ``selectors``.
+
+    Selectors may mix CSS, Playwright ``text=``/``:has-text()`` and XPath;
+    Locator.or_ combines them so one wait covers all of them.
+    """
+    locator = page.locator(selectors[0])
+    for selector in selectors[1:]:
+        locator = locator.or_(page.locator(selector))
+    return locator.first
+
+
+def _matched_selector(page, selectors):
+    for selector in selectors:
+        try:
+            if page.query_selector(selector):
+                return selector
+        except Exception:
+            pass
+    return None
+
+
+async def _async_matched_selector(page, selectors):
+    for selector in selectors:
+        try:
+            if await page.query_selector(selector):
+                return selector
+        except Exception:
+            pass
+    return None
+
+
+def wait_for_any_selector(page, selectors, step="selector", deadline_ms=None):
+    """Wait until one of ``selectors`` is present; return it, or None at the deadline."""
+    started = time.perf_counter()
+    selector = None
+    try:
+        any_selector_locator(page, selectors).wait_for(state="attached", timeout=_deadline_ms(step, deadline_ms))
+        selector = _matched_selector(page, selectors)
+    except Exception:
+        pass
+    record_wait(step, started, selector, selector)
+    return selector
+
+
+async def async_wait_for_any_selector(page, selectors, step="selector", deadline_ms=None):
+    """Async API version of wait_for_any_selector."""
+    started = time.perf_counter()
+    selector = None
+    try:
+        await any_selector_locator(page, selectors).wait_for(state="attached",
+                                                             timeout=_deadline_ms(step, deadline_ms))
+        selector = await _async_matched_selector(page, selectors)
+    except Exception:
+        pass
+    record_wait(step, started, selector, selector)
+    return selector
+
+
+def _dom_settled(page, quiet_ms, deadline_ms):
+    try:
+        return page.evaluate(DOM_SETTLED_JS, [quiet_ms, deadline_ms])
+    except Exception:
+        return False
+
+
+def wait_for_dom_settled(page, step="dom_settled", quiet_ms=DOM_QUIET_MS, deadline_ms=None):
+    """Wait until the DOM stops mutating for ``quiet_ms``; return False at the deadline."""
+    started = time.perf_counter()
+    settled = _dom_settled(page, quiet_ms, _deadline_ms(step, deadline_ms))
+    record_wait(step, started, settled)
+    return settled
+
+
+def wait_for_page_ready(page, step="page_ready", deadline_ms=None):
+    """Wait for DOMContentLoaded and then for the DOM to settle.
+
+    Replaces ``networkidle`` plus a fixed sleep; Instagram keeps long-polling
+    connections open, so networkidle rarely reflects when the UI is usable.
+    """
+    started = time.perf_counter()
+    timeout = _deadline_ms(step, deadline_ms)
+    try:
+        page.wait_for_load_state("domcontentloaded", timeout=timeout)
+    except Exception:
+        record_wait(step, started, False)
+        return False
+    remaining = max(timeout - (time.perf_counter() - started) * 1000, DOM_QUIET_MS)
+    settled = _dom_settled(page, DOM_QUIET_MS, remaining)
+    record_wait(step, started, settled)
+    return settled
+
+
+def wait_for_story_media(page, previous_src=None, step="story_media", deadline_ms=None):
+    """Wait until the story's main image/video has loaded; return its src, or None.
+
+    Pass the ``previous_src`` when advancing so the wait ends on the next story's
+    media rather than the one already on screen.
+    """
+    started = time.perf_counter()
+    try:
+        handle = page.wait_for_function(
+            STORY_MEDIA_READY_JS, arg=previous_src, timeout=_deadline_ms(step, deadline_ms)
+        )
+        src = handle.json_value()
+    except Exception:
+        src = None
+    record_wait(step, started, src)
+    return src
+
+
+async def async_wait_for_story_media(page, previous_src=None, step="story_media", deadline_ms=None):
+    """Async API version of wait_for_story_media."""
+    started = time.perf_counter()
+    try:
+        handle = await page.wait_for_function(
+            STORY_MEDIA_READY_JS, arg=previous_src, timeout=_deadline_ms(step, deadline_ms)
+        )
+        src = await handle.json_value()
+    except Exception:
+        src = None
+    record_wait(step, started, src)
+    return src
+
+
+def expect_story_media_response(page, trigger=None, step="story_media", deadline_ms=None):
+    """Run ``trigger`` and wait for the network response carrying story media."""
+    started = time.perf_counter()
+    try:
+        with page.expect_response(is_story_media_response, timeout=_deadline_ms(step, deadline_ms)) as info:
+            if trigger:
+                trigger()
+        response = info.value
+    except Exception:
+        response = None
+    record_wait(step, started, response, response.url if response else None)
+    return response
+
+
+async def async_expect_story_media_response(page, trigger=None, step="story_media", deadline_ms=None):
+    """Async API version of expect_story_media_response; ``trigger`` returns an awaitable."""
+    started = time.perf_counter()
+    try:
+        async with page.expect_response(is_story_media_response,
+                                        timeout=_deadline_ms(step, deadline_ms)) as info:
+            if trigger:
+                await trigger()
+        response = await info.value
+    except Exception:
+        response = None
+    record_wait(step, started, response, response.url if response else None)
+    return response
+
+
+def wait_for_story_open(page, trigger, step="story_view"):
+    """Run ``trigger`` (the click that opens the story viewer) and wait for the viewer to open.
+
+    The story's media response is the signal; viewer controls are checked
+    afterwards for media that isn't served from the CDN. Returns True if open.
+    """
+    if expect_story_media_response(page, trigger, step=step):
+        return True
+    return wait_for_any_selector(page, STORY_VIEW_INDICATORS, step=step, deadline_ms=STORY_VIEW_FALLBACK_MS) is not None
@@ -0,0 +1,229 @@
+import io
+import os
+import time
+import hashlib
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from instrumentation import span
+
+# PDF digest settings (can be overridden in .env)
+PDF_IMAGE_DPI = int(os.getenv("PDF_IMAGE_DPI", "150"))
+PDF_JPEG_QUALITY = int(os.getenv("PDF_JPEG_QUALITY", "80"))
+PDF_IMAGE_WORKERS = int(os.getenv("PDF_IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_USE_PROCESSES = os.getenv("PDF_USE_PROCESSES", "false").lower() in ("true", "1", "yes")
+
+# Digests larger than this are rebuilt at a lower DPI and quality so they still fit in an
+# email; base64 adds a third, so 18 MB stays under the common 25 MB SMTP message limit
+PDF_MAX_ATTACHMENT_MB = float(os.getenv("PDF_MAX_ATTACHMENT_MB", "18"))
+PDF_MAX_REBUILDS = 2
+
+# A4 in points, with a 10 mm margin around each story (as the old FPDF layout had)
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 10 * 72 / 25.4
+IMAGE_BOX = (PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT - 2 * MARGIN)
+
+
+def _flatten(image):
+    """RGB (or greyscale) copy of ``image`` with any transparency composited onto white."""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("L" if image.mode in ("1", "L") else "RGB")
+
+
+def prepare_page_image(image_path, dpi, quality):
+    """Downsample an image to fit the page box at ``dpi`` and encode it as JPEG.
+
+    Returns (width, height, mode, jpeg bytes). JPEGs that already fit are used
+    as they are. Runs in a worker thread or process.
+    """
+    from PIL import Image
+
+    max_size = tuple(int(points / 72 * dpi) for points in IMAGE_BOX)
+    with open(image_path, "rb") as f:
+        original = f.read()
+    with Image.open(io.BytesIO(original)) as image:
+        if (image.format == "JPEG" and image.mode in ("RGB", "L")
+                and image.width <= max_size[0] and image.height <= max_size[1]):
+            return image.width, image.height, image.mode, original
+        image = _flatten(image)
+        image.thumbnail(max_size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return image.width, image.height, image.mode, buffer.getvalue()
+
+
+def _pdf_text(text):
+    text = text.encode("cp1252", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+class StreamingPDFWriter:
+    """Minimal PDF writer that puts each object on disk as soon as it is added.
+
+    Only the object offsets and page references stay in memory, and an image
+    whose JPEG bytes were already written is referenced again instead of
+    being embedded twice.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, file):
+        self.file = file
+        self.offsets = {}
+        self.pages = []
+        self.images = {}
+        self.reused = 0
+        self._fonts = {}
+        self._next_id = 3
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, body, stream=None, object_id=None):
+        if object_id is None:
+            object_id = self._next_id
+            self._next_id += 1
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode("ascii"))
+        if stream is None:
+            self.file.write(body.encode("latin-1") + b"\nendobj\n")
+        else:
+            self.file.write(f"{body[:-2]} /Length {len(stream)} >>\nstream\n".encode("latin-1"))
+            self.file.write(stream + b"\nendstream\nendobj\n")
+        return object_id
+
+    def _font(self, base_font):
+        if base_font not in self._fonts:
+            self._fonts[base_font] = self._write_object(
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>"
+            )
+        return self._fonts[base_font]
+
+    def _add_page(self, content, resources):
+        contents_id = self._write_object("<<>>", content.encode("latin-1"))
+        self.pages.append(self._write_object(
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+            f" /Resources {resources} /Contents {contents_id} 0 R >>"
+        ))
+
+    def add_text_page(self, lines):
+        """A page of (text, font size, bold) lines, top-aligned inside the margin."""
+        fonts = {bold: self._font("Helvetica-Bold" if bold else "Helvetica") for _, _, bold in lines}
+        y = PAGE_HEIGHT - MARGIN
+        commands = []
+        for text, size, bold in lines:
+            y -= size * 1.6
+            commands.append(f"BT /F{int(bold)} {size} Tf {MARGIN:.2f} {y:.2f} Td {_pdf_text(text)} Tj ET")
+        font_refs = " ".join(f"/F{int(bold)} {object_id} 0 R" for bold, object_id in fonts.items())
+        self._add_page("\n".join(commands), f"<< /Font << {font_refs} >> >>")
+
+    def add_image_page(self, width, height, mode, jpeg):
+        """A page with one JPEG scaled to fit the margin box, centred horizontally and top-aligned."""
+        digest = hashlib.sha1(jpeg).digest()
+        if digest in self.images:
+            self.reused += 1
+        else:
+            colorspace = "DeviceGray" if mode == "L" else "DeviceRGB"
+            self.images[digest] = self._write_object(
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /{colorspace}"
+                f" /BitsPerComponent 8 /Filter /DCTDecode >>", jpeg
+            )
+        scale = min(IMAGE_BOX[0] / width, IMAGE_BOX[1] / height)
+        draw_width, draw_height = width * scale, height * scale
+        x = (PAGE_WIDTH - draw_width) / 2
+        y = PAGE_HEIGHT - MARGIN - draw_height
+        self._add_page(f"q {draw_width:.2f} 0 0 {draw_height:.2f} {x:.2f} {y:.2f} cm /Im0 Do Q",
+                       f"<< /XObject << /Im0 {self.images[digest]} 0 R >> >>")
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self._write_object(f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>", object_id=self.PAGES_ID)
+        self._write_object(f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>", object_id=self.CATALOG_ID)
+        xref_offset = self.file.tell()
+        count = self._next_id
+        self.file.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode("ascii"))
+        for object_id in range(1, count):
+            self.file.write(f"{self.offsets[object_id]:010d} 00000 n \n".encode("ascii"))
+        self.file.write(f"trailer\n<< /Size {count} /Root {self.CATALOG_ID} 0 R >>\n"
+                        f"startxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+
+def _prepared_images(executor, paths, dpi, quality, window):
+    """Yield (path, future) in order, keeping at most ``window`` images in flight."""
+    pending = deque()
+    for path in paths:
+        pending.append((path, executor.submit(prepare_page_image, path, dpi, quality)))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def _write_digest(filename, images, title, cover, dpi, quality):
+    """Write one digest; returns (pages with images, reused images)."""
+    executor_class = ProcessPoolExecutor if PDF_USE_PROCESSES else ThreadPoolExecutor
+    unique_paths = list(dict.fromkeys(images))
+    with open(filename, "wb") as f, executor_class(max_workers=PDF_IMAGE_WORKERS) as executor:
+        writer = StreamingPDFWriter(f)
+        if cover:
+            writer.add_text_page([
+                (title, 24, True),
+                (f"Generated on {datetime.now().strftime('%Y-%m-%d')}", 12, False),
+                (f"Contains {len(images)} stories", 12, False),
+            ])
+        prepared = _prepared_images(executor, unique_paths, dpi, quality, PDF_IMAGE_WORKERS * 2)
+        done = {}
+        for image in images:
+            if image not in done:
+                _, future = next(prepared)
+                try:
+                    done[image] = future.result()
+                except Exception as e:
+                    done[image] = None
+                    print(f"Error adding {image} to PDF: {e}")
+            if done[image]:
+                writer.add_image_page(*done[image])
+        writer.close()
+    return len(writer.pages) - int(cover), writer.reused
+
+
+def build_pdf_digest(images, filename="instagram_digest.pdf", title="Instagram Stories Digest", cover=True):
+    """Build a PDF digest with one story image per page; returns the filename.
+
+    Images are downsampled to PDF_IMAGE_DPI and JPEG-encoded in a worker pool
+    while earlier pages are already being written to disk. If the result is
+    over PDF_MAX_ATTACHMENT_MB it is rebuilt at a lower DPI and quality.
+    """
+    dpi, quality = PDF_IMAGE_DPI, PDF_JPEG_QUALITY
+    max_bytes = PDF_MAX_ATTACHMENT_MB * 1024 * 1024
+    with span("pdf_build", pages=len(images)) as record:
+        started = time.perf_counter()
+        partial = filename + ".part"
+        try:
+            for attempt in range(PDF_MAX_REBUILDS + 1):
+                pages, reused = _write_digest(partial, images, title, cover, dpi, quality)
+                size = os.path.getsize(partial)
+                if size <= max_bytes or attempt == PDF_MAX_REBUILDS:
+                    break
+                print(f"PDF digest is {size / 1024 / 1024:.1f} MB at {dpi} DPI, "
+                      f"over the {PDF_MAX_ATTACHMENT_MB:.0f} MB attachment limit; rebuilding smaller")
+                dpi, quality = int(dpi * 0.7), max(quality - 10, 50)
+            os.replace(partial, filename)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        elapsed = time.perf_counter() - started
+        record.update(bytes=size, dpi=dpi, images=pages, reused=reused)
+
+    print(f"PDF digest: {pages} stories at {dpi} DPI, {size / 1024 / 1024:.2f} MB in {elapsed:.2f}s"
+          + (f" ({reused} repeated image{'s' if reused != 1 else ''} reused)" if reused else ""))
+    if size > max_bytes:
+        print(f"Warning: {filename} is still over {PDF_MAX_ATTACHMENT_MB:.0f} MB and may be rejected by the mail server")
+    return filename
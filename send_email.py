@@ -1,8 +1,5 @@
-import os
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
+from smtp_pool import get_smtp_pool
+from mime_assembly import NewsletterMessage, resolve_inline_images
 
 # Email configuration
 subject = "Your Instagram Digest for 2025-03-13"
@@ -12,20 +9,6 @@ sender_password = "rncs vnct iqyv yxzg"  # Use your app-specific password if usi
 smtp_server = "smtp.gmail.com"
 smtp_port = 465
 
-# Create the root message as 'related' so that HTML and inline images can be linked
-msg = MIMEMultipart("related")
-msg["Subject"] = subject
-msg["From"] = sender_email
-msg["To"] = recipient_email
-
-# Create an 'alternative' part for plain text and HTML versions
-alternative = MIMEMultipart("alternative")
-msg.attach(alternative)
-
-# Plain text fallback
-plain_text = "This email contains HTML content with inline images. Please view it in an HTML-capable email client."
-alternative.attach(MIMEText(plain_text, "plain"))
-
 # HTML snippet with inline image references via cid:
 html_snippet = """<!DOCTYPE html>
 <html lang="en">
@@ -189,39 +172,15 @@ html_snippet = """<!DOCTYPE html>
 </html>
 """
 
-# Attach the HTML content
-alternative.attach(MIMEText(html_snippet, "html"))
-
 # Define the folder that contains the images
 image_folder = "instagram_stories"
 
-# List of expected image filenames referenced in the HTML snippet
-image_filenames = [
-    "story_sample_1.png",
-    "story_sample_4.png",
-    "story_sample_2.png",
-    "story_sample_3.png",
-    "story_sample_5.png",
-    "story_sample_6.png"
-]
-
-# Attach each image as an inline image using its filename as the Content-ID.
-for filename in image_filenames:
-    filepath = os.path.join(image_folder, filename)
-    try:
-        with open(filepath, "rb") as img_file:
-            img_data = img_file.read()
-        img = MIMEImage(img_data)
-        # The Content-ID must be wrapped in angle brackets.
-        img.add_header("Content-ID", f"<{filename}>")
-        img.add_header("Content-Disposition", "inline", filename=filename)
-        msg.attach(img)
-    except Exception as e:
-        print(f"Error attaching {filename}: {e}")
-
-# Send the email using SMTP_SSL
-with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-    server.login(sender_email, sender_password)
-    server.sendmail(sender_email, recipient_email, msg.as_string())
+# Attach the images referenced via cid: in the HTML snippet, encoded once as inline parts
+html_snippet, inline_images = resolve_inline_images(html_snippet, [image_folder])
+message = NewsletterMessage(inline_images)
+
+# Send the email through the shared SMTP connection pool
+data = message.build(sender_email, recipient_email, subject, html_snippet)
+get_smtp_pool(sender_email, sender_password, smtp_server, smtp_port).send(data, sender_email, [recipient_email])
 
 print("Email sent successfully!")
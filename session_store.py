@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import urllib.request
+import urllib.error
+
+# Folder holding one encrypted Playwright storage_state file per Instagram account
+SESSION_DIR = os.getenv("INSTAGRAM_SESSION_DIR", ".instagram_sessions")
+
+# Skip the validation request if the session was confirmed this recently (seconds)
+SESSION_REVALIDATE_SECONDS = int(os.getenv("INSTAGRAM_SESSION_REVALIDATE_SECONDS", "900"))
+
+# Instagram origin for every page the pipeline opens; point it at a local stand-in for benchmarks
+INSTAGRAM_BASE_URL = os.getenv("INSTAGRAM_BASE_URL", "https://www.instagram.com").rstrip("/")
+
+# Cheap authenticated page: logged-in sessions get a 200, expired ones a redirect to the login page
+SESSION_CHECK_URL = f"{INSTAGRAM_BASE_URL}/accounts/edit/"
+
+KEY_FILE = os.path.join(SESSION_DIR, ".key")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface redirects as HTTP errors so we can tell a login bounce from a real page."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _get_fernet():
+    """Return a Fernet cipher using INSTAGRAM_SESSION_KEY, or a locally generated key file."""
+    from cryptography.fernet import Fernet
+
+    key = os.getenv("INSTAGRAM_SESSION_KEY")
+    if not key:
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        if not os.path.exists(KEY_FILE):
+            with open(KEY_FILE, "wb") as f:
+                f.write(Fernet.generate_key())
+            os.chmod(KEY_FILE, 0o600)
+        with open(KEY_FILE, "rb") as f:
+            key = f.read().strip()
+    return Fernet(key)
+
+
+def _session_path(account):
+    """Map an account name to its session file."""
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", account)
+    return os.path.join(SESSION_DIR, f"{safe_name}.session")
+
+
+def _write_record(account, record):
+    """Encrypt a session record and write it with owner-only permissions."""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    token = _get_fernet().encrypt(json.dumps(record).encode("utf-8"))
+    path = _session_path(account)
+    with open(path, "wb") as f:
+        f.write(token)
+    os.chmod(path, 0o600)
+    return path
+
+
+def save_session(account, storage_state):
+    """Encrypt and save a Playwright storage_state (cookies + local storage) for an account."""
+    record = {
+        "account": account,
+        "saved_at": time.time(),
+        "validated_at": time.time(),
+        "storage_state": storage_state,
+    }
+    path = _write_record(account, record)
+    print(f"Saved Instagram session for {account} to {path}")
+    return path
+
+
+def load_session(account):
+    """Load and decrypt the stored session record for an account, or None."""
+    path = _session_path(account)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            token = f.read()
+        return json.loads(_get_fernet().decrypt(token).decode("utf-8"))
+    except Exception as e:
+        print(f"Warning: Could not read saved session for {account}: {e}")
+        return None
+
+
+def clear_session(account):
+    """Delete the stored session for an account."""
+    path = _session_path(account)
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Removed expired Instagram session for {account}")
+
+
+def _cookies_expired(cookies):
+    """Check the sessionid cookie locally before spending a request on it."""
+    session_cookie = next((c for c in cookies if c.get("name") == "sessionid"), None)
+    if not session_cookie:
+        return True
+    expires = session_cookie.get("expires", -1)
+    return expires not in (-1, None) and expires < time.time()
+
+
+def is_session_valid(storage_state):
+    """Check a storage_state against Instagram with a single request.
+
+    Returns True or False, or None if the check itself failed (network
+    error, timeout) and says nothing about the session.
+    """
+    cookies = storage_state.get("cookies", [])
+    if _cookies_expired(cookies):
+        return False
+
+    cookie_header = "; ".join(
+        f"{c['name']}={c['value']}" for c in cookies if "instagram.com" in c.get("domain", "")
+    )
+    request = urllib.request.Request(
+        SESSION_CHECK_URL,
+        method="GET",
+        headers={
+            "Cookie": cookie_header,
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                          "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+        },
+    )
+    opener = urllib.request.build_opener(_NoRedirect)
+    try:
+        with opener.open(request, timeout=10) as response:
+            return response.status == 200
+    except urllib.error.HTTPError:
+        # 302 -> /accounts/login/ means the session is gone
+        return False
+    except Exception as e:
+        print(f"Warning: Could not validate saved session: {e}")
+        return None
+
+
+def get_valid_session(account):
+    """Return a stored storage_state for the account if it is still logged in, else None."""
+    record = load_session(account)
+    if not record:
+        return None
+
+    storage_state = record.get("storage_state") or {}
+    if time.time() - record.get("validated_at", 0) < SESSION_REVALIDATE_SECONDS:
+        if not _cookies_expired(storage_state.get("cookies", [])):
+            return storage_state
+
+    print(f"Checking saved Instagram session for {account}...")
+    valid = is_session_valid(storage_state)
+    if valid is None:
+        # Couldn't reach Instagram; keep the session and try it without revalidating
+        print(f"Using saved session for {account} without revalidating it")
+        return storage_state
+    if not valid:
+        clear_session(account)
+        return None
+
+    record["validated_at"] = time.time()
+    _write_record(account, record)
+    print(f"Saved session for {account} is still valid, skipping login")
+    return storage_state
+
+
+def get_valid_cookies(account):
+    """Return cookies from a still-valid stored session, or None if a full login is needed."""
+    storage_state = get_valid_session(account)
+    if storage_state:
+        return storage_state.get("cookies")
+    return None
@@ -0,0 +1,255 @@
+import os
+import time
+import queue
+import socket
+import smtplib
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import span
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("true", "1", "yes")
+
+
+def smtp_settings():
+    """SMTP settings (can be overridden in .env), read when a pool is created so a
+    .env loaded after import still applies. Port 465 means implicit TLS; set
+    SMTP_USE_SSL=false (and optionally SMTP_STARTTLS=true) for plain servers such
+    as a local aiosmtpd instance.
+    """
+    port = int(os.getenv("SMTP_PORT", "465"))
+    return {
+        "host": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "port": port,
+        "use_ssl": _env_flag("SMTP_USE_SSL", "true" if port == 465 else "false"),
+        "starttls": _env_flag("SMTP_STARTTLS", "false"),
+        "size": int(os.getenv("SMTP_POOL_SIZE", "3")),
+        "timeout": float(os.getenv("SMTP_TIMEOUT", "30")),
+        "max_retries": int(os.getenv("SMTP_MAX_RETRIES", "3")),
+        # Recycle a connection after this many messages (Gmail closes sessions after ~100)
+        "max_messages": int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "90")),
+    }
+
+
+# Servers drop idle connections; check with NOOP before reusing one idle longer than this (seconds)
+SMTP_IDLE_CHECK_SECONDS = 30
+
+
+def is_transient_error(error):
+    """Errors that mean "reconnect and try again" rather than "this message is bad"."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: service closing channel; 4xx in general are temporary failures
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class _Connection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """A small pool of logged-in SMTP connections reused across messages.
+
+    Connections are opened lazily (up to ``size``), kept open between sends and
+    replaced transparently when the server drops them or answers 421. Thread
+    safe: ``send_bulk`` drives one worker per connection, each sending its
+    share of messages back-to-back over an already authenticated session.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 use_ssl=None, starttls=None, size=None, timeout=None, max_retries=None):
+        # Anything not given comes from smtp_settings()
+        settings = smtp_settings()
+        self.host = host or settings["host"]
+        self.port = port or settings["port"]
+        self.username = username
+        self.password = password
+        self.use_ssl = settings["use_ssl"] if use_ssl is None else use_ssl
+        self.starttls = settings["starttls"] if starttls is None else starttls
+        self.size = size or settings["size"]
+        self.timeout = timeout or settings["timeout"]
+        self.max_retries = settings["max_retries"] if max_retries is None else max_retries
+        self.max_messages = settings["max_messages"]
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.stats = {"sent": 0, "failed": 0, "connects": 0, "reconnects": 0, "latencies": []}
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        with self._lock:
+            self.stats["connects"] += 1
+        return _Connection(smtp)
+
+    def _discard(self, conn):
+        try:
+            conn.smtp.quit()
+        except Exception:
+            try:
+                conn.smtp.close()
+            except Exception:
+                pass
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - conn.last_used < SMTP_IDLE_CHECK_SECONDS:
+                    return conn
+                try:
+                    if conn.smtp.noop()[0] == 250:
+                        return conn
+                except Exception:
+                    pass
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, healthy=True):
+        if healthy and conn.messages < self.max_messages:
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+        else:
+            self._discard(conn)
+        self._slots.release()
+
+    def send(self, msg, from_addr=None, to_addrs=None):
+        """Send one email, reconnecting on dropped connections and 4xx replies.
+
+        ``msg`` is an email.message.Message, or already serialized bytes (as
+        built by mime_assembly), in which case ``from_addr`` and ``to_addrs``
+        are required.
+        """
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            conn = None
+            try:
+                with span("smtp_send", attempt=attempt, bytes=len(msg) if isinstance(msg, (bytes, str)) else None):
+                    conn = self._acquire()
+                    if isinstance(msg, (bytes, str)):
+                        conn.smtp.sendmail(from_addr, to_addrs, msg)
+                    else:
+                        conn.smtp.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+                conn.messages += 1
+                self._release(conn)
+                with self._lock:
+                    self.stats["sent"] += 1
+                    self.stats["latencies"].append(time.perf_counter() - started)
+                return True
+            except Exception as e:
+                if conn is not None:
+                    self._release(conn, healthy=False)
+                if attempt < self.max_retries and is_transient_error(e):
+                    with self._lock:
+                        self.stats["reconnects"] += 1
+                    time.sleep(min(2 ** attempt, 10))
+                    continue
+                with self._lock:
+                    self.stats["failed"] += 1
+                raise
+
+    def send_bulk(self, messages, from_addr=None, build=None):
+        """Send many messages over the pooled connections; returns a list of (item, error or None).
+
+        ``messages`` are Message objects, or recipient addresses when ``build``
+        is given: ``build(recipient)`` then returns the message bytes for that
+        recipient, sent from ``from_addr``.
+        """
+
+        def send_one(item):
+            try:
+                if build:
+                    self.send(build(item), from_addr, [item])
+                else:
+                    self.send(item)
+                return item, None
+            except Exception as e:
+                print(f"Error sending email to {item if build else item.get('To')}: {e}")
+                return item, e
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(send_one, messages))
+
+    def print_stats(self):
+        """Print per-message latency and failure counts."""
+        with self._lock:
+            latencies = sorted(self.stats["latencies"])
+            stats = dict(self.stats)
+        if not latencies and not stats["failed"]:
+            return
+        summary = f"SMTP: {stats['sent']} sent, {stats['failed']} failed, " \
+                  f"{stats['connects']} connections, {stats['reconnects']} retries"
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            summary += f", latency p50 {p50 * 1000:.0f} ms / p95 {p95 * 1000:.0f} ms"
+        print(summary)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(username=None, password=None, host=None, port=None):
+    """Return the shared pool for a server and login, creating it on first use.
+
+    Defaults to SMTP_SERVER/SMTP_PORT and the EMAIL_USER/EMAIL_PASS credentials.
+    Shared pools are closed (with QUIT) at interpreter exit.
+    """
+    settings = smtp_settings()
+    username = username or os.getenv("EMAIL_USER")
+    password = password or os.getenv("EMAIL_PASS")
+    host = host or settings["host"]
+    port = port or settings["port"]
+    key = (host, port, username)
+    with _pools_lock:
+        if key not in _pools:
+            use_ssl = settings["use_ssl"] if port == settings["port"] else port == 465
+            _pools[key] = SMTPPool(host, port, username, password, use_ssl=use_ssl)
+        return _pools[key]
+
+
+def close_smtp_pools():
+    """Close every shared pool's connections, sending QUIT on each."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# Registered at import, before any exit handler of a module that sends mail (such as the
+# outbox's final drain), so it runs after them: atexit calls handlers in reverse order
+atexit.register(close_smtp_pools)
+
+
+def parse_recipients(value):
+    """Split a comma/semicolon separated recipient list such as RECEIVER_EMAIL."""
+    return [address.strip() for address in (value or "").replace(";", ",").split(",") if address.strip()]
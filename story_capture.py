@@ -0,0 +1,188 @@
+import os
+import mimetypes
+from urllib.parse import urlsplit
+
+from page_waits import is_story_media_response
+
+# "network" saves the original story media from Instagram's CDN responses,
+# "screenshot" keeps the old full-page screenshots (can be overridden in .env)
+STORY_CAPTURE_MODE = os.getenv("STORY_CAPTURE_MODE", "network").lower()
+
+# Elements wrapping the story media, tried in order for the screenshot fallback
+STORY_CONTAINER_SELECTORS = [
+    "section div[role='dialog'] section",
+    "div[role='dialog'] section",
+    "section._ac0a",
+    "section",
+]
+
+# Returns the largest visible story image/video element (same rule as STORY_MEDIA_READY_JS)
+STORY_MEDIA_ELEMENT_JS = """
+() => {
+    const candidates = [...document.querySelectorAll('video, img')].filter(el => {
+        const r = el.getBoundingClientRect();
+        return r.width >= 200 && r.height >= 300 && r.bottom > 0 && r.top < window.innerHeight;
+    });
+    const area = el => { const r = el.getBoundingClientRect(); return r.width * r.height; };
+    return candidates.sort((a, b) => area(b) - area(a))[0] || null;
+}
+"""
+
+_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/png": ".png",
+    "video/mp4": ".mp4",
+}
+
+
+def image_mime_type(path):
+    """MIME type for an image file, for data: URLs sent to the vision API."""
+    mime_type, _ = mimetypes.guess_type(path)
+    return mime_type or "image/png"
+
+
+def _url_key(url):
+    """CDN URLs differ only in signed query params between srcset entries, so compare by path."""
+    parts = urlsplit(url or "")
+    return parts.netloc + parts.path
+
+
+class StoryMediaCollector:
+    """Records story media responses seen by a page so their bytes can be saved
+    instead of re-rendering the page.
+
+    Works with both the sync and async Playwright APIs: the handler only keeps
+    the response objects; bodies are read later by the capture functions.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.responses = {}
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if is_story_media_response(response) and response.status == 200:
+            self.responses[_url_key(response.url)] = response
+
+    def find(self, src):
+        """Return the recorded response for the media currently shown, or None."""
+        if not src or src.startswith("blob:"):
+            # Videos streamed through MediaSource have no single response to save
+            return None
+        return self.responses.get(_url_key(src))
+
+    def detach(self):
+        try:
+            self.page.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+
+
+def _media_path(base_path, content_type):
+    """Path to save a media response under and whether it is a video; None for types
+    the analysis can't read (e.g. HEIC), which fall back to a screenshot."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in _EXTENSIONS:
+        return None, False
+    return base_path + _EXTENSIONS[content_type], content_type.startswith("video/")
+
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+# The capture logic below is written once as generators that yield each
+# Playwright call (a zero-argument callable) and receive its result, so the
+# sync and async functions only differ in how they run those calls.
+
+def _capture_steps(page, collector, src, base_path, mode):
+    mode = (mode or STORY_CAPTURE_MODE).lower()
+    response = collector.find(src) if mode == "network" and collector else None
+    if response:
+        path, is_video = _media_path(base_path, response.headers.get("content-type"))
+        if path is None:
+            print(f"Story media is {response.headers.get('content-type')}, taking a screenshot instead")
+        else:
+            try:
+                _write_bytes(path, (yield response.body))
+                if not is_video:
+                    return path
+                print(f"Saved story video as {path}")
+            except Exception as e:
+                print(f"Could not save intercepted story media: {e}")
+
+    screenshot_path = base_path + ".png"
+    if mode == "network":
+        element = yield from _story_element_steps(page)
+        if element:
+            try:
+                yield lambda: element.screenshot(path=screenshot_path)
+                return screenshot_path
+            except Exception as e:
+                print(f"Element screenshot failed: {e}")
+    yield lambda: page.screenshot(path=screenshot_path)
+    return screenshot_path
+
+
+def _story_element_steps(page):
+    try:
+        element = (yield lambda: page.evaluate_handle(STORY_MEDIA_ELEMENT_JS)).as_element()
+        if element:
+            return element
+    except Exception:
+        pass
+    for selector in STORY_CONTAINER_SELECTORS:
+        try:
+            element = yield lambda: page.query_selector(selector)
+            if element:
+                return element
+        except Exception:
+            pass
+    return None
+
+
+def _run_steps(steps):
+    """Drive a step generator with the sync Playwright API."""
+    result, error = None, None
+    while True:
+        try:
+            call = steps.throw(error) if error else steps.send(result)
+        except StopIteration as done:
+            return done.value
+        try:
+            result, error = call(), None
+        except Exception as e:
+            result, error = None, e
+
+
+async def _async_run_steps(steps):
+    """Drive a step generator with the async Playwright API."""
+    result, error = None, None
+    while True:
+        try:
+            call = steps.throw(error) if error else steps.send(result)
+        except StopIteration as done:
+            return done.value
+        try:
+            result, error = await call(), None
+        except Exception as e:
+            result, error = None, e
+
+
+def capture_story_media(page, collector, src, base_path, mode=None):
+    """Save the story currently on screen and return the path of an image for analysis.
+
+    In network mode the original CDN image is written as-is. Videos are saved
+    as .mp4 with an element screenshot of the current frame next to it, since
+    the analysis step needs a still image. Falls back to an element-level
+    screenshot of the story container, then to a page screenshot.
+    """
+    return _run_steps(_capture_steps(page, collector, src, base_path, mode))
+
+
+async def async_capture_story_media(page, collector, src, base_path, mode=None):
+    """Async API counterpart of capture_story_media."""
+    return await _async_run_steps(_capture_steps(page, collector, src, base_path, mode))
@@ -0,0 +1,106 @@
+import os
+
+# Two frames whose 64-bit difference hashes differ in at most this many bits
+# are treated as the same story (can be overridden in .env)
+STORY_DEDUP_MAX_DISTANCE = int(os.getenv("STORY_DEDUP_MAX_DISTANCE", "6"))
+
+# Side length of the hash grid; 8 gives a 64-bit hash
+HASH_SIZE = 8
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    """Difference hash: compares neighbouring pixels of a tiny grayscale thumbnail.
+
+    Robust to re-encoding, scaling and small UI overlays, which is what makes
+    the same story captured twice (or a PNG next to its JPEG) collide.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def group_near_duplicates(image_paths, max_distance=STORY_DEDUP_MAX_DISTANCE):
+    """Group images whose hashes are within ``max_distance`` bits of each other.
+
+    Returns a list of groups (lists of paths) in first-seen order; the first
+    path of each group is the one kept. Images that cannot be hashed get a
+    group of their own.
+    """
+    groups = []
+    hashes = []
+    for path in image_paths:
+        try:
+            value = dhash(path)
+        except Exception as e:
+            print(f"Warning: Could not hash {path}: {e}")
+            groups.append([path])
+            hashes.append(None)
+            continue
+
+        for i, group_hash in enumerate(hashes):
+            if group_hash is not None and hamming_distance(value, group_hash) <= max_distance:
+                groups[i].append(path)
+                break
+        else:
+            groups.append([path])
+            hashes.append(value)
+    return groups
+
+
+class DuplicateFilter:
+    """Incremental near-duplicate check for images that arrive one at a time."""
+
+    def __init__(self, max_distance=STORY_DEDUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.hashes = []
+        self.paths = set()
+        self.dropped = 0
+
+    def is_new(self, image_path):
+        """True the first time an image (or a near-duplicate of it) is seen."""
+        path = os.path.normpath(image_path)
+        if path in self.paths:
+            self.dropped += 1
+            return False
+        self.paths.add(path)
+        try:
+            value = dhash(path)
+        except Exception as e:
+            print(f"Warning: Could not hash {path}: {e}")
+            return True
+        for seen in self.hashes:
+            if hamming_distance(value, seen) <= self.max_distance:
+                print(f"  Dropped {path} (near-duplicate of an earlier story)")
+                self.dropped += 1
+                return False
+        self.hashes.append(value)
+        return True
+
+
+def dedupe_images(image_paths, max_distance=STORY_DEDUP_MAX_DISTANCE):
+    """Return only one frame per group of near-duplicates, and report what was dropped."""
+    # Identical paths (e.g. the same file listed twice) never need hashing
+    unique_paths = list(dict.fromkeys(os.path.normpath(p) for p in image_paths))
+    groups = group_near_duplicates(unique_paths, max_distance)
+    kept = [group[0] for group in groups]
+
+    saved = len(image_paths) - len(kept)
+    print(f"Deduplication: {len(image_paths)} images -> {len(kept)} unique, "
+          f"{saved} API image{'s' if saved != 1 else ''} saved")
+    for group in groups:
+        if len(group) > 1:
+            print(f"  Kept {group[0]}, dropped {', '.join(group[1:])}")
+    return kept
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from analysis_cache import image_hash
+
+# SQLite catalog of accounts, captured stories and their analyses (can be overridden in .env)
+STORY_INDEX_PATH = os.getenv("STORY_INDEX_PATH", ".story_index.sqlite3")
+
+# Captured stories are kept here, one folder per account, named by story ID so runs never overwrite each other
+STORY_CAPTURE_DIR = os.getenv("STORY_CAPTURE_DIR", "captures")
+
+# Story viewer URLs look like /stories/<username>/<story id>/
+STORY_URL_ID_RE = re.compile(r"/stories/[^/]+/(\d+)")
+
+
+def story_key(page_url, media_src):
+    """Stable ID for the story on screen: Instagram's story ID from the viewer URL, else a hash of
+    the media URL's path (signed query params change between loads). None if neither is known."""
+    match = STORY_URL_ID_RE.search(page_url or "")
+    if match:
+        return match.group(1)
+    if media_src and not media_src.startswith("blob:"):
+        return hashlib.sha1(media_src.split("?", 1)[0].encode("utf-8")).hexdigest()[:16]
+    return None
+
+
+def capture_base(username, key):
+    """Capture path without extension, ``captures/<username>/<username>_story_<key>``."""
+    folder = os.path.join(STORY_CAPTURE_DIR, username)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{username}_story_{key or int(time.time() * 1000)}")
+
+
+class StoryIndex:
+    """Which stories each account has already had captured and analyzed.
+
+    Capture skips stories whose ID already has an analysis here, and analysis
+    skips images whose content already has one, so a daily run only does work
+    for stories posted (or not successfully analyzed) since the last one.
+    """
+
+    def __init__(self, path=STORY_INDEX_PATH):
+        self.path = path
+        self.skipped = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS accounts ("
+            " username TEXT PRIMARY KEY,"
+            " first_seen REAL NOT NULL,"
+            " last_checked REAL NOT NULL,"
+            " last_new_story REAL);"
+            "CREATE TABLE IF NOT EXISTS stories ("
+            " id INTEGER PRIMARY KEY,"
+            " username TEXT NOT NULL,"
+            " story_key TEXT NOT NULL,"
+            " media_url TEXT,"
+            " content_hash TEXT,"
+            " captured_at REAL NOT NULL,"
+            " path TEXT NOT NULL,"
+            " UNIQUE (username, story_key));"
+            "CREATE INDEX IF NOT EXISTS stories_content_hash ON stories (content_hash);"
+            "CREATE INDEX IF NOT EXISTS stories_path ON stories (path);"
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " story_id INTEGER PRIMARY KEY REFERENCES stories (id),"
+            " prompt_version TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " analyzed_at REAL NOT NULL,"
+            " result TEXT NOT NULL);"
+        )
+        self._conn.commit()
+
+    def seen_keys(self, username):
+        """Story IDs already captured and analyzed for ``username``; also marks the account as checked now.
+
+        Stories whose analysis failed are left out, so the next run captures and analyzes them again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO accounts (username, first_seen, last_checked) VALUES (?, ?, ?)"
+                " ON CONFLICT (username) DO UPDATE SET last_checked = excluded.last_checked",
+                (username, now, now),
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT story_key FROM stories JOIN analyses ON analyses.story_id = stories.id"
+                " WHERE stories.username = ?", (username,)
+            )
+            return {row[0] for row in rows}
+
+    def mark_skipped(self):
+        """Count a story passed over because an earlier run already captured or analyzed it."""
+        with self._lock:
+            self.skipped += 1
+
+    def record_story(self, username, key, media_url, path):
+        """Catalog a newly captured story file; a recaptured story keeps its row (and id)."""
+        try:
+            content_hash = image_hash(path)
+        except OSError:
+            content_hash = None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO stories (username, story_key, media_url, content_hash, captured_at, path)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (username, story_key) DO UPDATE SET media_url = excluded.media_url,"
+                " content_hash = excluded.content_hash, captured_at = excluded.captured_at, path = excluded.path",
+                (username, key or os.path.basename(path), media_url, content_hash, now, os.path.abspath(path)),
+            )
+            self._conn.execute("UPDATE accounts SET last_new_story = ? WHERE username = ?", (now, username))
+            self._conn.commit()
+            self.recorded += 1
+
+    def has_analysis(self, path):
+        """True if a story with the same image content was analyzed in an earlier run."""
+        try:
+            content_hash = image_hash(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM stories JOIN analyses ON analyses.story_id = stories.id"
+                " WHERE stories.content_hash = ? LIMIT 1",
+                (content_hash,),
+            ).fetchone()
+        return row is not None
+
+    def new_content(self, paths):
+        """The paths whose content has not been analyzed before, in order; the rest count as skipped."""
+        fresh = [path for path in paths if not self.has_analysis(path)]
+        for _ in range(len(paths) - len(fresh)):
+            self.mark_skipped()
+        return fresh
+
+    def record_analysis(self, path, prompt_version, model, result):
+        """Attach an analysis result to the cataloged story at ``path`` (ignored for uncataloged files)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM stories WHERE path = ? ORDER BY captured_at DESC LIMIT 1", (os.path.abspath(path),)
+            ).fetchone()
+            if not row:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (story_id, prompt_version, model, analyzed_at, result)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (row[0], prompt_version, model, time.time(), json.dumps(result)),
+            )
+            self._conn.commit()
+
+    def print_stats(self):
+        if self.recorded or self.skipped:
+            print(f"Story index: {self.recorded} new stories captured, {self.skipped} already seen and skipped")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_story_index():
+    """Return the process-wide story index, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = StoryIndex()
+        return _index
@@ -0,0 +1,83 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from async_analysis import STORY_ANALYSIS_CONCURRENCY, aggregate_stories, analyze_story
+from async_story_extractor import STORY_ACCOUNT_TIMEOUT, STORY_MAX_CONCURRENCY, stream_story_extractions
+from browser_pool import shutdown_browser_pool
+from dataflow import Stage, run_dataflow
+from llm_gateway import get_llm_gateway
+from story_dedup import DuplicateFilter
+from story_index import get_story_index
+
+
+async def capture_and_analyze_async(cookies, usernames, num_stories=1, max_concurrency=None, detail=None,
+                                    analysis_concurrency=None, storage_state=None):
+    """Capture, deduplicate and analyze stories as one overlapping dataflow.
+
+    Each story goes to deduplication and then to the vision model as soon as
+    its account is captured, while other accounts are still loading. Returns
+    the kept image paths and the aggregated StoryAnalysisReport (None if
+    nothing was captured). ``storage_state`` is the login session passed on
+    to the capture browser.
+    """
+    max_concurrency = max_concurrency or STORY_MAX_CONCURRENCY
+    analysis_concurrency = analysis_concurrency or STORY_ANALYSIS_CONCURRENCY
+    gateway = get_llm_gateway()
+    semaphore = asyncio.Semaphore(analysis_concurrency)
+    duplicates = DuplicateFilter()
+    story_index = get_story_index()
+    indexes = itertools.count()
+    screenshots = []
+
+    async def captured_stories():
+        async for result in stream_story_extractions(cookies, usernames, num_stories, max_concurrency,
+                                                     STORY_ACCOUNT_TIMEOUT, storage_state=storage_state):
+            if result["error"]:
+                print(f"[{result['username']}] Failed after {result['elapsed']:.1f}s: {result['error']}")
+            for path in result["screenshots"]:
+                yield path
+
+    async def dedupe(path):
+        # Hashing decodes the image, so keep it off the event loop
+        if not await asyncio.to_thread(duplicates.is_new, path):
+            return None
+        # A new story ID can still carry content analyzed in an earlier run (a repost)
+        if await asyncio.to_thread(story_index.has_analysis, path):
+            story_index.mark_skipped()
+            return None
+        screenshots.append(path)
+        return next(indexes), path
+
+    async def analyze(item):
+        index, path = item
+        return await analyze_story(gateway, semaphore, index, path, detail)
+
+    try:
+        stories = await run_dataflow(captured_stories(), [
+            Stage("dedupe", dedupe),
+            Stage("analyze", analyze, workers=analysis_concurrency),
+        ])
+        if duplicates.dropped:
+            print(f"Deduplication: {duplicates.dropped} API image{'s' if duplicates.dropped != 1 else ''} saved")
+        if not stories:
+            return screenshots, None
+        stories.sort(key=lambda story: story.index)
+        return screenshots, await aggregate_stories(gateway, stories)
+    finally:
+        await gateway.aclose()
+
+
+def capture_and_analyze(cookies, usernames, num_stories=1, max_concurrency=None, detail=None,
+                        analysis_concurrency=None, storage_state=None):
+    """Blocking wrapper around capture_and_analyze_async, safe to call from sync code.
+
+    The sync browser pool used for login is shut down first so only one Chromium runs.
+    """
+    print(f"\n--- Capturing and analyzing stories for {len(usernames)} accounts as a dataflow ---")
+    shutdown_browser_pool()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(
+            asyncio.run, capture_and_analyze_async(cookies, usernames, num_stories, max_concurrency,
+                                                   detail, analysis_concurrency, storage_state)
+        ).result()
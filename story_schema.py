@@ -0,0 +1,110 @@
+import json
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+RELEVANCE_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+class StoryAnalysis(BaseModel):
+    """What the vision model reports for one story (strict structured-output schema)."""
+    index: int
+    filename: str
+    account_name: str
+    account_type: Literal["friend", "influencer"]
+    content_type: str
+    description: str
+    visible_text: str
+    themes: List[str]
+    relevance: Literal["high", "medium", "low"]
+
+
+class StoryAnalysisBatch(BaseModel):
+    """Response format for one vision call covering one or more stories."""
+    stories: List[StoryAnalysis]
+
+
+class StoryResult(StoryAnalysis):
+    """A story as passed between pipeline stages; ``error`` is set when its analysis failed."""
+    account_type: str
+    relevance: str
+    error: Optional[str] = None
+
+
+class NewsletterSection(BaseModel):
+    title: str
+    description: str
+    related_stories: List[int]
+
+
+class NewsletterPlan(BaseModel):
+    """Response format for the text-only aggregation call."""
+    overall_themes: List[str]
+    newsletter_sections: List[NewsletterSection]
+
+
+class StoryAnalysisReport(BaseModel):
+    """Full analysis handed from the analysis stage to newsletter generation and rendering."""
+    stories: List[StoryResult] = []
+    overall_themes: List[str] = []
+    newsletter_sections: List[NewsletterSection] = []
+
+    def by_filename(self):
+        """Map each story's filename to its result."""
+        return {story.filename: story for story in self.stories}
+
+    def top_stories(self, top_n=3):
+        """The most relevant successfully analyzed stories, keeping the original order for ties."""
+        stories = [story for story in self.stories if not story.error]
+        stories.sort(key=lambda story: RELEVANCE_ORDER.get(story.relevance.lower(), 3))
+        return stories[:top_n] if top_n else stories
+
+
+class StoryBlurb(BaseModel):
+    index: int
+    blurb: str
+
+
+class NewsletterCopy(BaseModel):
+    """Short copy the model writes for a newsletter; the HTML comes from newsletter_renderer."""
+    subject: str
+    tagline: str
+    intro: str
+    friends_intro: str
+    influencers_intro: str
+    story_blurbs: List[StoryBlurb]
+    sign_off: str
+
+
+def _strip_code_fence(text):
+    """Remove ```json ... ``` fences that models sometimes wrap around JSON."""
+    text = text.strip()
+    if text.startswith("```") and "```" in text[3:]:
+        start = text.find("\n") + 1
+        end = text.rfind("```")
+        return text[start:end].strip()
+    return text
+
+
+def coerce_report(analysis):
+    """Return a StoryAnalysisReport from a report, a dict, or JSON text (raises ValueError if invalid).
+
+    Lets the older string-based callers keep working while the pipeline passes
+    the parsed object around.
+    """
+    if isinstance(analysis, StoryAnalysisReport):
+        return analysis
+    if isinstance(analysis, str):
+        try:
+            analysis = json.loads(_strip_code_fence(analysis))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"analysis is not valid JSON: {e}")
+    return StoryAnalysisReport.model_validate(analysis)
+
+
+def analysis_to_text(analysis):
+    """Render an analysis for use inside a prompt."""
+    if isinstance(analysis, BaseModel):
+        return analysis.model_dump_json(indent=2, exclude_none=True)
+    return analysis
+
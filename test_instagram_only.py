@@ -1,10 +1,20 @@
 import os
 from dotenv import load_dotenv
+
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
 from playwright.sync_api import sync_playwright
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    wait_for_any_selector,
+    wait_for_dom_settled,
+    wait_for_page_ready,
+    wait_for_story_media,
+    print_wait_summary,
+)
 import time
 
-# Load environment variables
-load_dotenv()
 
 # Debug: Print all environment variables (without passwords)
 def debug_env_vars():
@@ -27,9 +37,9 @@ def login_instagram():
             print("Opening Instagram login page...")
             page.goto("https://instagram.com/accounts/login")
             
-            # Wait for page to fully load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Extra wait to ensure login form is ready
+            # Wait for the login form to be ready
+            wait_for_page_ready(page)
+            wait_for_any_selector(page, ['input[name="username"]'], step="login_form")
             
             # Check for credentials before proceeding
             instagram_user = os.getenv('INSTAGRAM_USER')
@@ -38,8 +48,6 @@ def login_instagram():
             if not instagram_user or not instagram_pass:
                 print("Error: Instagram credentials not found in .env file")
                 print("Please add INSTAGRAM_USER and INSTAGRAM_PASS to your .env file")
-                # Give time to see the error
-                page.wait_for_timeout(5000)
                 browser.close()
                 return None
             
@@ -58,14 +66,12 @@ def login_instagram():
                 browser.close()
                 return None
             
-            # Fill in the login form with explicit waits
+            # Fill in the login form
             print("Filling username field...")
             page.fill('input[name="username"]', instagram_user)
-            page.wait_for_timeout(1000)  # Wait 1 second
             
             print("Filling password field...")
             page.fill('input[name="password"]', instagram_pass)
-            page.wait_for_timeout(1000)  # Wait 1 second
             
             print("Clicking submit button...")
             # Try different submit button selectors
@@ -107,44 +113,43 @@ def login_instagram():
                 # Try multiple selectors that might indicate a successful login
                 print("Checking for various post-login elements...")
                 
-                # Wait a bit for any security checkpoint to appear
-                page.wait_for_timeout(5000)  # 5 seconds to load any security page
+                # Wait for the home feed or a security checkpoint, whichever appears first
+                checkpoint_selectors = [
+                    "text=Suspicious Login Attempt",
+                    "text=Enter Security Code",
+                    "text=We detected an unusual login attempt",
+                ]
+                selectors = [
+                    "xpath=//div[contains(text(),'Home')]",  # Text-based Home button
+                    "[aria-label='Home']",                 # Aria-label Home button
+                    "svg[aria-label='Home']",              # SVG Home icon
+                    "[role='main']",                       # Main content area
+                    "[data-testid='feed-timeline']"         # Feed timeline
+                ]
+                wait_for_any_selector(page, selectors + checkpoint_selectors, step="login_complete")
                 
                 # Take a screenshot to help identify the current page
                 page.screenshot(path="login_progress.png")
                 print("Screenshot of current state saved to login_progress.png")
                 
                 # Check if we need to handle a security checkpoint
-                if page.query_selector("text=Suspicious Login Attempt") or page.query_selector("text=Enter Security Code") or page.query_selector("text=We detected an unusual login attempt"):
+                if any(page.query_selector(selector) for selector in checkpoint_selectors):
                     print("Security checkpoint detected.")
                     print("Please check the browser window and complete any security checks manually.")
                     # Give user time to handle the security checkpoint
                     input("Press Enter after completing the security verification in the browser window...")
                 
-                # Wait for any of these selectors that might indicate a successful login
-                selectors = [
-                    "xpath=//div[contains(text(),'Home')]",  # Text-based Home button
-                    "[aria-label='Home']",                 # Aria-label Home button
-                    "svg[aria-label='Home']",              # SVG Home icon
-                    "[role='main']",                       # Main content area
-                    "[data-testid='feed-timeline']"         # Feed timeline
-                ]
-                
                 print("Waiting for home page elements...")
                 success = False
-                for selector in selectors:
-                    try:
-                        if page.wait_for_selector(selector, timeout=5000):
-                            print(f"Login confirmed with selector: {selector}")
-                            success = True
-                            break
-                    except Exception:
-                        continue
+                selector = wait_for_any_selector(page, selectors, step="login_complete")
+                if selector:
+                    print(f"Login confirmed with selector: {selector}")
+                    success = True
                 
                 if not success:
-                    # One more check - just wait a bit and see if we're on instagram.com
+                    # One more check - see if we're on instagram.com once the page settles
                     # (sometimes UI elements change but we're still logged in)
-                    page.wait_for_timeout(3000)  # Wait 3 more seconds
+                    wait_for_dom_settled(page)
                     current_url = page.url
                     if "instagram.com" in current_url and "accounts/login" not in current_url:
                         print(f"Appears to be logged in based on URL: {current_url}")
@@ -158,8 +163,6 @@ def login_instagram():
                     page.screenshot(path="login_success.png")
                     print("Screenshot of logged-in state saved to login_success.png")
                     
-                    # Give a moment to see the result before closing
-                    page.wait_for_timeout(2000)
                     browser.close()
                     return cookies
                 else:
@@ -200,9 +203,8 @@ def screenshot_stories(cookies, num_stories=3):
             print("Navigating to Instagram homepage...")
             page.goto("https://instagram.com")
             
-            # Give page time to load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional time to ensure full load
+            # Wait for the feed to render
+            wait_for_page_ready(page)
             
             # Take a screenshot of homepage for debugging
             page.screenshot(path="instagram_home.png")
@@ -221,27 +223,22 @@ def screenshot_stories(cookies, num_stories=3):
                 ]
                 
                 success = False
-                for selector in story_selectors:
-                    try:
-                        if page.wait_for_selector(selector, timeout=5000):
-                            print(f"Story found with selector: {selector}")
-                            # Take before-click screenshot
-                            page.screenshot(path="before_story_click.png")
-                            print("Screenshot before clicking story saved as before_story_click.png")
-                            
-                            # Click the story
-                            page.click(selector)
-                            page.wait_for_timeout(2000)  # Wait for story to open
-                            
-                            # Check if we're in story view
-                            page.screenshot(path="after_story_click.png")
-                            print("Screenshot after clicking story saved as after_story_click.png")
-                            
-                            success = True
-                            break
-                    except Exception as e:
-                        print(f"Selector {selector} failed: {e}")
-                        continue
+                selector = wait_for_any_selector(page, story_selectors, step="story_tray")
+                if selector:
+                    print(f"Story found with selector: {selector}")
+                    # Take before-click screenshot
+                    page.screenshot(path="before_story_click.png")
+                    print("Screenshot before clicking story saved as before_story_click.png")
+                    
+                    # Click the story and wait for the viewer to open
+                    page.click(selector)
+                    wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
+                    
+                    # Check if we're in story view
+                    page.screenshot(path="after_story_click.png")
+                    print("Screenshot after clicking story saved as after_story_click.png")
+                    
+                    success = True
                 
                 if not success:
                     raise Exception("Could not find or click any stories using available selectors")
@@ -252,10 +249,11 @@ def screenshot_stories(cookies, num_stories=3):
                 return screenshots
             
             print("Capturing screenshots of stories...")
+            previous_src = None
             for i in range(num_stories):
                 print(f"Capturing story {i+1}/{num_stories}...")
-                # Wait for story to load
-                page.wait_for_timeout(2000)  # wait 2 seconds for the story to load
+                # Wait for the story's media to load
+                previous_src = wait_for_story_media(page, previous_src) or previous_src
                 screenshot_path = f"story_{i+1}.png"
                 page.screenshot(path=screenshot_path)
                 screenshots.append(screenshot_path)
@@ -264,10 +262,7 @@ def screenshot_stories(cookies, num_stories=3):
                 # Move to next story
                 print("Moving to next story...")
                 page.keyboard.press('ArrowRight')
-                page.wait_for_timeout(1000)  # wait 1 second between stories
             
-            # Wait a moment before closing to see the results
-            page.wait_for_timeout(2000)
             browser.close()
             print(f"Successfully captured {len(screenshots)} screenshots")
     except Exception as e:
@@ -297,6 +292,7 @@ def test_instagram_only():
     for screenshot in screenshots:
         print(f"- {screenshot}")
     
+    print_wait_summary()
     return True
 
 if __name__ == "__main__":
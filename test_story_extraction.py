@@ -1,10 +1,21 @@
 import os
 from dotenv import load_dotenv
+
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
 from playwright.sync_api import sync_playwright
+from page_waits import (
+    STORY_VIEW_INDICATORS,
+    VIEW_STORY_SELECTORS,
+    wait_for_any_selector,
+    wait_for_dom_settled,
+    wait_for_page_ready,
+    wait_for_story_media,
+    print_wait_summary,
+)
 import time
 
-# Load environment variables
-load_dotenv()
 
 # Debug: Print environment variables
 def debug_env_vars():
@@ -43,15 +54,14 @@ def login_instagram():
             page.goto("https://www.instagram.com/accounts/login/")
             
             # Wait for the page to fully load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional wait to ensure all elements are loaded
+            wait_for_page_ready(page)
             
             # Check if we need to handle cookies consent dialog
             try:
                 if page.query_selector("text=Accept All"):
                     print("Handling cookies consent dialog...")
                     page.click("text=Accept All")
-                    page.wait_for_timeout(1000)
+                    wait_for_dom_settled(page)
             except Exception as e:
                 print(f"Note: No cookies dialog or error handling it: {e}")
             
@@ -68,6 +78,9 @@ def login_instagram():
                 "._ab32"  # Another potential class
             ]
             
+            # Wait for the login form to render
+            wait_for_any_selector(page, username_selectors, step="login_form")
+            
             # Try each selector until one works
             username_field_found = False
             for selector in username_selectors:
@@ -88,8 +101,8 @@ def login_instagram():
                 # Try direct navigation to the feed as a logged-out user
                 print("Trying direct navigation to Instagram feed...")
                 page.goto("https://www.instagram.com/")
-                page.wait_for_load_state("networkidle")
-                page.wait_for_timeout(3000)
+                wait_for_page_ready(page)
+                wait_for_any_selector(page, username_selectors, step="login_form")
                 
                 # Check if there's a login form on this page
                 for selector in username_selectors:
@@ -180,14 +193,10 @@ def login_instagram():
             ]
             
             login_success = False
-            for selector in success_selectors:
-                try:
-                    page.wait_for_selector(selector, timeout=10000)
-                    print(f"Login confirmed with selector: {selector}")
-                    login_success = True
-                    break
-                except Exception:
-                    pass
+            selector = wait_for_any_selector(page, success_selectors, step="login_complete")
+            if selector:
+                print(f"Login confirmed with selector: {selector}")
+                login_success = True
             
             if not login_success:
                 print("Could not verify successful login! Taking screenshot for analysis.")
@@ -229,9 +238,9 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
             print(f"Navigating directly to {story_username}'s stories...")
             page.goto(f"https://www.instagram.com/stories/{story_username}/")
             
-            # Give page time to load
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(3000)  # Additional time to ensure full load
+            # Wait until either the "View story" prompt or the story viewer shows up
+            wait_for_page_ready(page)
+            wait_for_any_selector(page, VIEW_STORY_SELECTORS + STORY_VIEW_INDICATORS, step="story_entry")
             
             # Take a screenshot to verify we're on the right page
             page.screenshot(path="story_confirmation_page.png")
@@ -241,24 +250,15 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
             print("Looking for 'View story' button...")
             
             # Approach 1: Try text-based selectors
-            view_story_selectors = [
-                "text=View story", 
-                "button:has-text('View story')",
-                ".x1i10hfl:has-text('View story')",
-                "[role='button']:has-text('View story')",
-                "//div[contains(text(), 'View story')]",
-                "//button[contains(text(), 'View story')]"
-            ]
-            
             view_button_clicked = False
-            for selector in view_story_selectors:
+            for selector in VIEW_STORY_SELECTORS:
                 try:
                     if page.query_selector(selector):
                         print(f"Found 'View story' button with selector: {selector}")
                         page.click(selector)
                         print("Clicked 'View story' button")
-                        # Wait for the story to load after clicking the button
-                        page.wait_for_timeout(3000)
+                        # Wait for the story viewer to open after clicking the button
+                        wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
                         # Take a screenshot to confirm we're in the story view now
                         page.screenshot(path="after_view_story_click.png")
                         print("Screenshot after clicking 'View story' saved as after_view_story_click.png")
@@ -283,7 +283,7 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
                         if "view" in button_text and "story" in button_text:
                             print(f"Found button with text: {button_text}")
                             button.click()
-                            page.wait_for_timeout(3000)
+                            wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
                             page.screenshot(path="after_text_button_click.png")
                             print("Clicked button with 'View story' text")
                             view_button_clicked = True
@@ -304,31 +304,22 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
                     
                     print(f"Clicking center of page at coordinates ({center_x}, {center_y})")
                     page.mouse.click(center_x, center_y)
-                    page.wait_for_timeout(3000)
+                    wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
                     page.screenshot(path="after_center_click.png")
                     print("Clicked center of page")
                     
                     # Also try slightly below center where the View story button often appears
                     print("Trying position below center")
                     page.mouse.click(center_x, center_y + 60)
-                    page.wait_for_timeout(3000)
+                    wait_for_any_selector(page, STORY_VIEW_INDICATORS, step="story_view")
                     page.screenshot(path="after_below_center_click.png")
                 except Exception as e:
                     print(f"Error with coordinate-based approach: {e}")
             
             # Check if we're in story view after all click attempts
             print("Checking if we're in story view...")
-            story_indicators = [
-                "[aria-label='Pause']",  # Pause button
-                "button[aria-label='Next']",  # Next button
-                "button[aria-label='Previous']",  # Previous button
-                ".x1i10hfl.xjqpnuy",  # Common class for story UI
-                "._aa8j",  # Another potential story UI class
-                "video"  # Videos are common in stories
-            ]
-            
             in_story_view = False
-            for indicator in story_indicators:
+            for indicator in STORY_VIEW_INDICATORS:
                 if page.query_selector(indicator):
                     print(f"Story view confirmed with element: {indicator}")
                     in_story_view = True
@@ -342,10 +333,11 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
             
             # Capture the requested number of stories
             print("\nCapturing screenshots of stories...")
+            previous_src = None
             for i in range(num_stories):
                 print(f"Capturing story {i+1}/{num_stories}...")
-                # Wait for story to load
-                page.wait_for_timeout(2000)  # wait 2 seconds for the story to load
+                # Wait for this story's image/video to finish loading
+                previous_src = wait_for_story_media(page, previous_src) or previous_src
                 screenshot_path = f"{story_username}_story_{i+1}.png"
                 page.screenshot(path=screenshot_path)
                 screenshots.append(screenshot_path)
@@ -355,10 +347,7 @@ def improved_screenshot_stories(cookies, story_username="isabelokunpicena_", num
                     # Move to next story
                     print("Moving to next story...")
                     page.keyboard.press('ArrowRight')
-                    page.wait_for_timeout(1500)  # wait 1.5 seconds between stories
             
-            # Wait a moment before closing to see the results
-            page.wait_for_timeout(2000)
             browser.close()
             print(f"Successfully captured {len(screenshots)} screenshots")
     except Exception as e:
@@ -389,6 +378,7 @@ def test_story_extraction():
     for screenshot in screenshots:
         print(f"- {screenshot}")
     
+    print_wait_summary()
     return True
 
 # Run the test
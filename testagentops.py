@@ -1,13 +1,18 @@
+from dotenv import load_dotenv
+
+# Load environment variables before the project modules read their settings
+load_dotenv()
+
 from agents import Agent, Runner
 import agentops
 import os
-from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
+from page_waits import wait_for_page_ready, wait_for_story_media
 from fpdf import FPDF
+from pdf_digest import build_pdf_digest
 import smtplib
 from email.message import EmailMessage
 
-load_dotenv()
 
 # Initialize AgentOps
 agentops.init(os.getenv("AGENTOPS_API_KEY"))
@@ -83,8 +88,8 @@ def screenshot_stories(cookies, num_stories=3):
             print("Navigating to Instagram homepage...")
             page.goto("https://instagram.com")
             
-            # Give page time to load
-            page.wait_for_load_state("networkidle")
+            # Wait for the feed to render
+            wait_for_page_ready(page)
             
             # Take a screenshot of homepage for debugging
             page.screenshot(path="instagram_home.png")
@@ -120,10 +125,11 @@ def screenshot_stories(cookies, num_stories=3):
                         return screenshots
             
             print("Capturing screenshots of stories...")
+            previous_src = None
             for i in range(num_stories):
                 print(f"Capturing story {i+1}/{num_stories}...")
-                # Wait for story to load
-                page.wait_for_timeout(2000)  # wait 2 seconds for the story to load
+                # Wait for the story's media to load
+                previous_src = wait_for_story_media(page, previous_src) or previous_src
                 screenshot_path = f"story_{i+1}.png"
                 page.screenshot(path=screenshot_path)
                 screenshots.append(screenshot_path)
@@ -132,7 +138,6 @@ def screenshot_stories(cookies, num_stories=3):
                 # Move to next story
                 print("Moving to next story...")
                 page.keyboard.press('ArrowRight')
-                page.wait_for_timeout(1000)  # wait 1 second between stories
             
             browser.close()
             print(f"Successfully captured {len(screenshots)} screenshots")
@@ -151,32 +156,7 @@ def create_pdf(screenshots):
         return None
     
     try:
-        pdf = FPDF()
-        
-        # Add a cover page
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 24)
-        pdf.cell(0, 20, "Instagram Stories Digest", 0, 1, "C")
-        pdf.set_font("Arial", "I", 12)
-        pdf.cell(0, 10, f"Generated on {__import__('datetime').datetime.now().strftime('%Y-%m-%d')}", 0, 1, "C")
-        pdf.cell(0, 10, f"Contains {len(screenshots)} stories", 0, 1, "C")
-        
-        # Add each screenshot to a new page
-        for i, image in enumerate(screenshots):
-            print(f"Adding {image} to PDF...")
-            pdf.add_page()
-            # Try to add the image to the PDF
-            try:
-                pdf.image(image, x=10, y=10, w=190)  # adjust size as necessary
-                print(f"Added {image} to PDF")
-            except Exception as e:
-                print(f"Error adding {image} to PDF: {e}")
-                # Continue to the next image rather than failing completely
-                continue
-        
-        # Save the PDF
-        pdf_filename = "instagram_digest.pdf"
-        pdf.output(pdf_filename)
+        pdf_filename = build_pdf_digest(screenshots, "instagram_digest.pdf")
         print(f"PDF digest created successfully: {pdf_filename}")
         return pdf_filename
     except Exception as e:
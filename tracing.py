@@ -0,0 +1,46 @@
+import os
+import threading
+
+_agentops_active = None
+_lock = threading.Lock()
+_tracked = {}
+
+
+def init_agentops(**kwargs):
+    """Start AgentOps once per process if AGENTOPS_API_KEY is set; returns True when tracing is on.
+
+    AgentOps is only imported here, so modules that never trace a run don't
+    pay for the SDK or its network setup at import time.
+    """
+    global _agentops_active
+    with _lock:
+        if _agentops_active is None:
+            api_key = os.getenv("AGENTOPS_API_KEY")
+            if not api_key:
+                print("AgentOps API key not found, skipping trace export")
+                _agentops_active = False
+            else:
+                try:
+                    import agentops
+                    agentops.init(api_key, **kwargs)
+                    _agentops_active = True
+                except Exception as e:
+                    print(f"AgentOps could not be started, skipping trace export: {e}")
+                    _agentops_active = False
+        return _agentops_active
+
+
+def agentops_active():
+    """True once init_agentops has started tracing."""
+    return bool(_agentops_active)
+
+
+def tracked_class(cls, name):
+    """``cls`` wrapped with agentops.track_agent when tracing is on, otherwise ``cls`` itself."""
+    if not agentops_active():
+        return cls
+    with _lock:
+        if cls not in _tracked:
+            from agentops import track_agent
+            _tracked[cls] = track_agent(name=name)(cls)
+        return _tracked[cls]